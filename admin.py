@@ -9,24 +9,12 @@ from functools import wraps
 # El nombre del blueprint es 'admin_bp' y su prefijo de URL es '/'
 admin_bp = Blueprint('admin_bp', __name__, url_prefix='/')
 
-DATABASE = 'db.db'
-
 # --- Funciones de Utilidad de Base de Datos para el Blueprint ---
 
 def get_db():
-    """Abre una conexión a la base de datos si aún no hay una."""
-    db_conn = getattr(g, '_database', None)
-    if db_conn is None:
-        # Usamos la ruta completa para asegurar la conexión, como en db.py
-        db_conn = db.get_db_connection()
-    return db_conn
-
-@admin_bp.teardown_request
-def close_connection(exception):
-    """Cierra la conexión a la base de datos al finalizar la solicitud."""
-    db_conn = getattr(g, '_database', None)
-    if db_conn is not None:
-        db_conn.close()
+    """Retorna la conexión del pool asignada al contexto actual (ver db.get_db)."""
+    # La conexión se guarda en 'g' y db.close_db la devuelve al pool al terminar.
+    return db.get_db()
 
 # --- Decorador para requerir autenticación (opcional, pero útil) ---
 def login_required(f):
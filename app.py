@@ -1,24 +1,136 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session # Agregamos 'session'
+import secrets
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from flask import Flask, current_app, request, redirect, url_for, flash, jsonify, session # Agregamos 'session'
+import assets
+import catalogo
+import compression
 import db
+import http_cache
+import metrics
+import snapshot
+import submissions
 import users
-# IMPORTACIÓN CRUCIAL: Importamos los Blueprints
-from solicitudes import solicitudes_bp 
-from admin import admin_bp # <--- NUEVA IMPORTACIÓN
+from page_cache import render_cached
+# Los Blueprints (solicitudes, admin), las migraciones y el escritor agrupado se importan
+# donde se usan: importar este módulo no crea la aplicación ni toca la base de datos.
 
-# Inicializa la aplicación de Flask
-app = Flask(__name__)
-# Clave secreta para mensajes flash (¡IMPORTANTE!)
-app.secret_key = os.urandom(24)
+# Archivo (dentro de instance/) con la clave de sesión generada si no se configura una.
+SECRET_KEY_FILE = 'secret_key'
+# Segundos que un envío espera a que el escritor confirme su lote.
+GROUP_COMMIT_TIMEOUT = 30
 
-# REGISTRO CRUCIAL: Registramos los Blueprints
-app.register_blueprint(solicitudes_bp)
-app.register_blueprint(admin_bp) # <--- NUEVO REGISTRO
 
-# LLAMADA CRUCIAL: Asegura que la base de datos y las tablas se creen al iniciar la aplicación.
-db.create_tables()
+def create_app(test_config=None):
+    """
+    Crea y configura la aplicación. La configuración se toma, en orden, de las variables
+    de entorno TRANSAVI_*, de instance/config.py (opcional, no versionado) y de
+    'test_config'. No toca la base de datos: el esquema se aplica con las migraciones
+    ('flask init-db') o, con AUTO_MIGRATE, en la primera petición de cada proceso.
+    """
+    # IMPORTACIÓN CRUCIAL: Importamos los Blueprints al crear la aplicación
+    from solicitudes import solicitudes_bp
+    from admin import admin_bp
+
+    app = Flask(__name__, instance_relative_config=True)
+    app.config.from_mapping(
+        # Commit agrupado de /solicitar (opcional, ver write_queue.py).
+        GROUP_COMMIT=os.environ.get('TRANSAVI_GROUP_COMMIT') == '1',
+        # Lecturas del panel desde una instantánea de la base (opcional, ver snapshot.py).
+        READ_SNAPSHOT=os.environ.get('TRANSAVI_READ_SNAPSHOT') == '1',
+        # Latencia por endpoint y SQL en /metrics (opcional, ver metrics.py).
+        METRICS_ENABLED=os.environ.get('TRANSAVI_METRICS') == '1',
+        # Migraciones pendientes en la primera petición (desarrollo, pruebas, workers
+        # sin el hook de gunicorn.conf.py).
+        AUTO_MIGRATE=os.environ.get('TRANSAVI_AUTO_MIGRATE') == '1',
+    )
+    app.config.from_pyfile('config.py', silent=True)
+    if os.environ.get('TRANSAVI_SECRET_KEY'):
+        app.config['SECRET_KEY'] = os.environ['TRANSAVI_SECRET_KEY']
+    if test_config:
+        app.config.from_mapping(test_config)
+    # Clave secreta para mensajes flash y la sesión del admin (¡IMPORTANTE!): debe ser la
+    # misma en todos los procesos, o la sesión se pierde al cambiar de worker.
+    if not app.config.get('SECRET_KEY'):
+        app.config['SECRET_KEY'] = load_secret_key(app.instance_path)
+
+    # REGISTRO CRUCIAL: Registramos los Blueprints
+    app.register_blueprint(solicitudes_bp)
+    app.register_blueprint(admin_bp) # <--- NUEVO REGISTRO
+    app.register_blueprint(catalogo.catalogo_bp)
+
+    # Rutas públicas (formulario y endpoints AJAX), con los mismos nombres de endpoint.
+    app.add_url_rule('/', 'home', home)
+    app.add_url_rule('/check_username', 'check_username', check_username, methods=['GET'])
+    app.add_url_rule('/get_user_data', 'get_user_data', get_user_data, methods=['GET'])
+    app.add_url_rule('/find_request_details', 'find_request_details', find_request_details, methods=['GET'])
+    app.add_url_rule('/solicitar', 'solicitar_transporte', solicitar_transporte, methods=['POST'])
+    app.add_url_rule('/formulario', 'index', index)
+    app.cli.command('init-db')(init_db_command)
+
+    # Las conexiones se toman del pool de db.py y se devuelven al cerrar cada contexto.
+    db.init_app(app)
+    # CSS/JS compilados por build_assets.py (asset_url() en las plantillas).
+    assets.init_app(app)
+    # Respuestas JSON y HTML comprimidas con gzip/deflate (ver compression.py).
+    compression.init_app(app)
+    snapshot.init_app(app)
+    metrics.init_app(app)
+    if app.config['AUTO_MIGRATE']:
+        app.before_request(migrate_once)
+    return app
+
+
+def load_secret_key(instance_path):
+    """
+    Retorna la clave guardada en instance/secret_key, generándola la primera vez.
+    Varios procesos que arrancan a la vez obtienen la misma: el archivo se publica con
+    os.link, que falla si otro proceso ya lo creó.
+    """
+    path = os.path.join(instance_path, SECRET_KEY_FILE)
+    try:
+        with open(path, encoding='ascii') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(instance_path, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w', encoding='ascii') as f:
+        f.write(secrets.token_hex(32))
+    try:
+        os.link(tmp_path, path)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(tmp_path)
+    with open(path, encoding='ascii') as f:
+        return f.read().strip()
+
+
+# El esquema no se crea al importar: se aplica con 'python migrations.py', 'flask init-db'
+# o, en producción, una sola vez al arrancar gunicorn (ver gunicorn.conf.py).
+def init_db_command():
+    """Aplica las migraciones pendientes del esquema."""
+    import migrations
+    migrations.upgrade()
+
+_migrated = False
+_migrate_lock = threading.Lock()
+
+def migrate_once():
+    """Aplica las migraciones pendientes una sola vez por proceso (ver AUTO_MIGRATE)."""
+    global _migrated
+    if _migrated:
+        return
+    with _migrate_lock:
+        if not _migrated:
+            import migrations
+            # Seguro con varios procesos: cada migración revisa la versión bajo BEGIN IMMEDIATE.
+            migrations.upgrade()
+            _migrated = True
 
-@app.route('/')
 def home():
     """
     Ruta para la página de inicio. Ahora redirige directamente al formulario,
@@ -29,7 +141,6 @@ def home():
 
 
 # Endpoint para verificación de existencia de usuario (AJAX)
-@app.route('/check_username', methods=['GET'])
 def check_username():
     """Verifica si un nombre de usuario existe en la base de datos."""
     username = request.args.get('username')
@@ -37,11 +148,9 @@ def check_username():
     if not username:
         return jsonify({'exists': False, 'message': 'Falta el nombre de usuario'}), 400
 
-    conn = db.get_db_connection()
-    cursor = conn.cursor()
-    
     try:
-        user_data = users.find_user_by_username(cursor, username)
+        # Servido desde la caché en memoria: solo consulta la DB si el nombre puede existir.
+        user_data = users.find_user_by_username_cached(db.get_db, username)
         
         if user_data:
             # Devuelve 'True' y el nombre de usuario encontrado
@@ -51,41 +160,42 @@ def check_username():
     except Exception as e:
         print(f"Error al verificar usuario: {e}")
         return jsonify({'exists': False, 'message': 'Error interno del servidor'}), 500
-    finally:
-        conn.close()
 
 # Endpoint para cargar datos del usuario existente (AJAX)
-@app.route('/get_user_data', methods=['GET'])
 def get_user_data():
     """Obtiene y devuelve los datos de un usuario por su nombre de usuario."""
     username = request.args.get('username')
     
     if not username:
         return jsonify({'success': False, 'message': 'Falta el nombre de usuario'}), 400
+    try:
+        fields = http_cache.requested_fields(users.USER_DATA_FIELDS)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
 
-    conn = db.get_db_connection()
-    cursor = conn.cursor()
-    
     try:
-        # Buscamos todos los campos del usuario por el username
-        user_data = users.find_user_by_username(cursor, username)
+        # Buscamos todos los campos del usuario por el username (caché en memoria primero).
+        # La fila cacheada es pequeña: ?fields= se aplica sobre ella, sin ir a la base.
+        user_data = users.find_user_by_username_cached(db.get_db, username)
 
         if user_data:
+            # Los datos personales no tienen versión: el ETag se calcula sobre la fila misma.
+            etag = http_cache.content_etag((*user_data, *(fields or ())))
+            response = http_cache.not_modified(etag)
+            if response:
+                return response
             # Convertimos la fila de SQLite (diccionario/Row) a un diccionario estándar
             # Excluimos 'id' y 'username' ya que ya se conocen
-            data = {k: user_data[k] for k in user_data.keys() if k not in ['id', 'username']}
-            return jsonify({'success': True, 'data': data})
+            data = {k: user_data[k] for k in (fields or users.USER_DATA_FIELDS)}
+            return http_cache.json_response({'success': True, 'data': data}, etag)
         else:
             return jsonify({'success': False, 'message': 'Usuario no encontrado.'})
     
     except Exception as e:
         print(f"Error al obtener datos del usuario: {e}")
         return jsonify({'success': False, 'message': 'Error interno del servidor'}), 500
-    finally:
-        conn.close()
 
 # Endpoint para buscar los detalles completos de una solicitud (AJAX)
-@app.route('/find_request_details', methods=['GET'])
 def find_request_details():
     """Busca una solicitud específica por nombre de usuario y número consecutivo."""
     username = request.args.get('username')
@@ -94,54 +204,48 @@ def find_request_details():
     if not username or not request_num_raw:
         return jsonify({'success': False, 'message': 'Faltan Usuario o Consecutivo.'}), 400
 
-    # --- FIX CRÍTICO: Relleno de ceros (padding) ---
     try:
-        # 1. Intentar convertir a entero el input del usuario.
-        # 2. Convertir de nuevo a string y aplicar zfill(4) para asegurar 4 dígitos.
-        request_num_padded = str(int(request_num_raw)).zfill(4)
+        # El consecutivo se compara como entero contra requests.request_seq ('1', '0001' y '001' son iguales).
+        request_seq = int(request_num_raw)
     except ValueError:
         # Si el usuario ingresa letras u otro valor no numérico, devolver error.
         return jsonify({'success': False, 'message': 'El Consecutivo debe ser un número válido de 1 a 4 dígitos.'}), 400
-    # -----------------------------------------------
+    try:
+        # ?fields= limita las columnas del SELECT (ver users.REQUEST_DETAIL_FIELDS).
+        fields = http_cache.requested_fields(tuple(users.REQUEST_DETAIL_FIELDS))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
 
-    conn = db.get_db_connection()
+    conn = db.get_db()
     cursor = conn.cursor()
     
     try:
-        # Buscamos el ID del usuario primero
-        user_data = users.find_user_by_username(cursor, username)
-        if not user_data:
+        # Validador barato primero: versión de las solicitudes del usuario (índice de username).
+        version = users.get_user_requests_version(cursor, username)
+        if version is None:
             return jsonify({'success': False, 'message': 'Usuario no encontrado.'})
 
-        user_id = user_data['id']
-        
-        # --- FIX PARA DATOS CORRUPTOS EN DB: Usar LIKE para coincidir 0001 y 0001N ---
-        # Buscamos solicitudes cuyo request_number EMPIECE con el número rellenado.
-        
-        # Primero probamos la coincidencia exacta con el número de 4 dígitos
-        data = users.get_full_request_details_by_user_id_and_number(cursor, user_id, request_num_padded)
-        
-        if not data:
-            # Si no hay coincidencia exacta (ej: 0001), intentamos buscar usando LIKE.
-            # Esta es la parte que corrige el error si el dato es '0001N' o similar.
-            data = users.get_full_request_details_by_user_id_and_number_like(cursor, user_id, request_num_padded)
+        etag = http_cache.make_etag('r', version['id'], version['requests_version'], request_seq, *(fields or ()))
+        response = http_cache.not_modified(etag)
+        if response:
+            return response
 
+        # Una sola consulta por índice: usuario por username y solicitud por (user_id, request_seq).
+        data = users.get_full_request_details(cursor, username, request_seq, fields)
 
         if data:
             # Retornamos todos los datos como un diccionario estándar
-            return jsonify({'success': True, 'data': dict(data)})
-        else:
-            return jsonify({'success': False, 'message': 'Solicitud no encontrada para ese Usuario y Consecutivo.'})
+            return http_cache.json_response({'success': True, 'data': dict(data)}, etag)
+        return http_cache.json_response(
+            {'success': False, 'message': 'Solicitud no encontrada para ese Usuario y Consecutivo.'}, etag
+        )
 
     except Exception as e:
         print(f"Error al buscar solicitud completa: {e}")
         # Retornamos un mensaje de error interno más detallado
         return jsonify({'success': False, 'message': f'Error interno del servidor al buscar: {e}'}), 500
-    finally:
-        conn.close()
 
 
-@app.route('/solicitar', methods=['POST'])
 def solicitar_transporte():
     """
     Ruta que procesa el formulario de solicitud de transporte y guarda los datos.
@@ -151,142 +255,125 @@ def solicitar_transporte():
     
     # --- 1. Obtiene datos del Flujo de Usuario ---
     # Ya no chequeamos la sesión, sino que usamos la lógica de index.html
-    has_user = request.form['has_user']
-    user_id = None
-    username = None
-    
+    submission = {
+        'has_user': request.form['has_user'],
+        'username': request.form.get('username', ''),
+    }
     # Variables de usuario
-    first_name = request.form.get('first_name', '')
-    first_lastname = request.form.get('first_lastname', '')
-    second_lastname = request.form.get('second_lastname', '')
-    phone = request.form.get('phone', '')
-    email = request.form.get('email', '')
-    
-    conn = db.get_db_connection()
-    cursor = conn.cursor()
+    for field in submissions.USER_FORM_FIELDS:
+        submission[field] = request.form.get(field, '')
+
+    # Mensajes flash en orden; se muestran al final, también si ocurre un error.
+    messages = []
+    conn = None
 
     try:
-        if has_user == 'SI':
-            # Flujo 1: Usuario Existente (Requiere username)
-            username_input = request.form['username']
-            user_data = users.find_user_by_username(cursor, username_input)
-            
-            if user_data:
-                user_id = user_data['id']
-                username = user_data['username']
-                # Nota: Si el usuario existe y completó los datos, podrías actualizar sus campos aquí
-                # Pero por simplicidad, solo confirmamos la identidad.
-                flash(f'¡Usuario {username} autenticado! Tu solicitud ha sido registrada.', 'success')
+        # --- 2. Obtiene datos del Recorrido y Entidad ---
+        # Se leen antes de abrir la transacción para mantenerla lo más corta posible.
+        submission['request_data'] = {
+            'request_type': request.form['es_entidad'], # 'SI' o 'NO'
+            'entity_name': request.form.get('nombre_entidad', ''),
+            'entity_phone': request.form.get('telefono_empresa', ''),
+            'entity_notes': request.form.get('notes_entidad', ''),
+            'activity_type': request.form['tipo_actividad'],
+            # Lugar de Recogida
+            'pickup_province': request.form['pickup_province'],
+            'pickup_canton': request.form['pickup_canton'],
+            'pickup_señas': request.form['pickup_señas'],
+            'pickup_map_link': request.form.get('pickup_map_link', ''),
+            # Destino
+            'destination_province': request.form['destination_province'],
+            'destination_canton': request.form['destination_canton'],
+            'destination_señas': request.form['destination_señas'],
+            'destination_map_link': request.form.get('destination_map_link', ''),
+            'notes': request.form.get('notes', ''), # Notas generales del recorrido
+        }
+
+        # --- 3. Usuario, Consecutivo y Guardado de la Solicitud (ver submissions.py) ---
+        if current_app.config['GROUP_COMMIT']:
+            # El hilo escritor agrupa los envíos concurrentes en una sola transacción.
+            import write_queue
+            # El trabajo escribe en su propia lista, que se copia solo cuando termina: si la
+            # espera vence, el hilo escritor no agrega mensajes a esta respuesta.
+            job_messages = []
+            future = write_queue.get_writer().submit(
+                lambda cursor: submissions.save_submission(cursor, submission, job_messages)
+            )
+            saved = None
+            try:
+                saved = future.result(timeout=GROUP_COMMIT_TIMEOUT)
+            except FutureTimeoutError:
+                if future.cancel():
+                    # Seguía en la cola: se descarta y no se guardará.
+                    messages.append(('El servidor está ocupado y tu solicitud no se registró. Intenta de nuevo.', 'error'))
+                elif future.done():
+                    # Terminó justo al vencer la espera.
+                    saved = future.result()
+                    messages.extend(job_messages)
+                else:
+                    # El escritor ya la está guardando: reenviarla crearía un duplicado.
+                    messages.append(('Tu solicitud está en proceso. Consulta su número antes de enviarla de nuevo.', 'info'))
             else:
-                flash('El usuario no existe. Por favor, verifica el nombre de usuario o selecciona "No".', 'error')
-                return redirect(url_for('index'))
-
+                messages.extend(job_messages)
         else:
-            # Flujo 2: Nuevo Usuario
-            if not all([first_name, first_lastname, second_lastname, phone, email]):
-                flash('Faltan campos obligatorios para el registro de nuevo usuario.', 'error')
-                return redirect(url_for('index'))
-                
-            new_username = users.generate_custom_username(first_name, first_lastname, second_lastname, phone)
-            
-            # Buscamos si el email o el username generado ya existen
-            existing_user_by_email = users.find_user_by_email(cursor, email)
-            existing_user_by_username = users.find_user_by_username(cursor, new_username)
-            
-            if existing_user_by_email:
-                flash(f'El email {email} ya está registrado. Por favor, selecciona "Sí" en "¿Ya tienes un usuario?"', 'error')
-                return redirect(url_for('index'))
-            
-            if existing_user_by_username:
-                 # Si el username generado ya existe, se podría añadir un sufijo
-                 flash('Error: El nombre de usuario generado ya existe. Intenta con otro teléfono o nombre.', 'error')
-                 return redirect(url_for('index'))
-            
-            # Crea el nuevo usuario
-            user_id, _ = users.create_new_user(
-                cursor, first_name, first_lastname, second_lastname, phone, email
-            )
-            username = new_username
-            
-            # Muestra el nombre de usuario autogenerado
-            flash(f'¡Tu Nuevo usuario Transavi es: {username}! Tu solicitud ha sido registrada.', 'success')
-
-        # Si no se pudo autenticar o crear el usuario, abortar el registro de solicitud.
-        if user_id is None:
-            flash('Error de autenticación o registro. Inténtalo de nuevo.', 'error')
-            return redirect(url_for('index'))
-
-
-        # --- 3. Generación del Consecutivo y Guardado de la Solicitud ---
-        
-        # 3.1 Generar el número de solicitud consecutivo (0001, 0002, etc.)
-        last_request_num = db.get_last_request_number(cursor, user_id)
-        new_request_num = str(last_request_num + 1).zfill(4) # Formato 0001, 0002...
-
-        # 3.2 Obtiene datos del Recorrido y Entidad
-        request_type = request.form['es_entidad'] # 'SI' o 'NO'
-        entity_name = request.form.get('nombre_entidad', '')
-        entity_phone = request.form.get('telefono_empresa', '')
-        entity_notes = request.form.get('notes_entidad', '')
-        activity_type = request.form['tipo_actividad']
-        
-        # Lugar de Recogida
-        pickup_province = request.form['pickup_province']
-        pickup_canton = request.form['pickup_canton']
-        pickup_señas = request.form['pickup_señas']
-        pickup_map_link = request.form.get('pickup_map_link', '')
-        
-        # Destino
-        destination_province = request.form['destination_province']
-        destination_canton = request.form['destination_canton']
-        destination_señas = request.form['destination_señas']
-        destination_map_link = request.form.get('destination_map_link', '')
-        notes = request.form.get('notes', '') # Notas generales del recorrido
-
-        # 3.3 Registra la solicitud de transporte
-        cursor.execute(
-            """
-            INSERT INTO requests (
-                user_id, request_number,
-                request_type, entity_name, entity_phone, entity_notes, 
-                activity_type, 
-                pickup_province, pickup_canton, pickup_señas, pickup_map_link, 
-                destination_province, destination_canton, destination_señas, destination_map_link, 
-                notes
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                user_id, new_request_num,
-                request_type, entity_name, entity_phone, entity_notes, 
-                activity_type, 
-                pickup_province, pickup_canton, pickup_señas, pickup_map_link, 
-                destination_province, destination_canton, destination_señas, destination_map_link, 
-                notes
-            )
-        )
-        conn.commit()
-        
-        # Muestra el número de solicitud en el mensaje flash
-        flash(f'Número de Solicitud generado: {username}-{new_request_num}', 'info')
+            # Toda la escritura (usuario nuevo, consecutivo y solicitud) ocurre en una sola
+            # transacción BEGIN IMMEDIATE: dos envíos simultáneos no pueden obtener el mismo número.
+            conn = db.get_db()
+            db.begin_immediate(conn)
+            saved = submissions.save_submission(conn.cursor(), submission, messages)
+            if saved is not None:
+                conn.commit()
+            else:
+                conn.rollback()
 
+        # El número se muestra solo cuando la solicitud ya quedó guardada.
+        if saved is not None:
+            username, request_number = saved
+            messages.append((f'Número de Solicitud generado: {username}-{request_number}', 'info'))
 
     except Exception as e:
-        conn.rollback()
+        if conn is not None:
+            conn.rollback()
         print(f"Error al procesar la solicitud: {e}") 
-        flash(f'Ocurrió un error al procesar tu solicitud. Error interno: {e}', 'error')
-    finally:
-        conn.close()
+        messages.append((f'Ocurrió un error al procesar tu solicitud. Error interno: {e}', 'error'))
+
+    for message, category in messages:
+        flash(message, category)
 
     # Redirigir al formulario, mostrando el mensaje flash.
     return redirect(url_for('index'))
 
-@app.route('/formulario')
 def index():
     """Ruta para la página del formulario. Abierta a todo público."""
     # Eliminamos el chequeo de sesión para permitir el acceso directo al formulario.
-    return render_template('index.html')
+    # El HTML es estático: se renderiza una vez y se reutiliza (ver page_cache.py).
+    return render_cached(
+        'index.html',
+        provinces=catalogo.PROVINCES,
+        catalog_url=catalogo.catalog_url(),
+    )
+
+_default_app = None
+_default_app_lock = threading.Lock()
+
+def __getattr__(name):
+    """
+    Aplicación por defecto ('app'): 'flask --app app', wsgi.py y los scripts de
+    benchmarks/. Se crea en el primer acceso, no al importar el módulo.
+    """
+    global _default_app
+    if name != 'app':
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if _default_app is None:
+        with _default_app_lock:
+            if _default_app is None:
+                _default_app = create_app()
+    return _default_app
 
 if __name__ == '__main__':
+    # En desarrollo se aplican las migraciones pendientes antes de levantar el servidor.
+    init_db_command()
+    app = create_app()
     # Usar un puerto diferente ya que el 5000 puede estar en uso en algunos entornos.
     # Si estás ejecutando localmente, puedes cambiar el puerto.
     app.run(host='0.0.0.0', debug=True, port=3030)
@@ -0,0 +1,242 @@
+"""
+Archivo de solicitudes antiguas (partición fría) en una base aparte, instance/archive.db.
+
+Casi todo el tráfico consulta viajes recientes, pero 'requests' solo crece. Este módulo
+mueve las solicitudes con request_date anterior a una antigüedad dada a la tabla
+'requests' de archive.db, por lotes de tamaño fijo (memoria constante), para que la base
+viva y sus índices sigan siendo pequeños. Uso:
+
+    python archive.py --older-than-days 365 [--batch-size 1000] [--dry-run] [--vacuum]
+
+Cada lote se copia al archivo en una transacción y se borra de la base viva en otra: con
+WAL, una transacción sobre dos bases adjuntas no es atómica en conjunto, y en este orden
+una interrupción solo puede dejar filas repetidas en ambas bases, que la siguiente corrida
+completa. Al borrar se compensan los triggers de 'requests': users.request_count y el
+resumen diario (rollups.py) siguen contando las solicitudes archivadas.
+
+Las lecturas adjuntan archive.db como 'archive' solo mientras la consultan (ver attached),
+cuando la búsqueda en la base viva no encuentra la solicitud. La búsqueda de texto (FTS5) cubre
+solo la base viva.
+"""
+import argparse
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import db
+
+ARCHIVE_PATH = os.environ.get('TRANSAVI_ARCHIVE_PATH', os.path.join(db.BASE_DIR, 'instance', 'archive.db'))
+# Días de antigüedad a partir de los cuales una solicitud se archiva.
+ARCHIVE_AFTER_DAYS = int(os.environ.get('TRANSAVI_ARCHIVE_AFTER_DAYS', 365))
+
+# Índices del archivo: los mismos accesos que en la base viva.
+ARCHIVE_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS archive.idx_requests_user_seq ON requests (user_id, request_seq)',
+    'CREATE INDEX IF NOT EXISTS archive.idx_requests_user_date ON requests (user_id, request_date)',
+    'CREATE INDEX IF NOT EXISTS archive.idx_requests_date ON requests (request_date)',
+)
+
+
+def is_attached(conn):
+    """True si 'archive' está adjunta a la conexión."""
+    return any(row[1] == 'archive' for row in conn.execute('PRAGMA database_list'))
+
+
+def attach(conn):
+    """
+    Adjunta archive.db como 'archive' si existe y aún no está adjunta.
+    Retorna True si el archivo está disponible en la conexión. ATTACH no se admite dentro
+    de una transacción: en ese caso, si no estaba adjunta, retorna False.
+    """
+    if is_attached(conn):
+        return True
+    if not os.path.exists(ARCHIVE_PATH) or conn.in_transaction:
+        return False
+    conn.execute('ATTACH DATABASE ? AS archive', (ARCHIVE_PATH,))
+    return True
+
+
+def detach(conn):
+    """Separa 'archive' de la conexión, si está adjunta."""
+    if is_attached(conn):
+        conn.execute('DETACH DATABASE archive')
+
+
+@contextmanager
+def attached(conn):
+    """
+    Como attach(), pero solo durante el bloque: si la adjuntó, la separa al salir. Así
+    las conexiones vuelven al pool sin el archivo y un BEGIN IMMEDIATE posterior sobre
+    ellas (ej: /solicitar) no toma también el bloqueo de escritura de archive.db.
+    """
+    was_attached = is_attached(conn)
+    available = attach(conn)
+    try:
+        yield available
+    finally:
+        if available and not was_attached:
+            detach(conn)
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def request_columns(conn, schema='main'):
+    """Columnas de 'requests' en el esquema indicado, en orden."""
+    return [row[1] for row in conn.execute(f'PRAGMA {schema}.table_info(requests)')]
+
+
+def select_columns(conn, alias='r'):
+    """
+    Expresiones para leer archive.requests con las columnas de la base viva, en su orden
+    (NULL para las que el archivo aún no tiene).
+    """
+    archived = set(request_columns(conn, 'archive'))
+    return ', '.join(
+        f'{alias}.{_quote(name)}' if name in archived else f'NULL AS {_quote(name)}'
+        for name in request_columns(conn)
+    )
+
+
+def ensure_schema(conn):
+    """
+    Adjunta (creándola si no existe) archive.db y crea o completa su tabla 'requests' con
+    las columnas de la base viva. Las columnas que agreguen migraciones futuras se
+    agregan aquí; el id original se conserva como clave primaria.
+    """
+    if not is_attached(conn):
+        conn.execute('ATTACH DATABASE ? AS archive', (ARCHIVE_PATH,))
+    live = conn.execute('PRAGMA main.table_info(requests)').fetchall()
+    archived = set(request_columns(conn, 'archive'))
+    if not archived:
+        columns = ', '.join(
+            f'{_quote(row[1])} {row[2]}' + (' PRIMARY KEY' if row[1] == 'id' else '') for row in live
+        )
+        conn.execute(f'CREATE TABLE archive.requests ({columns})')
+    else:
+        for row in live:
+            if row[1] not in archived:
+                conn.execute(f'ALTER TABLE archive.requests ADD COLUMN {_quote(row[1])} {row[2]}')
+    for statement in ARCHIVE_INDEXES:
+        conn.execute(statement)
+    conn.commit()
+
+
+def archive_requests(conn, cutoff, batch_size=1000, dry_run=False):
+    """
+    Mueve a archive.db las solicitudes con request_date anterior a 'cutoff'
+    ('AAAA-MM-DD ...'), por lotes de 'batch_size' en orden de fecha.
+    Retorna un diccionario con los conteos de solicitudes elegibles y movidas.
+    """
+    stats = {'eligible': 0, 'moved': 0, 'batches': 0}
+    stats['eligible'] = conn.execute(
+        'SELECT COUNT(*) FROM main.requests WHERE request_date < ?', (cutoff,)
+    ).fetchone()[0]
+    if dry_run or not stats['eligible']:
+        return stats
+
+    ensure_schema(conn)
+    columns = ', '.join(_quote(name) for name in request_columns(conn))
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS archive_batch (id INTEGER PRIMARY KEY)')
+    cursor = conn.cursor()
+
+    while True:
+        # 1. Lote siguiente (los ya movidos no están en la base viva) y copia al archivo.
+        db.begin_immediate(conn)
+        cursor.execute('DELETE FROM temp.archive_batch')
+        cursor.execute(
+            """
+            INSERT INTO temp.archive_batch (id)
+            SELECT id FROM main.requests
+            WHERE request_date < ?
+            ORDER BY request_date, id
+            LIMIT ?
+            """,
+            (cutoff, batch_size)
+        )
+        if cursor.rowcount == 0:
+            conn.rollback()
+            break
+        # OR IGNORE: las filas que una corrida interrumpida ya copió se conservan.
+        cursor.execute(
+            f"""
+            INSERT OR IGNORE INTO archive.requests ({columns})
+            SELECT {columns} FROM main.requests
+            WHERE id IN (SELECT id FROM temp.archive_batch)
+            """
+        )
+        conn.commit()
+
+        # 2. Borrado de la base viva, compensando lo que descuentan los triggers de DELETE.
+        db.begin_immediate(conn)
+        cursor.execute(
+            """
+            SELECT user_id, COUNT(*) FROM main.requests
+            WHERE id IN (SELECT id FROM temp.archive_batch)
+            GROUP BY user_id
+            """
+        )
+        user_counts = [(count, user_id) for user_id, count in cursor.fetchall()]
+        cursor.execute(
+            """
+            SELECT COUNT(*), date(request_date), pickup_province, destination_province, activity_type
+            FROM main.requests
+            WHERE id IN (SELECT id FROM temp.archive_batch) AND date(request_date) IS NOT NULL
+            GROUP BY 2, 3, 4, 5
+            """
+        )
+        rollup_counts = [tuple(row) for row in cursor.fetchall()]
+        cursor.execute('DELETE FROM main.requests WHERE id IN (SELECT id FROM temp.archive_batch)')
+        moved = cursor.rowcount
+        cursor.executemany('UPDATE users SET request_count = request_count + ? WHERE id = ?', user_counts)
+        cursor.executemany(
+            """
+            UPDATE requests_daily_rollup SET trips = trips + ?
+            WHERE day = ? AND pickup_province = ? AND destination_province = ? AND activity_type = ?
+            """,
+            rollup_counts
+        )
+        conn.commit()
+
+        stats['moved'] += moved
+        stats['batches'] += 1
+
+    # Sin estadísticas el planificador no usa bien los índices del archivo.
+    conn.execute('ANALYZE archive')
+    conn.commit()
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Mueve las solicitudes antiguas a instance/archive.db.')
+    parser.add_argument('--older-than-days', type=int, default=ARCHIVE_AFTER_DAYS,
+                        help=f'Antigüedad mínima en días (por defecto {ARCHIVE_AFTER_DAYS}).')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Solicitudes por lote.')
+    parser.add_argument('--dry-run', action='store_true', help='Solo cuenta las solicitudes a archivar.')
+    parser.add_argument('--vacuum', action='store_true', help='Compacta la base viva al terminar.')
+    args = parser.parse_args(argv)
+
+    cutoff = (datetime.now() - timedelta(days=args.older_than_days)).strftime('%Y-%m-%d %H:%M:%S')
+    conn = db.get_db_connection()
+    start = time.perf_counter()
+    try:
+        stats = archive_requests(conn, cutoff, batch_size=args.batch_size, dry_run=args.dry_run)
+        if args.vacuum and stats['moved']:
+            conn.execute('VACUUM main')
+    finally:
+        conn.close()
+
+    print(
+        f"{stats['eligible']} solicitudes anteriores a {cutoff}; "
+        f"{stats['moved']} movidas a {ARCHIVE_PATH} en {stats['batches']} lotes ({time.perf_counter() - start:.1f}s)."
+    )
+    if args.dry_run:
+        print('Modo --dry-run: no se movió ninguna solicitud.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
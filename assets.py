@@ -0,0 +1,66 @@
+"""
+Archivos estáticos compilados por build_assets.py (static/dist).
+
+- asset_url('css/main.css') en las plantillas retorna la URL del archivo con hash del
+  manifest; si no se ha compilado (desarrollo), la del archivo original en /static.
+- /static/dist/<archivo> sirve los archivos compilados con caché inmutable de un año y,
+  si el navegador lo acepta, la variante precomprimida .br o .gz con Content-Encoding.
+"""
+import json
+import mimetypes
+import os
+
+from flask import current_app, request, send_from_directory, url_for
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DIST_DIR = os.path.join(BASE_DIR, 'static', 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+
+# Los nombres llevan el hash del contenido: nunca cambian, se pueden guardar un año.
+IMMUTABLE_MAX_AGE = 31536000
+
+# Variantes precomprimidas en orden de preferencia: (Content-Encoding, extensión).
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+
+def load_manifest():
+    """Lee static/dist/manifest.json; retorna {} si no se han compilado los archivos."""
+    try:
+        with open(MANIFEST_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def asset_url(name):
+    """URL del archivo estático 'name' (ej: 'css/main.css'), compilado si existe."""
+    built = current_app.extensions['assets_manifest'].get(name)
+    if built is None:
+        return url_for('static', filename=name)
+    return url_for('dist_asset', filename=built)
+
+
+def serve_dist_asset(filename):
+    """Sirve un archivo de static/dist, precomprimido si el cliente lo acepta."""
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding = None
+    served = filename
+    for name, ext in PRECOMPRESSED:
+        if request.accept_encodings[name] and os.path.isfile(os.path.join(DIST_DIR, filename + ext)):
+            encoding, served = name, filename + ext
+            break
+
+    response = send_from_directory(DIST_DIR, served, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def init_app(app):
+    """Carga el manifest y registra asset_url() y la ruta de los archivos compilados."""
+    app.extensions['assets_manifest'] = load_manifest()
+    app.add_url_rule('/static/dist/<path:filename>', 'dist_asset', serve_dist_asset)
+    app.jinja_env.globals['asset_url'] = asset_url
@@ -0,0 +1,347 @@
+"""
+Benchmark de todos los endpoints sobre una base sintética (benchmarks/seed.py).
+
+Cada escenario es una ruta de la aplicación con parámetros realistas tomados de la base
+(usernames y consecutivos existentes, búsquedas de texto, exportaciones por rango de
+fechas...). Reporta peticiones por segundo y latencias p50/p95/p99 por escenario y
+guarda los resultados en JSON (con el commit actual) para compararlos entre versiones.
+
+Modos:
+
+- client (por defecto): cliente de prueba de Flask en un solo hilo; mide la aplicación
+  sin red ni servidor.
+- server: levanta un servidor WSGI real (werkzeug, con hilos) y lo carga con --threads
+  clientes HTTP concurrentes.
+
+Uso:
+
+    python benchmarks/bench_endpoints.py --db /tmp/bench.db --users 10000 --requests 200000
+    python benchmarks/bench_endpoints.py --db /tmp/bench.db --mode server --threads 16
+    python benchmarks/bench_endpoints.py --db /tmp/bench.db --compare benchmarks/results/anterior.json
+
+Si la base de --db no existe se genera con la semilla indicada. Los escenarios que
+escriben (/solicitar) agregan filas a esa base.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import quote, urlencode
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import db  # noqa: E402
+import seed  # noqa: E402  (benchmarks/seed.py, en el mismo directorio)
+
+RESULTS_DIR = os.path.join(BASE_DIR, 'benchmarks', 'results')
+SEARCH_TERMS = ('parque', 'iglesia', 'terminal', 'hotel', 'muelle', 'grupo', 'equipaje')
+
+
+class Sample:
+    """Valores reales de la base que usan los escenarios (usuarios y consecutivos)."""
+
+    def __init__(self, path, rng, size=2000):
+        conn = sqlite3.connect(path)
+        try:
+            rows = conn.execute(
+                'SELECT username, email, request_count FROM users WHERE request_count > 0 '
+                'ORDER BY random() LIMIT ?', (size,)
+            ).fetchall()
+            self.max_user_id = conn.execute('SELECT MAX(id) FROM users').fetchone()[0]
+        finally:
+            conn.close()
+        self.users = rows
+        self.rng = rng
+        self.new_users = 0
+        # Prefijo por corrida: los usuarios nuevos no chocan con los de corridas anteriores.
+        self.run_id = int(time.time()) % 10 ** 4
+
+    def user(self):
+        return self.rng.choice(self.users)
+
+    def request_form(self, existing):
+        form = {
+            'es_entidad': 'NO', 'tipo_actividad': 'TURISMO',
+            'pickup_province': 'Heredia', 'pickup_canton': 'Barva', 'pickup_señas': 'Iglesia',
+            'destination_province': 'Puntarenas', 'destination_canton': 'Osa', 'destination_señas': 'Muelle',
+        }
+        if existing:
+            form.update(has_user='SI', username=self.user()[0])
+        else:
+            self.new_users += 1
+            n = self.new_users
+            form.update(
+                has_user='NO', first_name='Bench', first_lastname='Carga', second_lastname='Nueva',
+                phone=f'{self.run_id:04d}{n:06d}', email=f'bench-{self.run_id}-{n}@example.com',
+            )
+        return form
+
+
+def scenarios(sample):
+    """
+    Escenarios: nombre -> función que retorna (método, url, formulario, json, admin).
+    'admin' indica que la ruta requiere la sesión de administrador.
+    """
+    rng = sample.rng
+
+    def user_requests_page():
+        return 'GET', f'/solicitudes/?cursor={rng.randint(100, sample.max_user_id)}', None, None, True
+
+    def find_request():
+        username, _, count = sample.user()
+        return 'GET', f'/find_request_details?username={quote(username)}&request_number={rng.randint(1, count)}', None, None, False
+
+    def resolve_users():
+        keys = [row[rng.choice((0, 1))] for row in (sample.user() for _ in range(50))]
+        return 'POST', '/solicitudes/resolve_users', None, {'keys': keys}, True
+
+    def export_week():
+        month = rng.randint(1, 12)
+        return 'GET', f'/solicitudes/export.csv?desde=2023-{month:02d}-01&hasta=2023-{month:02d}-07', None, None, True
+
+    def nearby():
+        lat, lon = seed.PROVINCE_CENTERS[rng.choice(list(seed.PROVINCE_CENTERS))]
+        lat, lon = rng.gauss(lat, 0.05), rng.gauss(lon, 0.05)
+        return 'GET', f'/solicitudes/nearby?lat={lat:.5f}&lon={lon:.5f}&radius_km={rng.choice((2, 5, 10))}', None, None, True
+
+    return {
+        'home_redirect': lambda: ('GET', '/', None, None, False),
+        'formulario': lambda: ('GET', '/formulario', None, None, False),
+        'catalogo': lambda: ('GET', '/catalogo/provincias.json', None, None, False),
+        'check_username': lambda: ('GET', f'/check_username?username={quote(sample.user()[0])}', None, None, False),
+        'check_username_missing': lambda: ('GET', f'/check_username?username=zzz-{rng.randrange(10 ** 8)}', None, None, False),
+        'get_user_data': lambda: ('GET', f'/get_user_data?username={quote(sample.user()[0])}', None, None, False),
+        'find_request_details': find_request,
+        'resolve_users_50': resolve_users,
+        'solicitar_existing_user': lambda: ('POST', '/solicitar', sample.request_form(True), None, False),
+        'solicitar_new_user': lambda: ('POST', '/solicitar', sample.request_form(False), None, False),
+        'login_form': lambda: ('GET', '/login', None, None, False),
+        'login_post': lambda: ('POST', '/login', {'username': sample.user()[0]}, None, False),
+        'panel_first_page': lambda: ('GET', '/solicitudes/', None, None, True),
+        'panel_cursor_page': user_requests_page,
+        'panel_user_requests': lambda: ('GET', f'/solicitudes/user_requests/{quote(sample.user()[0])}', None, None, True),
+        'panel_search': lambda: ('GET', f'/solicitudes/search?q={rng.choice(SEARCH_TERMS)}', None, None, True),
+        'panel_export_week': export_week,
+        'panel_nearby': nearby,
+    }
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'rps': round(count / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def run_client(app, make_request, iterations):
+    """Ejecuta el escenario con el cliente de prueba de Flask (un hilo)."""
+    # Sin cookies: cada petición llega sin sesión (los mensajes flash no se acumulan) y
+    # las rutas del panel reciben la cookie de administrador explícitamente.
+    client = app.test_client(use_cookies=False)
+    cookie = _admin_cookie(app)
+    latencies = []
+    errors = 0
+    start = time.perf_counter()
+    for _ in range(iterations):
+        method, url, form, payload, admin = make_request()
+        headers = {'Cookie': cookie} if admin else {}
+        t0 = time.perf_counter()
+        response = client.open(url, method=method, data=form, json=payload, headers=headers)
+        response.get_data()  # consume las respuestas en streaming
+        latencies.append(time.perf_counter() - t0)
+        if response.status_code >= 400:
+            errors += 1
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+def _admin_cookie(app):
+    """Cookie de sesión firmada con admin_id para las rutas del panel (modo server)."""
+    serializer = app.session_interface.get_signing_serializer(app)
+    return f"{app.config['SESSION_COOKIE_NAME']}={serializer.dumps({'admin_id': 1})}"
+
+
+def run_server(app, make_request, iterations, threads, port):
+    """Ejecuta el escenario con 'threads' clientes HTTP contra el servidor WSGI."""
+    cookie = _admin_cookie(app)
+    lock = threading.Lock()
+    remaining = [iterations]
+    latencies = []
+    errors = [0]
+
+    def worker():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    break
+                remaining[0] -= 1
+                method, url, form, payload, admin = make_request()
+            headers = {'Cookie': cookie} if admin else {}
+            body = None
+            if form is not None:
+                body = urlencode(form)
+                headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            elif payload is not None:
+                body = json.dumps(payload)
+                headers['Content-Type'] = 'application/json'
+            t0 = time.perf_counter()
+            try:
+                conn.request(method, url, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+                if response.getheader('Connection', '').lower() == 'close' or response.version == 10:
+                    conn.close()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                status = 599
+            elapsed = time.perf_counter() - t0
+            with lock:
+                latencies.append(elapsed)
+                if status >= 400:
+                    errors[0] += 1
+        conn.close()
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return summarize(latencies, errors[0], time.perf_counter() - start)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous_path):
+    """Imprime la variación de rps y p95 respecto a un archivo de resultados anterior."""
+    with open(previous_path, encoding='utf-8') as f:
+        previous = json.load(f)
+    print(f"\nComparación con {previous_path} (commit {previous.get('commit')}):")
+    for name, current in results['scenarios'].items():
+        before = previous.get('scenarios', {}).get(name)
+        if not before or not before.get('rps'):
+            continue
+        rps_delta = (current['rps'] - before['rps']) / before['rps'] * 100
+        p95_delta = (current['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0.0
+        print(f'{name:<26} rps {rps_delta:+7.1f}%   p95 {p95_delta:+7.1f}%')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark de los endpoints sobre una base sintética.')
+    parser.add_argument('--db', default=None, help='Base a usar; si no existe se genera (por defecto, temporal).')
+    parser.add_argument('--users', type=int, default=10000, help='Usuarios al generar la base.')
+    parser.add_argument('--requests', type=int, default=200000, help='Solicitudes al generar la base.')
+    parser.add_argument('--seed', type=int, default=42, help='Semilla de los datos y de los escenarios.')
+    parser.add_argument('--mode', choices=('client', 'server'), default='client')
+    parser.add_argument('--threads', type=int, default=8, help='Clientes concurrentes en modo server.')
+    parser.add_argument('--iterations', type=int, default=500, help='Peticiones por escenario.')
+    parser.add_argument('--only', nargs='*', help='Ejecutar solo estos escenarios.')
+    parser.add_argument('--output', default=None, help='Archivo JSON de resultados (por defecto en benchmarks/results/).')
+    parser.add_argument('--compare', default=None, help='Resultados anteriores (JSON) contra los que comparar.')
+    args = parser.parse_args(argv)
+
+    path = args.db or os.path.join(tempfile.mkdtemp(prefix='transavi-bench-'), 'db.db')
+    if not os.path.exists(path):
+        seed.seed(path, args.users, args.requests, args.seed)
+    db.DATABASE_PATH = path
+
+    from app import app
+    # El cupo por minuto de /solicitudes/resolve_users rechazaría casi todo el escenario
+    # resolve_users_50: se mide la consulta por lote, no el límite.
+    app.config['RESOLVE_KEYS_PER_WINDOW'] = None
+    rng = random.Random(args.seed)
+    sample = Sample(path, rng)
+    all_scenarios = scenarios(sample)
+    selected = {name: fn for name, fn in all_scenarios.items() if not args.only or name in args.only}
+
+    server = None
+    if args.mode == 'server':
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    with sqlite3.connect(path) as conn:
+        users_count, requests_count = (
+            conn.execute('SELECT COUNT(*) FROM users').fetchone()[0],
+            conn.execute('SELECT COUNT(*) FROM requests').fetchone()[0],
+        )
+    results = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'mode': args.mode,
+        'threads': args.threads if args.mode == 'server' else 1,
+        'iterations': args.iterations,
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'dataset': {'users': users_count, 'requests': requests_count, 'seed': args.seed},
+        'scenarios': {},
+    }
+
+    print(f"{users_count} usuarios, {requests_count} solicitudes; modo {args.mode}, {args.iterations} peticiones por escenario")
+    print(f"{'escenario':<26} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errores':>8}")
+    try:
+        for name, make_request in selected.items():
+            if server is None:
+                summary = run_client(app, make_request, args.iterations)
+            else:
+                summary = run_server(app, make_request, args.iterations, args.threads, server.server_port)
+            results['scenarios'][name] = summary
+            print(f"{name:<26} {summary['rps']:>9.1f} {summary['p50_ms']:>9.2f} "
+                  f"{summary['p95_ms']:>9.2f} {summary['p99_ms']:>9.2f} {summary['errors']:>8}")
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{results['commit'] or 'sin-commit'}-{args.mode}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+    print(f'Resultados guardados en {output}')
+
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
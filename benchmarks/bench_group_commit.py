@@ -0,0 +1,129 @@
+"""
+Benchmark de /solicitar con y sin commit agrupado (write_queue.py).
+
+Para cada modo crea una base temporal, dispara envíos concurrentes (mitad usuarios
+nuevos, mitad usuarios existentes) con el cliente de prueba de Flask y reporta las
+inserciones sostenidas por segundo. Con --synchronous FULL cada commit hace fsync del
+WAL, como en un despliegue que prioriza durabilidad. Uso:
+
+    python benchmarks/bench_group_commit.py --requests 3000 --threads 32
+    python benchmarks/bench_group_commit.py --synchronous FULL
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+EXISTING_USERS = 20
+
+
+def _form(i, usernames):
+    """Envío i: los pares registran un usuario nuevo, los impares usan uno existente."""
+    form = {
+        'es_entidad': 'NO',
+        'tipo_actividad': 'TURISMO',
+        'pickup_province': 'Heredia',
+        'pickup_canton': 'Barva',
+        'pickup_señas': 'Iglesia',
+        'destination_province': 'Guanacaste',
+        'destination_canton': 'Liberia',
+        'destination_señas': 'Aeropuerto',
+    }
+    if i % 2:
+        form.update(has_user='SI', username=usernames[i % len(usernames)])
+    else:
+        form.update(
+            has_user='NO', first_name='Nuevo', first_lastname='Usuario', second_lastname='Bench',
+            phone=f'{i:08d}', email=f'bench{i}@example.com',
+        )
+    return form
+
+
+def run(app, group_commit, total, threads):
+    """Ejecuta 'total' envíos con 'threads' hilos; retorna (segundos, solicitudes guardadas)."""
+    app.config['GROUP_COMMIT'] = group_commit
+    conn = db.get_db_connection()
+    usernames = []
+    for i in range(EXISTING_USERS):
+        username = f'exi-{i:08d}'
+        conn.execute(
+            'INSERT INTO users (username, first_name, first_lastname, second_lastname, phone, email) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (username, 'Usuario', 'Existente', 'Bench', f'{i:08d}', f'{username}@example.com')
+        )
+        usernames.append(username)
+    conn.commit()
+
+    errors = []
+    next_index = iter(range(total))
+    index_lock = threading.Lock()
+
+    def worker():
+        client = app.test_client()
+        while True:
+            with index_lock:
+                i = next(next_index, None)
+            if i is None:
+                return
+            response = client.post('/solicitar', data=_form(i, usernames))
+            if response.status_code != 302:
+                errors.append(f'Envío {i}: HTTP {response.status_code}')
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    saved = conn.execute('SELECT COUNT(*) FROM requests').fetchone()[0]
+    conn.close()
+    for error in errors[:10]:
+        print(f'ERROR: {error}')
+    return elapsed, saved
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=3000, help='Envíos por modo.')
+    parser.add_argument('--threads', type=int, default=32, help='Hilos concurrentes.')
+    parser.add_argument('--synchronous', choices=('NORMAL', 'FULL'), default='NORMAL',
+                        help='PRAGMA synchronous de las conexiones (por defecto NORMAL, como la aplicación).')
+    args = parser.parse_args(argv)
+
+    db.CONNECTION_PRAGMAS = tuple(
+        f'PRAGMA synchronous = {args.synchronous}' if pragma.startswith('PRAGMA synchronous') else pragma
+        for pragma in db.CONNECTION_PRAGMAS
+    )
+
+    import migrations
+    import write_queue
+    from app import app
+
+    print(f'{args.requests} envíos por modo, {args.threads} hilos, synchronous={args.synchronous}')
+    for group_commit in (False, True):
+        db.DATABASE_PATH = os.path.join(tempfile.mkdtemp(prefix='transavi-gc-'), 'db.db')
+        db.close_pool()
+        write_queue.close_writer()
+        migrations.upgrade(analyze=False)
+
+        elapsed, saved = run(app, group_commit, args.requests, args.threads)
+        mode = 'commit agrupado' if group_commit else 'commit por envío'
+        print(f'{mode:>17}: {saved} solicitudes en {elapsed:.2f}s ({saved / elapsed:.0f} inserciones/s)')
+        if saved != args.requests:
+            print(f'ERROR: se esperaban {args.requests} solicitudes')
+            return 1
+
+    write_queue.close_writer()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
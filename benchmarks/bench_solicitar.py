@@ -0,0 +1,161 @@
+"""
+Micro-benchmark de la escritura de /solicitar (submissions.save_submission).
+
+Compara el camino actual (inserción optimista del usuario y reserva del consecutivo
+que también busca al usuario) con el anterior (búsquedas por email y username antes
+del INSERT, búsqueda del usuario existente antes de reservar el consecutivo), ambos en
+una transacción BEGIN IMMEDIATE por envío sobre la misma base temporal. Para cada flujo
+reporta las sentencias SQL que la aplicación envía por envío (incluidos BEGIN y COMMIT;
+no cuenta las que ejecutan los triggers) y la latencia p50/p95 de la transacción. Uso:
+
+    python benchmarks/bench_solicitar.py --submissions 2000
+    python benchmarks/bench_solicitar.py --users 50000   # usuarios previos en la base
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import migrations  # noqa: E402
+import submissions  # noqa: E402
+import users  # noqa: E402
+
+REQUEST_DATA = {
+    'request_type': 'NO',
+    'activity_type': 'TURISMO',
+    'pickup_province': 'Heredia',
+    'pickup_canton': 'Barva',
+    'pickup_señas': 'Iglesia',
+    'destination_province': 'Guanacaste',
+    'destination_canton': 'Liberia',
+    'destination_señas': 'Aeropuerto',
+}
+
+
+def legacy_save_submission(cursor, submission, messages):
+    """Camino anterior de submissions.save_submission: búsquedas antes de cada escritura."""
+    if submission['has_user'] == 'SI':
+        user_data = users.find_user_by_username(cursor, submission['username'])
+        if not user_data:
+            messages.append(('El usuario no existe.', 'error'))
+            return None
+        user_id = user_data['id']
+        username = user_data['username']
+    else:
+        first_name, first_lastname, second_lastname, phone, email = (
+            submission[field] for field in ('first_name', 'first_lastname', 'second_lastname', 'phone', 'email')
+        )
+        new_username = users.generate_custom_username(first_name, first_lastname, second_lastname, phone)
+        if users.find_user_by_email(cursor, email):
+            messages.append((f'El email {email} ya está registrado.', 'error'))
+            return None
+        if users.find_user_by_username(cursor, new_username):
+            messages.append(('El nombre de usuario generado ya existe.', 'error'))
+            return None
+        user_id, username = users.create_new_user(
+            cursor, first_name, first_lastname, second_lastname, phone, email
+        )
+    request_number = users.create_request(cursor, user_id, submission['request_data'])
+    return username, request_number
+
+
+def _existing_user(i):
+    """Datos del usuario previo i (su username es el que generaría el formulario)."""
+    return {
+        'first_name': 'Usuario', 'first_lastname': 'Existente', 'second_lastname': 'Bench',
+        'phone': f'{i:08d}', 'email': f'usuario{i}@example.com',
+    }
+
+
+def _submissions(flow, count, first_name, existing):
+    """Envíos del flujo indicado; 'first_name' separa los usuarios nuevos de cada camino."""
+    for i in range(count):
+        if flow == 'existente':
+            yield {'has_user': 'SI', 'username': existing[i % len(existing)], 'request_data': REQUEST_DATA}
+        elif flow == 'duplicado':
+            # Un usuario previo que vuelve a registrarse: username y email ya existen.
+            yield {'has_user': 'NO', 'username': '', **_existing_user(i % len(existing)),
+                   'request_data': REQUEST_DATA}
+        else:
+            yield {
+                'has_user': 'NO', 'username': '',
+                'first_name': first_name, 'first_lastname': 'Bench', 'second_lastname': 'Nuevo',
+                'phone': f'{i:08d}', 'email': f'{first_name.lower()}{i}@example.com',
+                'request_data': REQUEST_DATA,
+            }
+
+
+class CountingCursor(sqlite3.Cursor):
+    """Cursor que cuenta las sentencias que la aplicación envía a SQLite."""
+    executed = 0
+
+    def execute(self, *args):
+        CountingCursor.executed += 1
+        return super().execute(*args)
+
+
+def run(conn, save, submissions):
+    """Guarda cada envío en su transacción; retorna (sentencias por envío, latencias en ms)."""
+    CountingCursor.executed = 0
+    latencies = []
+    count = 0
+    for submission in submissions:
+        start = time.perf_counter()
+        db.begin_immediate(conn)
+        if save(conn.cursor(CountingCursor), submission, []) is not None:
+            conn.commit()
+        else:
+            conn.rollback()
+        latencies.append((time.perf_counter() - start) * 1000)
+        count += 1
+    # + BEGIN IMMEDIATE y COMMIT (o ROLLBACK) de cada envío.
+    return CountingCursor.executed / count + 2, latencies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--submissions', type=int, default=2000, help='Envíos por flujo y camino.')
+    parser.add_argument('--users', type=int, default=10000, help='Usuarios previos en la base.')
+    args = parser.parse_args(argv)
+
+    db.DATABASE_PATH = os.path.join(tempfile.mkdtemp(prefix='transavi-solicitar-'), 'db.db')
+    migrations.upgrade(analyze=False)
+    conn = db.get_db_connection()
+    rows = [_existing_user(i) for i in range(args.users)]
+    existing = [users.generate_custom_username(row['first_name'], row['first_lastname'],
+                                               row['second_lastname'], row['phone']) for row in rows]
+    conn.executemany(
+        'INSERT INTO users (username, first_name, first_lastname, second_lastname, phone, email) '
+        'VALUES (?, ?, ?, ?, ?, ?)',
+        ((username, row['first_name'], row['first_lastname'], row['second_lastname'], row['phone'], row['email'])
+         for username, row in zip(existing, rows))
+    )
+    conn.commit()
+
+    # Cada camino registra sus usuarios nuevos con una inicial distinta (username distinto).
+    paths = (('anterior', legacy_save_submission, 'Anterior'), ('actual', submissions.save_submission, 'Optimista'))
+    print(f'{args.submissions} envíos por flujo, {args.users} usuarios previos')
+    print(f"{'flujo':<16} {'camino':<9} {'sentencias':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    try:
+        for flow in ('nuevo', 'existente', 'duplicado'):
+            for name, save, first_name in paths:
+                per_submission, latencies = run(
+                    conn, save, _submissions(flow, args.submissions, first_name, existing)
+                )
+                latencies.sort()
+                p95 = latencies[int(len(latencies) * 0.95) - 1]
+                print(f'{flow:<16} {name:<9} {per_submission:>10.1f} '
+                      f'{statistics.median(latencies):>8.3f} {p95:>8.3f}')
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+Benchmark del arranque en frío: importación, creación de la aplicación y primera respuesta.
+
+Cada corrida es un intérprete nuevo (como un worker recién escalado o una corrida de
+pruebas) que mide, en milisegundos:
+
+- import: 'import app' (sin crear la aplicación).
+- create_app: primer acceso a app.app.
+- primera respuesta: GET /formulario (plantilla, sin base de datos).
+- primera consulta: GET /check_username (abre el pool y arma la caché de usernames).
+- proceso: desde el lanzamiento del intérprete hasta su salida.
+
+Antes de medir verifica que importar el módulo y crear la aplicación no creen ni abran la
+base de datos. Con --importtime muestra además los módulos que más tardan en importarse
+(python -X importtime). Uso:
+
+    python benchmarks/bench_startup.py --runs 20
+    python benchmarks/bench_startup.py --db /tmp/bench.db --importtime
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+PHASES = ('import', 'create_app', 'primera respuesta', 'primera consulta', 'proceso')
+
+
+def probe(path, requests=True):
+    """Se ejecuta en el intérprete hijo: mide cada fase e imprime el resultado en JSON."""
+    start = time.perf_counter()
+    import db
+    db.DATABASE_PATH = path
+    import app as app_module
+    imported = time.perf_counter()
+    app = app_module.app
+    created = time.perf_counter()
+    result = {'import': imported - start, 'create_app': created - imported}
+    if requests:
+        client = app.test_client()
+        if client.get('/formulario').status_code != 200:
+            raise SystemExit('GET /formulario no respondió 200')
+        first = time.perf_counter()
+        if client.get('/check_username?username=abc-00000000').status_code != 200:
+            raise SystemExit('GET /check_username no respondió 200')
+        result['primera respuesta'] = first - created
+        result['primera consulta'] = time.perf_counter() - first
+    else:
+        result['db_exists'] = os.path.exists(path)
+    print(json.dumps({phase: value * 1000 if isinstance(value, float) else value
+                      for phase, value in result.items()}))
+
+
+def _run_probe(path, requests=True):
+    args = [sys.executable, os.path.abspath(__file__), '--probe', path]
+    if not requests:
+        args.append('--no-requests')
+    start = time.perf_counter()
+    output = subprocess.run(args, cwd=BASE_DIR, check=True, capture_output=True, text=True).stdout
+    elapsed = (time.perf_counter() - start) * 1000
+    result = json.loads(output.strip().splitlines()[-1])
+    result['proceso'] = elapsed
+    return result
+
+
+def importtime(limit=15):
+    """Módulos con mayor tiempo de importación acumulado al importar app.py."""
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=BASE_DIR, check=True, capture_output=True, text=True
+    ).stderr
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        # 'import time: <propio> | <acumulado> | <módulo indentado por nivel>'
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        rows.append((int(cumulative_us), int(self_us), module.strip()))
+    rows.sort(reverse=True)
+    return rows[:limit]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10, help='Intérpretes nuevos a medir.')
+    parser.add_argument('--db', help='Base a usar (por defecto, una temporal con las migraciones).')
+    parser.add_argument('--importtime', action='store_true', help='Muestra los módulos más lentos de importar.')
+    parser.add_argument('--probe', help=argparse.SUPPRESS)
+    parser.add_argument('--no-requests', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.probe:
+        probe(args.probe, requests=not args.no_requests)
+        return 0
+
+    # 1. Importar y crear la aplicación no debe tocar la base de datos.
+    missing = os.path.join(tempfile.mkdtemp(prefix='transavi-startup-'), 'no-existe.db')
+    if _run_probe(missing, requests=False)['db_exists']:
+        print('ERROR: importar app.py o crear la aplicación creó la base de datos.')
+        return 1
+    print('OK: importar app.py y crear la aplicación no tocan la base de datos.')
+
+    path = args.db
+    if path is None:
+        import db
+        import migrations
+        path = db.DATABASE_PATH = os.path.join(tempfile.mkdtemp(prefix='transavi-startup-'), 'db.db')
+        migrations.upgrade(analyze=False)
+
+    # 2. Tiempos de arranque en intérpretes nuevos.
+    results = [_run_probe(path) for _ in range(args.runs)]
+    print(f'{args.runs} arranques en frío ({path}):')
+    print(f"{'fase':<18} {'mediana ms':>11} {'mín ms':>8}")
+    for phase in PHASES:
+        values = [result[phase] for result in results]
+        print(f'{phase:<18} {statistics.median(values):>11.1f} {min(values):>8.1f}')
+
+    if args.importtime:
+        print('\nMódulos más lentos de importar (python -X importtime -c "import app"):')
+        print(f"{'acumulado ms':>12} {'propio ms':>10}  módulo")
+        for cumulative_us, self_us, module in importtime():
+            print(f'{cumulative_us / 1000:>12.1f} {self_us / 1000:>10.1f}  {module}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
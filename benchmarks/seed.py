@@ -0,0 +1,240 @@
+"""
+Generador reproducible de datos sintéticos para pruebas de rendimiento.
+
+Crea una base nueva con el esquema actual y la llena con usuarios realistas (nombres y
+apellidos costarricenses, teléfonos únicos y el username de users.generate_custom_username)
+y con el historial de solicitudes de cada usuario: provincias y cantones del catálogo del
+formulario, tipos de actividad del formulario, fechas crecientes y consecutivos 0001..N
+sin huecos. Pocos usuarios concentran muchas solicitudes (distribución lognormal).
+
+La misma semilla produce siempre los mismos datos. Uso:
+
+    python benchmarks/seed.py /tmp/transavi-100k.db --users 100000 --requests 2000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import catalogo  # noqa: E402
+import db  # noqa: E402
+import geo  # noqa: E402
+import migrations  # noqa: E402
+import users  # noqa: E402
+
+FIRST_NAMES = (
+    'José', 'María', 'Juan', 'Ana', 'Carlos', 'Laura', 'Luis', 'Sofía', 'Andrés', 'Daniela',
+    'Jorge', 'Valeria', 'Diego', 'Gabriela', 'Fernando', 'Mariana', 'Pablo', 'Natalia',
+    'Esteban', 'Carolina', 'Mauricio', 'Fabiola', 'Randall', 'Karla', 'Alonso', 'Melissa',
+    'Minor', 'Yorleny', 'Greivin', 'Marianela', 'Adrián', 'Paola', 'Rodrigo', 'Silvia',
+)
+LAST_NAMES = (
+    'Rodríguez', 'Vargas', 'Jiménez', 'Mora', 'Rojas', 'González', 'Sánchez', 'Hernández',
+    'Ramírez', 'Castro', 'Araya', 'Solano', 'Alvarado', 'Chaves', 'Quesada', 'Campos',
+    'Salazar', 'Madrigal', 'Vega', 'Brenes', 'Calderón', 'Víquez', 'Zúñiga', 'Umaña',
+    'Arias', 'Fonseca', 'Villalobos', 'Carvajal', 'Segura', 'Monge', 'Cordero', 'Núñez',
+)
+ACTIVITY_TYPES = (
+    'EMPRESARIAL', 'TURISMO', 'SENDERISMO', 'DEPORTE', 'COMPARSA', 'CICLISMO', 'INTERNACIONAL(PANAMÁ)',
+)
+# Peso relativo de cada tipo de actividad (el turismo domina).
+ACTIVITY_WEIGHTS = (15, 40, 12, 10, 5, 10, 8)
+LANDMARKS = (
+    'Frente al parque central', 'Costado norte de la iglesia', 'Terminal de buses',
+    '200 m sur del Banco Nacional', 'Estadio municipal', 'Entrada principal del hotel',
+    'Escuela del distrito', 'Muelle', 'Centro comercial', 'Plaza de deportes',
+)
+NOTES = (
+    '', '', 'Grupo de {n} personas.', 'Viaje de ida y vuelta.', 'Requieren espacio para equipaje.',
+    'Salida a las {h}:00.', 'Grupo de {n} personas, regreso el mismo día.',
+)
+# Centro aproximado de cada provincia (lat, lon) para las coordenadas de los enlaces de mapa.
+PROVINCE_CENTERS = {
+    'San José': (9.93, -84.08), 'Alajuela': (10.02, -84.21), 'Cartago': (9.86, -83.92),
+    'Heredia': (10.0, -84.12), 'Guanacaste': (10.63, -85.44), 'Puntarenas': (9.98, -84.84),
+    'Limón': (9.99, -83.03),
+}
+# Formatos de enlace de mapa; el enlace corto no trae coordenadas (como en la realidad).
+MAP_LINK_FORMATS = (
+    'https://www.google.com/maps/@{lat:.6f},{lon:.6f},17z',
+    'https://maps.google.com/?q={lat:.6f},{lon:.6f}',
+    'https://waze.com/ul?ll={lat:.6f}%2C{lon:.6f}&navigate=yes',
+    'https://maps.app.goo.gl/{code}',
+)
+# Fracción de las solicitudes con enlace de mapa en cada punto.
+MAP_LINK_RATE = 0.7
+
+ENTITIES = ('Asociación Deportiva', 'Colegio Técnico', 'Cooperativa', 'Municipalidad', 'Club de Ciclismo', 'Tour Operador')
+
+# Período que cubre el historial de solicitudes.
+HISTORY_START = datetime(2022, 1, 1)
+HISTORY_DAYS = 3 * 365
+
+INSERT_USER_SQL = (
+    'INSERT INTO users (id, username, first_name, first_lastname, second_lastname, phone, email) '
+    'VALUES (?, ?, ?, ?, ?, ?, ?)'
+)
+INSERT_REQUEST_SQL = """
+    INSERT INTO requests (
+        user_id, request_number, request_seq,
+        request_type, entity_name, entity_phone, entity_notes,
+        activity_type,
+        pickup_province, pickup_canton, pickup_señas, pickup_map_link,
+        destination_province, destination_canton, destination_señas, destination_map_link,
+        notes, request_date,
+        pickup_lat, pickup_lon, destination_lat, destination_lon
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def _ascii(text):
+    return text.lower().translate(str.maketrans('áéíóúñü', 'aeiounu'))
+
+
+def generate_users(rng, count):
+    """Genera las filas de 'users' (id, username, nombre, apellidos, teléfono, email)."""
+    phones = set()
+    for user_id in range(1, count + 1):
+        first_name = rng.choice(FIRST_NAMES)
+        first_lastname, second_lastname = rng.choice(LAST_NAMES), rng.choice(LAST_NAMES)
+        # Teléfonos de 8 dígitos únicos: celulares (6, 7, 8) o fijos (2).
+        while True:
+            phone = f'{rng.choice("6782")}{rng.randrange(10 ** 7):07d}'
+            if phone not in phones:
+                phones.add(phone)
+                break
+        username = users.generate_custom_username(first_name, first_lastname, second_lastname, phone)
+        email = f'{_ascii(first_name)}.{_ascii(first_lastname)}{user_id}@example.com'
+        yield (user_id, username, first_name, first_lastname, second_lastname, phone, email)
+
+
+def map_link(rng, province):
+    """Enlace de mapa cerca del centro de la provincia, o '' (sin enlace)."""
+    if rng.random() >= MAP_LINK_RATE:
+        return ''
+    lat, lon = PROVINCE_CENTERS[province]
+    return rng.choice(MAP_LINK_FORMATS).format(
+        lat=rng.gauss(lat, 0.08), lon=rng.gauss(lon, 0.08), code=f'{rng.randrange(16 ** 8):08x}'
+    )
+
+
+def generate_requests(rng, users_count, count, counters, link_rng=None):
+    """
+    Genera las filas de 'requests' en orden cronológico. Cada solicitud se asigna a un
+    usuario con peso lognormal, de modo que el consecutivo por usuario sigue la fecha.
+    'counters' (user_id -> último consecutivo) se va completando mientras se genera.
+    Los enlaces de mapa salen de 'link_rng', aparte, para no alterar el resto de los datos.
+    """
+    link_rng = link_rng or random.Random(0)
+    weights = [rng.lognormvariate(0, 1.2) for _ in range(users_count)]
+    cumulative = []
+    total = 0.0
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+
+    provinces = catalogo.PROVINCES
+    chunk = 50000
+    step = timedelta(days=HISTORY_DAYS) / max(count, 1)
+    for start in range(0, count, chunk):
+        size = min(chunk, count - start)
+        user_ids = rng.choices(range(1, users_count + 1), cum_weights=cumulative, k=size)
+        activities = rng.choices(ACTIVITY_TYPES, weights=ACTIVITY_WEIGHTS, k=size)
+        for offset, (user_id, activity) in enumerate(zip(user_ids, activities)):
+            i = start + offset
+            seq = counters.get(user_id, 0) + 1
+            counters[user_id] = seq
+            pickup = rng.choice(provinces)
+            destination = rng.choice(provinces)
+            is_entity = rng.random() < 0.2
+            entity = rng.choice(ENTITIES) if is_entity else ''
+            note = rng.choice(NOTES).format(n=rng.randint(5, 45), h=rng.randint(5, 18))
+            links = {
+                'pickup_map_link': map_link(link_rng, pickup),
+                'destination_map_link': map_link(link_rng, destination),
+            }
+            yield (
+                user_id, str(seq).zfill(4), seq,
+                'SI' if is_entity else 'NO',
+                f'{entity} {rng.choice(LAST_NAMES)}' if is_entity else '',
+                f'2{rng.randrange(10 ** 7):07d}' if is_entity else '',
+                'Factura electrónica.' if is_entity and rng.random() < 0.5 else '',
+                activity,
+                pickup, rng.choice(catalogo.PROVINCES_AND_CANTONS[pickup]), rng.choice(LANDMARKS),
+                links['pickup_map_link'],
+                destination, rng.choice(catalogo.PROVINCES_AND_CANTONS[destination]), rng.choice(LANDMARKS),
+                links['destination_map_link'],
+                note,
+                (HISTORY_START + step * i).strftime('%Y-%m-%d %H:%M:%S'),
+                # Coordenadas como las guarda /solicitar (ver geo.py).
+                *geo.map_link_coordinates(links),
+            )
+
+
+def seed(path, users_count=10000, requests_count=200000, seed=42, batch_size=50000, verbose=True):
+    """Crea la base en 'path' (no debe existir) con los datos sintéticos de la semilla."""
+    if os.path.exists(path):
+        raise FileExistsError(f'La base {path} ya existe; use otra ruta o bórrela.')
+
+    rng = random.Random(seed)
+    conn = db._connect(path)
+    conn.execute('PRAGMA journal_mode = WAL')
+    start = time.perf_counter()
+    try:
+        migrations.upgrade(conn, analyze=False)
+
+        db.begin_immediate(conn)
+        conn.executemany(INSERT_USER_SQL, generate_users(rng, users_count))
+        conn.commit()
+
+        counters = {}
+        batch = []
+        inserted = 0
+        link_rng = random.Random(f'{seed}-map-links')
+        for row in generate_requests(rng, users_count, requests_count, counters, link_rng):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                db.begin_immediate(conn)
+                conn.executemany(INSERT_REQUEST_SQL, batch)
+                conn.commit()
+                inserted += len(batch)
+                batch = []
+                if verbose:
+                    elapsed = time.perf_counter() - start
+                    print(f'{inserted} solicitudes ({inserted / elapsed:.0f}/s)', file=sys.stderr)
+        db.begin_immediate(conn)
+        conn.executemany(INSERT_REQUEST_SQL, batch)
+        conn.executemany(
+            'INSERT INTO request_counters (user_id, last_number) VALUES (?, ?)',
+            counters.items()
+        )
+        conn.commit()
+
+        # Estadísticas con el volumen final: con las de una base vacía el planificador elige mal.
+        conn.execute('ANALYZE')
+    finally:
+        conn.close()
+
+    if verbose:
+        print(f'{users_count} usuarios y {requests_count} solicitudes en {time.perf_counter() - start:.1f}s: {path}')
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Genera una base con datos sintéticos reproducibles.')
+    parser.add_argument('path', help='Ruta de la base nueva (.db).')
+    parser.add_argument('--users', type=int, default=10000, help='Usuarios (por defecto 10000).')
+    parser.add_argument('--requests', type=int, default=200000, help='Solicitudes (por defecto 200000).')
+    parser.add_argument('--seed', type=int, default=42, help='Semilla del generador (por defecto 42).')
+    parser.add_argument('--batch-size', type=int, default=50000, help='Filas por transacción.')
+    args = parser.parse_args(argv)
+    seed(args.path, args.users, args.requests, args.seed, args.batch_size)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
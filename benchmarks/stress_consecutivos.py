@@ -0,0 +1,124 @@
+"""
+Prueba de estrés de los consecutivos de /solicitar.
+
+Dispara miles de envíos concurrentes (varios hilos, cada uno con su propio cliente de
+prueba de Flask) contra una base temporal y verifica que cada usuario tenga los
+consecutivos 0001..N sin huecos ni duplicados. Uso:
+
+    python benchmarks/stress_consecutivos.py --requests 4000 --threads 32 --users 5
+
+Termina con código 1 si encuentra algún hueco o duplicado.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+
+def _form(username):
+    """Formulario mínimo de /solicitar para un usuario existente."""
+    return {
+        'has_user': 'SI',
+        'username': username,
+        'es_entidad': 'NO',
+        'tipo_actividad': 'TURISMO',
+        'pickup_province': 'Cartago',
+        'pickup_canton': 'Paraíso',
+        'pickup_señas': 'Parque central',
+        'destination_province': 'Limón',
+        'destination_canton': 'Limón',
+        'destination_señas': 'Terminal',
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=4000, help='Total de envíos.')
+    parser.add_argument('--threads', type=int, default=32, help='Hilos concurrentes.')
+    parser.add_argument('--users', type=int, default=5, help='Usuarios entre los que se reparten los envíos.')
+    args = parser.parse_args(argv)
+
+    tmpdir = tempfile.mkdtemp(prefix='transavi-stress-')
+    db.DATABASE_PATH = os.path.join(tmpdir, 'db.db')
+
+    import migrations
+    migrations.upgrade()
+    from app import app
+
+    # Usuarios existentes: los envíos compiten por los consecutivos del mismo usuario.
+    conn = db.get_db_connection()
+    usernames = []
+    for i in range(args.users):
+        username = f'usr-{i:08d}'
+        conn.execute(
+            'INSERT INTO users (username, first_name, first_lastname, second_lastname, phone, email) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (username, 'Usuario', 'Prueba', 'Estres', f'{i:08d}', f'{username}@example.com')
+        )
+        usernames.append(username)
+    conn.commit()
+    conn.close()
+
+    errors = []
+    next_index = iter(range(args.requests))
+    index_lock = threading.Lock()
+
+    def worker():
+        client = app.test_client()
+        while True:
+            with index_lock:
+                i = next(next_index, None)
+            if i is None:
+                return
+            response = client.post('/solicitar', data=_form(usernames[i % len(usernames)]))
+            if response.status_code != 302:
+                errors.append(f'Envío {i}: HTTP {response.status_code}')
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    conn = db.get_db_connection()
+    numbers = defaultdict(list)
+    for row in conn.execute(
+        'SELECT u.username, r.request_number FROM requests r JOIN users u ON u.id = r.user_id'
+    ):
+        numbers[row['username']].append(row['request_number'])
+    counters = dict(conn.execute(
+        'SELECT u.username, c.last_number FROM request_counters c JOIN users u ON u.id = c.user_id'
+    ).fetchall())
+    conn.close()
+
+    total = sum(len(v) for v in numbers.values())
+    for username, values in sorted(numbers.items()):
+        expected = [str(n).zfill(4) for n in range(1, len(values) + 1)]
+        if sorted(values) != expected:
+            duplicates = len(values) - len(set(values))
+            errors.append(f'{username}: {duplicates} duplicados o huecos en {len(values)} solicitudes')
+        if counters.get(username) != len(values):
+            errors.append(f'{username}: contador {counters.get(username)} != {len(values)} solicitudes')
+    if total != args.requests:
+        errors.append(f'Se guardaron {total} de {args.requests} solicitudes')
+
+    print(f'{total} solicitudes en {elapsed:.2f}s ({total / elapsed:.0f}/s) con {args.threads} hilos')
+    for error in errors[:20]:
+        print(f'ERROR: {error}')
+    if errors:
+        return 1
+    print('OK: consecutivos sin huecos ni duplicados.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,406 @@
+"""
+Compilación de los archivos estáticos para producción.
+
+- CSS: resuelve los @import de static/css/main.css en un solo archivo, elimina las reglas
+  de Bulma (y del resto de hojas) cuyos selectores usan clases que no aparecen en
+  ninguna plantilla ni script, y lo minifica.
+- JS: minifica cada script de static/js.
+- Cada salida se escribe en static/dist con un hash de su contenido en el nombre, junto
+  con sus variantes precomprimidas .gz (y .br si está instalado el paquete 'brotli').
+- static/dist/manifest.json asocia el nombre lógico (ej: 'css/main.css') con el archivo
+  generado; la función asset_url() de las plantillas lo lee (ver assets.py).
+
+Uso:
+
+    python build_assets.py
+"""
+import argparse
+import glob
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+
+try:
+    import brotli
+except ImportError:  # Opcional: sin brotli solo se generan las variantes .gz
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_NAME = 'manifest.json'
+
+# Hojas de estilo de entrada (se combinan con sus @import) y scripts a minificar.
+CSS_ENTRIES = ('css/main.css',)
+JS_ENTRIES = ('js/*.js',)
+
+# Clases que se agregan de formas que el análisis de plantillas no puede ver.
+SAFELIST = set()
+
+# Palabras que pueden ser nombres de clase en plantillas y scripts.
+WORD = re.compile(r'[A-Za-z_][\w-]*')
+# Prefijos de clase completados dinámicamente: is-{% if ... %}, 'is-' + x, `is-${x}`.
+DYNAMIC_PREFIX = re.compile(r'([A-Za-z_][\w-]*-)(?:\{%|\{\{|\$\{|[\'"]\s*\+)')
+CLASS_SELECTOR = re.compile(r'\.(-?[A-Za-z_][\w-]*)')
+URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+DECLARATION_COLON = re.compile(r'(^|;)(-{0,2}[A-Za-z][\w-]*):\s+')
+IMPORT = re.compile(r'@import\s+url\(\s*[\'"]?([^\'")]+)[\'"]?\s*\)\s*;|@import\s+[\'"]([^\'"]+)[\'"]\s*;')
+
+
+# --- Clases usadas ---
+
+def collect_used_words():
+    """
+    Retorna el conjunto de palabras que aparecen en plantillas y scripts. Es un
+    superconjunto de las clases usadas: incluye las que se agregan desde JavaScript.
+    """
+    used = set(SAFELIST)
+    paths = glob.glob(os.path.join(TEMPLATES_DIR, '**', '*.html'), recursive=True)
+    paths += glob.glob(os.path.join(STATIC_DIR, 'js', '**', '*.js'), recursive=True)
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+        words = set(WORD.findall(text))
+        used |= words
+        for prefix in set(DYNAMIC_PREFIX.findall(text)):
+            used |= {prefix + word for word in words}
+    return used
+
+
+# --- CSS ---
+
+def _skip_string(css, i):
+    """Retorna el índice siguiente al final de la cadena que empieza en css[i]."""
+    quote = css[i]
+    i += 1
+    while i < len(css) and css[i] != quote:
+        i += 2 if css[i] == '\\' else 1
+    return i + 1
+
+
+def _find(css, i, chars):
+    """Busca el primer carácter de 'chars' desde i, saltando cadenas y paréntesis."""
+    depth = 0
+    while i < len(css):
+        c = css[i]
+        if c in '"\'':
+            i = _skip_string(css, i)
+            continue
+        if c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+        elif depth == 0 and c in chars:
+            return i
+        i += 1
+    return len(css)
+
+
+def _matching_brace(css, i):
+    """Retorna el índice de la llave que cierra la que está en css[i]."""
+    depth = 0
+    while i < len(css):
+        c = css[i]
+        if c in '"\'':
+            i = _skip_string(css, i)
+            continue
+        if c == '{':
+            depth += 1
+        elif c == '}':
+            depth -= 1
+            if depth == 0:
+                return i
+        i += 1
+    return len(css)
+
+
+def strip_comments(css):
+    """Elimina los comentarios, salvo los de licencia (/*! ... */)."""
+    out = []
+    i = 0
+    while i < len(css):
+        c = css[i]
+        if c in '"\'':
+            end = _skip_string(css, i)
+            out.append(css[i:end])
+            i = end
+        elif css.startswith('/*', i):
+            end = css.find('*/', i + 2)
+            end = len(css) if end == -1 else end + 2
+            if css.startswith('/*!', i):
+                out.append(css[i:end])
+            i = end
+        else:
+            out.append(c)
+            i += 1
+    return ''.join(out)
+
+
+def parse_css(css):
+    """
+    Divide una hoja en una lista de nodos:
+    ('statement', texto) para @charset/@import, ('comment', texto) para licencias,
+    ('rule', selectores, cuerpo) y ('at', preludio, cuerpo) para bloques @media, etc.
+    """
+    nodes = []
+    i = 0
+    while i < len(css):
+        if css[i].isspace():
+            i += 1
+            continue
+        if css.startswith('/*!', i):
+            end = css.find('*/', i) + 2
+            nodes.append(('comment', css[i:end]))
+            i = end
+            continue
+        end = _find(css, i, '{;')
+        if end >= len(css):
+            break
+        prelude = css[i:end].strip()
+        if css[end] == ';':
+            nodes.append(('statement', prelude + ';'))
+            i = end + 1
+            continue
+        close = _matching_brace(css, end)
+        body = css[end + 1:close]
+        nodes.append(('at' if prelude.startswith('@') else 'rule', prelude, body))
+        i = close + 1
+    return nodes
+
+
+# Bloques cuyo contenido son reglas que también se pueden depurar.
+GROUPING_AT_RULES = ('@media', '@supports', '@container', '@layer', '@document')
+
+
+def _required_classes(selector):
+    """Clases que el selector exige, ignorando las que están dentro de :not(), :is(), etc."""
+    depth = 0
+    outside = []
+    for c in selector:
+        if c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+        elif depth == 0:
+            outside.append(c)
+    return CLASS_SELECTOR.findall(''.join(outside))
+
+
+def _split_selectors(prelude):
+    parts = []
+    i = 0
+    while i <= len(prelude):
+        end = _find(prelude, i, ',')
+        parts.append(prelude[i:end].strip())
+        i = end + 1
+    return [p for p in parts if p]
+
+
+def prune_nodes(nodes, used):
+    """Elimina las reglas cuyos selectores requieren clases no usadas. Retorna (nodos, eliminadas)."""
+    kept = []
+    removed = 0
+    for node in nodes:
+        if node[0] == 'rule':
+            _, prelude, body = node
+            if '{' in body:  # CSS anidado: se conserva tal cual
+                kept.append(node)
+                continue
+            selectors = [s for s in _split_selectors(prelude)
+                         if all(cls in used for cls in _required_classes(s))]
+            if selectors:
+                kept.append(('rule', ', '.join(selectors), body))
+            else:
+                removed += 1
+        elif node[0] == 'at' and node[1].lower().startswith(GROUPING_AT_RULES):
+            children, child_removed = prune_nodes(parse_css(node[2]), used)
+            removed += child_removed
+            if children:
+                kept.append(('at', node[1], serialize(children)))
+        else:
+            kept.append(node)
+    return kept, removed
+
+
+def _collapse(text):
+    """Reduce los espacios fuera de cadenas y los elimina junto a { } ; , y >."""
+    out = []
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c in '"\'':
+            end = _skip_string(text, i)
+            out.append(text[i:end])
+            i = end
+        elif c.isspace():
+            while i < len(text) and text[i].isspace():
+                i += 1
+            prev = out[-1][-1:] if out else ''
+            nxt = text[i:i + 1]
+            if prev and nxt and prev not in '{};,>' and nxt not in '{};,>':
+                out.append(' ')
+        else:
+            out.append(c)
+            i += 1
+    return ''.join(out)
+
+
+def serialize(nodes):
+    """Convierte los nodos de vuelta a CSS minificado."""
+    parts = []
+    for node in nodes:
+        if node[0] in ('statement', 'comment'):
+            parts.append(node[1])
+        else:
+            body = _collapse(node[2]).strip()
+            if node[0] == 'rule':
+                # 'propiedad: valor' -> 'propiedad:valor' (los nombres de propiedad no llevan cadenas).
+                body = DECLARATION_COLON.sub(r'\1\2:', body).rstrip(';')
+            parts.append(f'{_collapse(node[1])}{{{body}}}')
+        if node[0] == 'comment':
+            parts.append('\n')
+    return ''.join(parts)
+
+
+def bundle_css(entry):
+    """
+    Combina una hoja con sus @import locales (recursivo). Las url() relativas se reescriben
+    respecto de la ubicación del archivo generado. Retorna (css, importaciones omitidas).
+    """
+    missing = []
+    output_dir = os.path.dirname(os.path.join(DIST_DIR, entry))
+
+    def rebase(path, css):
+        def replace(match):
+            target = match.group(2)
+            if re.match(r'^([a-z]+:|/|#)', target):
+                return match.group(0)
+            absolute = os.path.normpath(os.path.join(os.path.dirname(path), target))
+            return f"url('{os.path.relpath(absolute, output_dir).replace(os.sep, '/')}')"
+        return URL.sub(replace, css)
+
+    def load(path):
+        with open(path, encoding='utf-8') as f:
+            css = strip_comments(f.read())
+        css = re.sub(r'@charset\s+"[^"]*"\s*;', '', css)
+
+        def replace(match):
+            target = match.group(1) or match.group(2)
+            if re.match(r'^(https?:)?//', target):
+                return match.group(0)
+            target_path = os.path.normpath(os.path.join(os.path.dirname(path), target))
+            if not os.path.isfile(target_path):
+                missing.append(os.path.relpath(target_path, STATIC_DIR))
+                return ''
+            return load(target_path)
+
+        # Primero se resuelven los @import (que también usan url()) y luego se reescriben las url().
+        css = IMPORT.sub(replace, css)
+        return css if path == os.path.join(STATIC_DIR, entry) else rebase(path, css)
+
+    return load(os.path.join(STATIC_DIR, entry)), missing
+
+
+def build_css(entry, used):
+    css, missing = bundle_css(entry)
+    nodes = parse_css(css)
+    # Los @import remotos deben ir al inicio de la hoja.
+    nodes.sort(key=lambda n: 0 if n[0] == 'statement' and n[1].startswith('@import') else 1)
+    nodes, removed = prune_nodes(nodes, used)
+    return '@charset "UTF-8";\n' + serialize(nodes), removed, missing
+
+
+# --- JS ---
+
+def minify_js(js):
+    """
+    Minificación conservadora: elimina las líneas vacías, los comentarios de línea completa
+    y la sangría. No reescribe el código, por lo que no puede alterar su comportamiento.
+    """
+    lines = []
+    in_block_comment = False
+    for line in js.splitlines():
+        stripped = line.strip()
+        if in_block_comment:
+            if '*/' in stripped:
+                in_block_comment = False
+            continue
+        if stripped.startswith('/*') and '*/' not in stripped:
+            in_block_comment = True
+            continue
+        if not stripped or stripped.startswith('//') or (stripped.startswith('/*') and stripped.endswith('*/')):
+            continue
+        lines.append(stripped)
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+# --- Salida ---
+
+def write_asset(logical_name, content):
+    """Escribe el archivo con hash en el nombre y sus variantes comprimidas. Retorna la ruta relativa."""
+    data = content.encode('utf-8')
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    stem, ext = os.path.splitext(logical_name)
+    relative = f'{stem}.{digest}{ext}'
+    path = os.path.join(DIST_DIR, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    # mtime=0 hace que el .gz sea reproducible (mismo contenido, mismos bytes).
+    with open(path + '.gz', 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=9, mtime=0) as gz:
+        gz.write(data)
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+    return relative.replace(os.sep, '/')
+
+
+def build(verbose=True):
+    """Genera static/dist y su manifest. Retorna el manifest."""
+    if os.path.isdir(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+    os.makedirs(DIST_DIR)
+
+    used = collect_used_words()
+    manifest = {}
+
+    for entry in CSS_ENTRIES:
+        css, removed, missing = build_css(entry, used)
+        manifest[entry] = write_asset(entry, css)
+        original = os.path.getsize(os.path.join(STATIC_DIR, entry))
+        if verbose:
+            for path in missing:
+                print(f'Aviso: {entry} importa {path}, que no existe; se omite.')
+            print(f'{entry} -> {manifest[entry]} ({len(css.encode()) // 1024} KB, {removed} reglas sin uso eliminadas)')
+
+    for pattern in JS_ENTRIES:
+        for path in sorted(glob.glob(os.path.join(STATIC_DIR, pattern))):
+            entry = os.path.relpath(path, STATIC_DIR).replace(os.sep, '/')
+            with open(path, encoding='utf-8') as f:
+                js = minify_js(f.read())
+            manifest[entry] = write_asset(entry, js)
+            if verbose:
+                print(f'{entry} -> {manifest[entry]} ({len(js.encode()) // 1024} KB)')
+
+    with open(os.path.join(DIST_DIR, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    if verbose and brotli is None:
+        print("Aviso: el paquete 'brotli' no está instalado; solo se generaron variantes .gz.")
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compila CSS/JS con hash de contenido en static/dist.')
+    parser.add_argument('--quiet', action='store_true', help='No mostrar el resumen.')
+    args = parser.parse_args(argv)
+    build(verbose=not args.quiet)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""
+Catálogo de provincias y cantones de Costa Rica para el formulario de solicitud.
+
+Se sirve como JSON en /catalogo/provincias.json. La URL que usan las plantillas lleva
+la versión del catálogo (?v=<hash del contenido>), así que el navegador la guarda un
+año y solo vuelve a descargarla si el catálogo cambia. Sin ?v= (o con una versión
+vieja) la respuesta se revalida con ETag.
+"""
+import hashlib
+import json
+
+from flask import Blueprint, Response, request, url_for
+
+catalogo_bp = Blueprint('catalogo_bp', __name__, url_prefix='/catalogo')
+
+# Estructura de Provincias y Cantones de Costa Rica (el orden es el de los <select>).
+PROVINCES_AND_CANTONS = {
+    'San José': [
+        'San José', 'Escazú', 'Desamparados', 'Aserrí', 'Mora', 'Goicoechea',
+        'Santa Ana', 'Alajuelita', 'Vázquez de Coronado', 'Acosta', 'Tibás',
+        'Moravia', 'Montes de Oca', 'Turrubares', 'Dota', 'Curridabat',
+        'Pérez Zeledón', 'León Cortés'
+    ],
+    'Alajuela': [
+        'Alajuela', 'San Ramón', 'Grecia', 'San Mateo', 'Atenas', 'Naranjo',
+        'Palmares', 'Poás', 'Orotina', 'San Carlos', 'Zarcero', 'Sarchí',
+        'Upala', 'Los Chiles', 'Guatuso', 'Río Cuarto'
+    ],
+    'Cartago': [
+        'Cartago', 'Paraíso', 'La Unión', 'Jiménez', 'Turrialba', 'Alvarado',
+        'Oreamuno', 'El Guarco'
+    ],
+    'Heredia': [
+        'Heredia', 'Barva', 'Santo Domingo', 'Santa Bárbara', 'San Rafael',
+        'San Isidro', 'Belén', 'Flores', 'San Pablo', 'Sarapiquí'
+    ],
+    'Guanacaste': [
+        'Liberia', 'Nicoya', 'Santa Cruz', 'Bagaces', 'Carrillo', 'Cañas',
+        'Abangares', 'Tilarán', 'Nandayure', 'La Cruz', 'Hojancha'
+    ],
+    'Puntarenas': [
+        'Puntarenas', 'Esparza', 'Buenos Aires', 'Montes de Oro', 'Osa',
+        'Aguirre', 'Golfito', 'Coto Brus', 'Parrita', 'Corredores', 'Garabito', 'Puerto Jiménez'
+    ],
+    'Limón': [
+        'Limón', 'Pococí', 'Siquirres', 'Talamanca', 'Matina', 'Guácimo'
+    ],
+}
+
+PROVINCES = tuple(PROVINCES_AND_CANTONS)
+
+# El cuerpo de la respuesta se serializa una sola vez; la versión es el hash del contenido.
+CATALOG_JSON = json.dumps(PROVINCES_AND_CANTONS, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+CATALOG_VERSION = hashlib.sha256(CATALOG_JSON).hexdigest()[:12]
+
+# Un año: la URL versionada cambia si cambia el contenido.
+IMMUTABLE_MAX_AGE = 31536000
+
+
+def catalog_url():
+    """URL versionada del catálogo, para usar en las plantillas."""
+    return url_for('catalogo_bp.provincias', v=CATALOG_VERSION)
+
+
+@catalogo_bp.route('/provincias.json')
+def provincias():
+    """Catálogo de provincias y cantones en JSON, cacheable por el navegador."""
+    response = Response(CATALOG_JSON, mimetype='application/json')
+    response.set_etag(CATALOG_VERSION)
+    response.cache_control.public = True
+    if request.args.get('v') == CATALOG_VERSION:
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
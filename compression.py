@@ -0,0 +1,64 @@
+"""
+Compresión gzip/deflate de las respuestas JSON y HTML.
+
+Se aplica en after_request a las respuestas 200 cuyo tipo está en COMPRESS_MIMETYPES y
+cuyo cuerpo supera app.config['COMPRESS_MIN_SIZE'] bytes, según el Accept-Encoding del
+cliente. No toca las respuestas en streaming (exportaciones) ni las que ya traen
+Content-Encoding (archivos precomprimidos de static/dist).
+
+El ETag de una respuesta comprimida pasa a ser débil: la representación cambia con la
+codificación, pero la revalidación (If-None-Match) compara en forma débil y sigue
+respondiendo 304.
+"""
+import gzip
+import zlib
+
+from flask import request
+
+# Tipos que se comprimen; el resto (imágenes, CSS/JS ya comprimidos) se envía tal cual.
+COMPRESS_MIMETYPES = ('application/json', 'text/html')
+# Codificaciones soportadas, en orden de preferencia ante un empate de calidad.
+ENCODINGS = ('gzip', 'deflate')
+# Bytes mínimos para comprimir: por debajo, las cabeceras pesan más que el ahorro.
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_LEVEL = 6
+
+
+def compress(data, encoding, level=DEFAULT_LEVEL):
+    """Comprime 'data' con la codificación HTTP indicada ('gzip' o 'deflate')."""
+    if encoding == 'gzip':
+        # mtime=0: la misma respuesta produce siempre los mismos bytes.
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    # 'deflate' en HTTP es el formato zlib (RFC 1950), no deflate crudo.
+    return zlib.compress(data, level)
+
+
+def _compress_response(response, min_size, level):
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESS_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+    encoding = request.accept_encodings.best_match(ENCODINGS)
+    if encoding is None:
+        return response
+
+    response.set_data(compress(data, encoding, level))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    """Registra la compresión de respuestas (app.config['COMPRESS_MIN_SIZE'], 'COMPRESS_LEVEL')."""
+    app.config.setdefault('COMPRESS_MIN_SIZE', DEFAULT_MIN_SIZE)
+    app.config.setdefault('COMPRESS_LEVEL', DEFAULT_LEVEL)
+
+    @app.after_request
+    def compress_response(response):
+        return _compress_response(response, app.config['COMPRESS_MIN_SIZE'], app.config['COMPRESS_LEVEL'])
@@ -1,5 +1,11 @@
 import sqlite3
 import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g
 
 # Definir la ruta de la base de datos dentro de un directorio 'instance'
 # Esto es una buena práctica en Flask
@@ -8,105 +14,262 @@ DATABASE_PATH = os.path.join(BASE_DIR, 'instance', 'db.db')
 # Asegurarse de que el directorio 'instance' exista
 os.makedirs(os.path.join(BASE_DIR, 'instance'), exist_ok=True)
 
+# --- Configuración del Pool de Conexiones ---
+# Cantidad máxima de conexiones abiertas por proceso.
+POOL_SIZE = int(os.environ.get('TRANSAVI_DB_POOL_SIZE', 8))
+# Segundos que una solicitud espera por una conexión libre antes de fallar.
+POOL_TIMEOUT = float(os.environ.get('TRANSAVI_DB_POOL_TIMEOUT', 10))
+# Milisegundos que SQLite reintenta internamente ante 'database is locked'.
+BUSY_TIMEOUT_MS = 5000
 
-def get_db_connection():
-    """Establece y retorna una conexión a la base de datos SQLite."""
-    # Usamos la ruta completa para asegurar la conexión
-    conn = sqlite3.connect(DATABASE_PATH)
+# PRAGMAs que se aplican a cada conexión al abrirla (una sola vez por conexión).
+# journal_mode=WAL es persistente en el archivo, por lo que se fija al crear el pool.
+CONNECTION_PRAGMAS = (
+    'PRAGMA synchronous = NORMAL',
+    f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}',
+    'PRAGMA cache_size = -16000',      # ~16 MB de caché de páginas por conexión
+    'PRAGMA mmap_size = 268435456',    # 256 MB de lectura mapeada en memoria
+    'PRAGMA temp_store = MEMORY',
+)
+
+# Reintentos de BEGIN IMMEDIATE cuando, tras esperar busy_timeout, la base sigue bloqueada.
+LOCKED_RETRIES = 2
+
+# --- Puntos de instrumentación (ver metrics.py) ---
+# Clase de las conexiones nuevas; metrics.py la reemplaza por una que mide el SQL.
+CONNECTION_FACTORY = sqlite3.Connection
+# Si no son None: pool_wait_observer(segundos, timed_out) tras cada acquire() del pool y
+# locked_observer(retrying) ante cada 'database is locked' en begin_immediate().
+pool_wait_observer = None
+locked_observer = None
+
+
+def _connect(path=None, uri=False):
+    """
+    Abre una conexión nueva con el row_factory y los PRAGMAs del proyecto.
+    Con uri=True 'path' es un URI 'file:' (ej: para abrir en solo lectura).
+    """
+    # check_same_thread=False: las conexiones del pool pasan de un hilo a otro,
+    # pero nunca son usadas por dos hilos a la vez.
+    conn = sqlite3.connect(
+        path or DATABASE_PATH,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,
+        factory=CONNECTION_FACTORY,
+        uri=uri,
+    )
     conn.row_factory = sqlite3.Row  # Permite acceder a los datos por nombre de columna
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
-def get_last_request_number(cursor, user_id):
-    """Obtiene el último número de solicitud para un user_id dado."""
+
+def get_db_connection():
+    """
+    Establece y retorna una conexión nueva (fuera del pool) a la base de datos SQLite.
+    Útil para scripts y comandos de línea; quien la abre es responsable de cerrarla.
+    """
+    return _connect()
+
+
+class ConnectionPool:
+    """
+    Pool acotado de conexiones SQLite configuradas.
+    Las conexiones se entregan con acquire() y se devuelven con release(). Se abren a
+    medida que hacen falta (hasta 'size'): un worker recién iniciado abre solo una.
+    """
+
+    def __init__(self, path, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._all = []
+        self._lock = threading.Lock()
+
+        # WAL permite lectores concurrentes con un escritor; se fija una sola vez.
+        conn = _connect(path)
+        conn.execute('PRAGMA journal_mode = WAL')
+        self._all.append(conn)
+        self._idle.put(conn)
+
+    def _open_if_below_size(self):
+        """Abre una conexión nueva si todas están ocupadas y aún no se llegó a 'size'."""
+        with self._lock:
+            if len(self._all) >= self.size:
+                return None
+            conn = _connect(self.path)
+            self._all.append(conn)
+            return conn
+
+    def acquire(self):
+        """Retorna una conexión libre; espera hasta 'timeout' segundos si no hay."""
+        observer = pool_wait_observer
+        start = time.perf_counter() if observer is not None else None
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._open_if_below_size()
+        if conn is None:
+            try:
+                conn = self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                if observer is not None:
+                    observer(time.perf_counter() - start, True)
+                raise sqlite3.OperationalError(
+                    f'No hay conexiones disponibles en el pool ({self.size}) tras {self.timeout}s'
+                )
+        if observer is not None:
+            observer(time.perf_counter() - start, False)
+        return conn
+
+    def release(self, conn):
+        """Devuelve la conexión al pool, descartando cualquier transacción abierta."""
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put_nowait(conn)
+
+    def close(self):
+        """Cierra todas las conexiones del pool."""
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all = []
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Retorna el pool del proceso, creándolo en el primer uso."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DATABASE_PATH)
+    return _pool
+
+
+def close_pool():
+    """Cierra y descarta el pool del proceso (el próximo uso crea uno nuevo)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def reset_after_fork():
+    """
+    Descarta, sin cerrarlas, las conexiones heredadas del proceso padre: SQLite no admite
+    usar en el hijo conexiones abiertas antes de un fork. El hijo crea su pool al usarlo.
+    """
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+@contextmanager
+def pooled_connection():
+    """Presta una conexión del pool fuera de un contexto de Flask (hilos, generadores)."""
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+def get_db():
+    """
+    Retorna la conexión del contexto de aplicación actual.
+    Se toma del pool en el primer uso y se devuelve en close_db().
+    """
+    conn = getattr(g, '_database', None)
+    if conn is None:
+        conn = g._database = get_pool().acquire()
+    return conn
+
+
+def close_db(exception=None):
+    """Devuelve al pool la conexión del contexto de aplicación, si se tomó una."""
+    conn = g.pop('_database', None)
+    if conn is not None:
+        get_pool().release(conn)
+
+
+def init_app(app):
+    """Registra la devolución de conexiones al pool al terminar cada contexto."""
+    app.teardown_appcontext(close_db)
+
+def begin_immediate(conn):
+    """
+    Abre una transacción de escritura (BEGIN IMMEDIATE) en la conexión.
+    Toma el bloqueo de escritura al inicio, de modo que las lecturas y escrituras
+    siguientes no puedan intercalarse con las de otra conexión.
+    Si tras busy_timeout la base sigue bloqueada, reintenta hasta LOCKED_RETRIES veces:
+    todavía no se ha escrito nada, así que reintentar es seguro.
+    """
+    for attempt in range(LOCKED_RETRIES + 1):
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            return
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            retrying = attempt < LOCKED_RETRIES
+            if locked_observer is not None:
+                locked_observer(retrying)
+            if not retrying:
+                raise
+            time.sleep(0.05 * (attempt + 1))
+
+
+def allocate_request_number(cursor, user_id):
+    """
+    Reserva y retorna el siguiente número de solicitud (entero) para un user_id.
+    Debe ejecutarse dentro de la misma transacción que inserta la solicitud.
+    """
     cursor.execute(
-        'SELECT request_number FROM requests WHERE user_id = ? ORDER BY id DESC LIMIT 1',
+        """
+        INSERT INTO request_counters (user_id, last_number) VALUES (?, 1)
+        ON CONFLICT (user_id) DO UPDATE SET last_number = last_number + 1
+        RETURNING last_number
+        """,
         (user_id,)
     )
-    result = cursor.fetchone()
-    if result:
-        # Devuelve el número de solicitud como entero
-        return int(result['request_number'])
-    return 0 # Si no hay solicitudes, devuelve 0
+    return cursor.fetchone()[0]
+
+
+def allocate_request_number_for_username(cursor, username):
+    """
+    Igual que allocate_request_number, pero busca el usuario por su username en la misma
+    sentencia. Retorna (user_id, número), o None si el usuario no existe.
+    """
+    # El WHERE evita que SQLite lea 'ON CONFLICT' como condición de un JOIN del SELECT.
+    cursor.execute(
+        """
+        INSERT INTO request_counters (user_id, last_number)
+        SELECT id, 1 FROM users WHERE username = ?
+        ON CONFLICT (user_id) DO UPDATE SET last_number = last_number + 1
+        RETURNING user_id, last_number
+        """,
+        (username,)
+    )
+    row = cursor.fetchone()
+    return (row[0], row[1]) if row else None
 
 
 def create_tables():
-    """Crea las tablas 'users', 'requests' y la nueva tabla 'admins' si no existen."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Tabla de Usuarios (Cuentas de Solicitud/Clientes)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL UNIQUE,
-            first_name TEXT NOT NULL,
-            first_lastname TEXT NOT NULL,
-            second_lastname TEXT NOT NULL,
-            phone TEXT NOT NULL,
-            email TEXT NOT NULL UNIQUE
-        )
-    ''')
-
-    # NUEVA TABLA: Administradores (Cuentas de Superusuario)
-    # Nota: En una aplicación real, la contraseña debe estar hasheada.
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS admins (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL UNIQUE,
-            password TEXT NOT NULL, 
-            role TEXT DEFAULT 'admin' -- Rol simple para diferenciar
-        )
-    ''')
-
-    # Tabla de Solicitudes
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS requests (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            
-            -- Nuevo campo consecutivo por usuario
-            request_number TEXT NOT NULL,
-            
-            -- Información de la Entidad/Solicitud
-            request_type TEXT NOT NULL, -- SI / NO
-            entity_name TEXT,
-            entity_phone TEXT,
-            entity_notes TEXT,
-            
-            -- Información del Recorrido
-            activity_type TEXT NOT NULL,
-            
-            -- Lugar de Recogida
-            pickup_province TEXT NOT NULL,
-            pickup_canton TEXT NOT NULL,
-            pickup_señas TEXT NOT NULL,
-            pickup_map_link TEXT,
-            
-            -- Destino
-            destination_province TEXT NOT NULL,
-            destination_canton TEXT NOT NULL,
-            destination_señas TEXT NOT NULL,
-            destination_map_link TEXT,
-            
-            -- Notas generales del recorrido
-            notes TEXT,
-            
-            request_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    # OPCIONAL: Insertar un administrador inicial si la tabla está vacía
-    cursor.execute("SELECT COUNT(*) FROM admins")
-    if cursor.fetchone()[0] == 0:
-        # Administrador por defecto: admin / 12345
-        # NOTA: En producción, usar una contraseña hasheada como hash(12345)
-        cursor.execute("INSERT INTO admins (username, password) VALUES (?, ?)", ('admin', '12345'))
-        print("Administrador inicial creado: Usuario='admin', Contraseña='12345'")
-    
-    conn.commit()
-    conn.close()
-    
+    """
+    Crea o actualiza el esquema aplicando las migraciones pendientes (ver migrations.py).
+    Se conserva por compatibilidad; el punto de entrada recomendado es 'python migrations.py'.
+    """
+    import migrations  # Importación diferida: migrations.py depende de este módulo
+    migrations.upgrade()
+
+
 if __name__ == '__main__':
     create_tables()
     print("Tablas de la base de datos creadas exitosamente.")
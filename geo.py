@@ -0,0 +1,207 @@
+"""
+Coordenadas de recogida y destino a partir de los enlaces de mapa del formulario.
+
+pickup_map_link y destination_map_link son URLs libres. Este módulo extrae la latitud y
+la longitud de los formatos comunes, sin consultar ningún servicio:
+
+- Google Maps: '...!3d9.93!4d-84.08' (marcador), '?q=9.93,-84.08', '?query=',
+  '?destination=', '?daddr=', '@9.93,-84.08,15z' (centro del mapa).
+- Waze y Apple Maps: '?ll=9.93,-84.08'.
+- OpenStreetMap: '?mlat=9.93&mlon=-84.08' y '#map=15/9.93/-84.08'.
+- URIs 'geo:9.93,-84.08' y el texto '9.93, -84.08' pegado tal cual.
+
+Los enlaces cortos (maps.app.goo.gl, goo.gl/maps) no traen coordenadas: quedan sin ubicar.
+
+Las coordenadas se guardan en requests.pickup_lat/pickup_lon y destination_lat/
+destination_lon (migración 9) al registrar cada solicitud, y los triggers las indexan en
+las tablas R-tree requests_pickup_rtree y requests_destination_rtree, que responden las
+búsquedas por cercanía (/solicitudes/nearby) sin recorrer 'requests'. Como la búsqueda de
+texto, cubren solo la base viva (no las solicitudes archivadas, ver archive.py).
+
+Para completar las solicitudes registradas antes de la migración, o recalcular todas
+después de cambiar este módulo:
+
+    python geo.py [--batch-size 1000] [--all] [--dry-run]
+"""
+import argparse
+import math
+import re
+import sys
+import time
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import db
+
+# Puntos de una solicitud con coordenadas; cada uno tiene sus columnas y su R-tree.
+POINTS = ('pickup', 'destination')
+COORDINATE_COLUMNS = ('pickup_lat', 'pickup_lon', 'destination_lat', 'destination_lon')
+
+# Radio medio de la Tierra (km) y kilómetros por grado de latitud.
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+_NUMBER = r'(-?\d{1,3}(?:\.\d+)?)'
+_PAIR = re.compile(r'^\s*' + _NUMBER + r'\s*,\s*' + _NUMBER)
+# Parámetros de la URL con 'lat,lon', en orden de preferencia.
+_QUERY_KEYS = ('ll', 'q', 'query', 'destination', 'daddr', 'center', 'sll', 'saddr', 'origin')
+# Patrones sobre el texto completo, del más al menos preciso.
+_PATTERNS = (
+    re.compile(r'!3d' + _NUMBER + r'!4d' + _NUMBER),                 # Google Maps: marcador
+    re.compile(r'@' + _NUMBER + r',' + _NUMBER),                     # Google Maps: centro
+    re.compile(r'^geo:' + _NUMBER + r',' + _NUMBER),                 # URI geo:
+    re.compile(r'#map=\d+(?:\.\d+)?/' + _NUMBER + r'/' + _NUMBER),   # OpenStreetMap
+)
+
+
+def _valid(lat, lon):
+    """(lat, lon) redondeadas a 7 decimales (~1 cm), o None si están fuera de rango."""
+    lat, lon = float(lat), float(lon)
+    # (0, 0) es el valor por defecto de algunos mapas, no una ubicación real.
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180) or (lat == 0 and lon == 0):
+        return None
+    return round(lat, 7), round(lon, 7)
+
+
+def parse_map_link(link):
+    """Retorna (lat, lon) del enlace de mapa, o None si no trae coordenadas."""
+    if not link:
+        return None
+    text = unquote(str(link).strip())
+
+    match = _PATTERNS[0].search(text)
+    if match:
+        return _valid(*match.groups())
+
+    query = parse_qs(urlsplit(text).query)
+    if query.get('mlat') and query.get('mlon'):
+        try:
+            return _valid(query['mlat'][0], query['mlon'][0])
+        except ValueError:
+            pass
+    for key in _QUERY_KEYS:
+        for value in query.get(key, ()):
+            match = _PAIR.match(value)
+            if match:
+                return _valid(*match.groups())
+
+    for pattern in _PATTERNS[1:]:
+        match = pattern.search(text)
+        if match:
+            return _valid(*match.groups())
+
+    match = _PAIR.match(text)
+    if match and match.end() == len(text.rstrip()):
+        return _valid(*match.groups())
+    return None
+
+
+def map_link_coordinates(request_data):
+    """Valores de COORDINATE_COLUMNS (None si no hay) para los enlaces de una solicitud."""
+    values = []
+    for point in POINTS:
+        values.extend(parse_map_link(request_data.get(f'{point}_map_link')) or (None, None))
+    return tuple(values)
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Distancia de círculo máximo (haversine) en kilómetros."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat, lon, radius_km):
+    """(min_lat, max_lat, min_lon, max_lon) que contiene el círculo de 'radius_km'."""
+    delta_lat = radius_km / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(lat))
+    # Cerca de los polos el círculo abarca todas las longitudes.
+    delta_lon = 180 if cos_lat < 1e-6 else min(radius_km / (KM_PER_DEGREE * cos_lat), 180)
+    return (
+        max(lat - delta_lat, -90), min(lat + delta_lat, 90),
+        max(lon - delta_lon, -180), min(lon + delta_lon, 180),
+    )
+
+
+def backfill_coordinates(conn, batch_size=1000, recompute=False, dry_run=False):
+    """
+    Recorre 'requests' por lotes en orden de id y guarda las coordenadas de sus enlaces.
+    Sin 'recompute' solo revisa las filas con un enlace y sin coordenadas; con él,
+    recalcula todas (y borra las de los enlaces que ya no se reconocen).
+    Retorna un diccionario con los conteos de filas revisadas, ubicadas y sin ubicar.
+    """
+    stats = {'scanned': 0, 'located': 0, 'unparsed': 0}
+    pending = '' if recompute else """
+        AND ((pickup_map_link != '' AND pickup_lat IS NULL)
+             OR (destination_map_link != '' AND destination_lat IS NULL))
+    """
+    cursor = conn.cursor()
+    last_id = 0
+
+    while True:
+        db.begin_immediate(conn)
+        cursor.execute(
+            f"""
+            SELECT id, pickup_map_link, destination_map_link, {', '.join(COORDINATE_COLUMNS)}
+            FROM requests
+            WHERE id > ? {pending}
+            ORDER BY id
+            LIMIT ?
+            """,
+            (last_id, batch_size)
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            conn.rollback()
+            break
+
+        updates = []
+        for row in rows:
+            stats['scanned'] += 1
+            values = map_link_coordinates(dict(row))
+            if any(value is not None for value in values):
+                stats['located'] += 1
+            else:
+                stats['unparsed'] += 1
+            # Solo se escriben las filas que cambian: el UPDATE dispara los triggers del R-tree.
+            if values != tuple(row[column] for column in COORDINATE_COLUMNS):
+                updates.append((*values, row['id']))
+
+        cursor.executemany(
+            f"UPDATE requests SET {', '.join(f'{column} = ?' for column in COORDINATE_COLUMNS)} WHERE id = ?",
+            updates
+        )
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+        last_id = rows[-1]['id']
+
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Completa las coordenadas de las solicitudes desde sus enlaces de mapa.')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Filas por transacción (por defecto 1000).')
+    parser.add_argument('--all', action='store_true', help='Recalcula todas las solicitudes, no solo las pendientes.')
+    parser.add_argument('--dry-run', action='store_true', help='Solo reporta; no guarda cambios.')
+    args = parser.parse_args(argv)
+
+    conn = db.get_db_connection()
+    start = time.perf_counter()
+    try:
+        stats = backfill_coordinates(conn, batch_size=args.batch_size, recompute=args.all, dry_run=args.dry_run)
+    finally:
+        conn.close()
+
+    print(
+        f"{stats['scanned']} solicitudes revisadas en {time.perf_counter() - start:.1f}s: "
+        f"{stats['located']} con coordenadas, {stats['unparsed']} con enlaces sin coordenadas reconocibles."
+    )
+    if args.dry_run:
+        print('Modo --dry-run: no se guardó ningún cambio.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
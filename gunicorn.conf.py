@@ -0,0 +1,37 @@
+"""
+Configuración de gunicorn para servir TRANSAVI con varios procesos. Uso:
+
+    gunicorn -c gunicorn.conf.py
+
+- La aplicación se carga una sola vez en el proceso maestro (preload_app) y los workers
+  la heredan con fork.
+- Las migraciones se aplican una sola vez, en el maestro, antes de crear los workers.
+- Cada worker descarta las conexiones SQLite heredadas y abre las suyas (post_fork);
+  el hilo del commit agrupado y el de la instantánea se crean en cada worker.
+- La clave de sesión es la misma en todos los workers (ver app.load_secret_key).
+
+Variables de entorno: TRANSAVI_BIND (por defecto 0.0.0.0:3030), TRANSAVI_WORKERS (por
+defecto, un worker por núcleo) y TRANSAVI_THREADS (hilos por worker, por defecto 4).
+"""
+import multiprocessing
+import os
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('TRANSAVI_BIND', '0.0.0.0:3030')
+workers = int(os.environ.get('TRANSAVI_WORKERS', multiprocessing.cpu_count()))
+# Hilos por worker: deben ser menos que TRANSAVI_DB_POOL_SIZE (8) para no esperar conexiones.
+worker_class = 'gthread'
+threads = int(os.environ.get('TRANSAVI_THREADS', 4))
+preload_app = True
+
+
+def on_starting(server):
+    """Aplica las migraciones pendientes una vez, antes de crear los workers."""
+    import migrations
+    migrations.upgrade()
+
+
+def post_fork(server, worker):
+    """Cada worker abre sus propias conexiones a SQLite."""
+    import db
+    db.reset_after_fork()
@@ -0,0 +1,59 @@
+"""
+Validadores (ETag) y GET condicional para los endpoints JSON de lectura.
+
+El endpoint calcula primero un validador barato (ej: users.requests_version, leído por
+índice) y, si coincide con el If-None-Match del cliente, responde 304 sin ejecutar la
+consulta completa ni serializar el JSON. Las respuestas llevan 'Cache-Control: private,
+no-cache': el navegador puede guardarlas, pero debe revalidarlas en cada uso.
+"""
+import hashlib
+
+from flask import Response, jsonify, request
+
+
+def make_etag(*parts):
+    """ETag a partir de las partes que determinan la respuesta (ids, versiones...)."""
+    return '-'.join(str(part) for part in parts)
+
+
+def content_etag(values):
+    """ETag a partir de los valores mismos, para respuestas que no tienen versión."""
+    return hashlib.blake2b(repr(tuple(values)).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def requested_fields(allowed):
+    """
+    Campos pedidos con ?fields=a,b (proyección), validados contra 'allowed'.
+    Retorna una tupla en el orden pedido, o None si no se pidió proyección.
+    Lanza ValueError con un mensaje para el cliente si algún campo no está permitido.
+    """
+    raw = request.args.get('fields')
+    if raw is None:
+        return None
+    fields = tuple(dict.fromkeys(f.strip() for f in raw.split(',') if f.strip()))
+    invalid = [f for f in fields if f not in allowed]
+    if not fields or invalid:
+        raise ValueError(f"Campos no válidos en 'fields': {', '.join(invalid) or '(vacío)'}. "
+                         f"Permitidos: {', '.join(allowed)}.")
+    return fields
+
+
+def _set_validators(response, etag):
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def not_modified(etag):
+    """Retorna la respuesta 304 si el cliente ya tiene esta versión; si no, None."""
+    if request.if_none_match.contains_weak(etag):
+        return _set_validators(Response(status=304), etag)
+    return None
+
+
+def json_response(payload, etag, status=200):
+    """Como jsonify, con el ETag y las cabeceras de revalidación."""
+    response = jsonify(payload)
+    response.status_code = status
+    return _set_validators(response, etag)
@@ -0,0 +1,283 @@
+"""
+Importación masiva de solicitudes históricas desde JSONL o CSV.
+
+Lee la entrada en streaming (memoria constante), resuelve o crea el usuario de cada
+fila y agrega las solicitudes con executemany en transacciones de 'batch_size' filas.
+Los consecutivos se asignan con el mismo contador por usuario que usa /solicitar
+(request_counters), por lo que la importación puede correr con la aplicación en línea.
+
+Cada fila trae los datos del usuario (username opcional; si no, first_name,
+first_lastname, second_lastname, phone y email), las columnas de users.REQUEST_FIELDS
+y, opcionalmente, request_date ('AAAA-MM-DD HH:MM:SS'). Las filas inválidas se escriben
+en el archivo de rechazos (JSONL) con el número de línea y el motivo. Uso:
+
+    python import_requests.py viajes.jsonl --batch-size 5000 --rejects rechazos.jsonl
+    python import_requests.py viajes.csv
+"""
+import argparse
+import csv
+import json
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+import db
+import geo
+import users
+from user_cache import LRUCache, MISSING
+
+# Columnas obligatorias de la solicitud (NOT NULL en 'requests').
+REQUIRED_REQUEST_FIELDS = (
+    'request_type', 'activity_type',
+    'pickup_province', 'pickup_canton', 'pickup_señas',
+    'destination_province', 'destination_canton', 'destination_señas',
+)
+NEW_USER_FIELDS = ('first_name', 'first_lastname', 'second_lastname', 'phone', 'email')
+# Columnas que se leen de cada fila; deben ser texto (o números, que se guardan como texto).
+ROW_FIELDS = tuple(dict.fromkeys(('username', *NEW_USER_FIELDS, *users.REQUEST_FIELDS, 'request_date')))
+REQUEST_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+INSERT_REQUEST_SQL = """
+    INSERT INTO requests (
+        user_id, request_number, request_seq,
+        request_type, entity_name, entity_phone, entity_notes,
+        activity_type,
+        pickup_province, pickup_canton, pickup_señas, pickup_map_link,
+        destination_province, destination_canton, destination_señas, destination_map_link,
+        notes,
+        pickup_lat, pickup_lon, destination_lat, destination_lon,
+        request_date
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+"""
+
+SAVE_COUNTER_SQL = """
+    INSERT INTO request_counters (user_id, last_number) VALUES (?, ?)
+    ON CONFLICT (user_id) DO UPDATE SET last_number = excluded.last_number
+"""
+
+
+class RejectedRow(Exception):
+    """Fila que no se puede importar; el mensaje es el motivo."""
+
+
+def read_rows(path, fmt):
+    """Genera (número_de_línea, texto_original, fila) leyendo el archivo en streaming."""
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, None, row
+        else:
+            for line_num, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    yield line_num, line, RejectedRow(f'JSON inválido: {e}')
+                    continue
+                yield line_num, line, row
+
+
+class Importer:
+    """Mantiene la conexión, los lotes pendientes y las estadísticas de una importación."""
+
+    def __init__(self, conn, batch_size=5000, rejects=None, user_cache_size=100000):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.batch_size = batch_size
+        self.rejects = rejects
+        # username/email -> user_id. Los usuarios nunca cambian, así que sirve entre lotes.
+        self.user_ids = LRUCache(maxsize=user_cache_size, ttl=float('inf'))
+        # user_id -> último consecutivo asignado; solo válido dentro de la transacción actual.
+        self.counters = {}
+        # (parámetros del INSERT, (número_de_línea, texto_original, fila)) por cada fila del lote.
+        self.pending = []
+        self.imported = 0
+        self.rejected = 0
+        self.users_created = 0
+
+    def add(self, line_num, raw, row):
+        """Valida y encola una fila; la rechaza si no se puede importar."""
+        try:
+            if isinstance(row, Exception):
+                raise row
+            if not isinstance(row, dict):
+                raise RejectedRow('La fila no es un objeto')
+            params = self._add(row)
+        except RejectedRow as e:
+            self.reject(line_num, raw, row, str(e))
+            return
+        self.pending.append((params, (line_num, raw, row)))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def _add(self, row):
+        """Valida la fila y retorna los parámetros de su INSERT."""
+        row = {k: (v.strip() if isinstance(v, str) else v) for k, v in row.items() if k}
+        for field in ROW_FIELDS:
+            value = row.get(field)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                row[field] = str(value)
+            elif value is not None and not isinstance(value, str):
+                raise RejectedRow(f'El campo {field} debe ser texto')
+        missing = [f for f in REQUIRED_REQUEST_FIELDS if not row.get(f)]
+        if missing:
+            raise RejectedRow(f"Faltan campos de la solicitud: {', '.join(missing)}")
+        if row.get('request_date'):
+            try:
+                datetime.strptime(row['request_date'], REQUEST_DATE_FORMAT)
+            except ValueError:
+                raise RejectedRow(f"request_date debe tener el formato AAAA-MM-DD HH:MM:SS: {row['request_date']!r}")
+
+        if not self.conn.in_transaction:
+            db.begin_immediate(self.conn)
+
+        user_id = self.resolve_user(row)
+        request_seq = self.next_number(user_id)
+        return (
+            user_id, str(request_seq).zfill(4), request_seq,
+            *(row.get(field) or '' for field in users.REQUEST_FIELDS),
+            *geo.map_link_coordinates(row),
+            row.get('request_date') or None,
+        )
+
+    def resolve_user(self, row):
+        """Retorna el id del usuario de la fila, creándolo si no existe."""
+        username = row.get('username')
+        email = row.get('email')
+
+        for key in (('u', username), ('e', email)):
+            if key[1]:
+                user_id = self.user_ids.get(key)
+                if user_id is not MISSING:
+                    return user_id
+
+        user = None
+        if username:
+            user = users.find_user_by_username(self.cursor, username)
+            if user is None and not email:
+                raise RejectedRow(f'El usuario {username} no existe')
+        if user is None and email:
+            user = users.find_user_by_email(self.cursor, email)
+
+        if user is not None:
+            user_id = user['id']
+        else:
+            missing = [f for f in NEW_USER_FIELDS if not row.get(f)]
+            if missing:
+                raise RejectedRow(f"Faltan campos para crear el usuario: {', '.join(missing)}")
+            try:
+                user_id, username = users.create_new_user(
+                    self.cursor, row['first_name'], row['first_lastname'], row['second_lastname'],
+                    row['phone'], email
+                )
+            except sqlite3.IntegrityError:
+                raise RejectedRow('El nombre de usuario generado ya existe con otro email')
+            self.users_created += 1
+
+        if username:
+            self.user_ids.set(('u', username), user_id)
+        if email:
+            self.user_ids.set(('e', email), user_id)
+        return user_id
+
+    def next_number(self, user_id):
+        """Asigna el siguiente consecutivo del usuario en memoria (se guarda en flush)."""
+        last = self.counters.get(user_id)
+        if last is None:
+            self.cursor.execute('SELECT last_number FROM request_counters WHERE user_id = ?', (user_id,))
+            found = self.cursor.fetchone()
+            last = found[0] if found else 0
+        self.counters[user_id] = last + 1
+        return last + 1
+
+    def flush(self):
+        """Inserta el lote pendiente, guarda los contadores y confirma la transacción."""
+        if not self.conn.in_transaction:
+            return
+        try:
+            self.cursor.execute('SAVEPOINT batch')
+            try:
+                self.cursor.executemany(INSERT_REQUEST_SQL, [params for params, _ in self.pending])
+                inserted = len(self.pending)
+            except sqlite3.Error:
+                # Una fila que SQLite no acepta no debe perder el lote: se reintenta fila por fila.
+                self.cursor.execute('ROLLBACK TO batch')
+                inserted = self._insert_rows()
+            self.cursor.execute('RELEASE batch')
+            self.cursor.executemany(SAVE_COUNTER_SQL, self.counters.items())
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        self.imported += inserted
+        self.pending = []
+        self.counters = {}
+
+    def _insert_rows(self):
+        """Inserta el lote pendiente una fila a la vez, rechazando las que fallan."""
+        inserted = 0
+        for params, source in self.pending:
+            try:
+                self.cursor.execute(INSERT_REQUEST_SQL, params)
+            except sqlite3.Error as e:
+                self.reject(*source, f'Error al guardar la fila: {e}')
+            else:
+                inserted += 1
+        return inserted
+
+    def reject(self, line_num, raw, row, reason):
+        self.rejected += 1
+        if self.rejects is not None:
+            record = {'line': line_num, 'error': reason}
+            if raw is not None:
+                record['raw'] = raw.rstrip('\n')
+            else:
+                record['row'] = row
+            self.rejects.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Importa solicitudes históricas desde JSONL o CSV.')
+    parser.add_argument('path', help='Archivo de entrada (.jsonl o .csv).')
+    parser.add_argument('--format', choices=('jsonl', 'csv'), help='Por defecto se deduce de la extensión.')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Filas por transacción (por defecto 5000).')
+    parser.add_argument('--rejects', default=None,
+                        help='Archivo JSONL para las filas rechazadas (por defecto <entrada>.rechazos.jsonl).')
+    parser.add_argument('--progress-every', type=float, default=5.0, help='Segundos entre reportes de avance.')
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ('csv' if args.path.lower().endswith('.csv') else 'jsonl')
+    rejects_path = args.rejects or f'{args.path}.rechazos.jsonl'
+
+    conn = db.get_db_connection()
+    start = last_report = time.perf_counter()
+    with open(rejects_path, 'w', encoding='utf-8') as rejects:
+        importer = Importer(conn, batch_size=args.batch_size, rejects=rejects)
+        try:
+            for line_num, raw, row in read_rows(args.path, fmt):
+                importer.add(line_num, raw, row)
+                now = time.perf_counter()
+                if now - last_report >= args.progress_every:
+                    last_report = now
+                    done = importer.imported + len(importer.pending)
+                    print(f'{done} filas ({done / (now - start):.0f} filas/s), {importer.rejected} rechazadas',
+                          file=sys.stderr)
+            importer.flush()
+        finally:
+            conn.close()
+
+    elapsed = time.perf_counter() - start
+    print(
+        f'{importer.imported} solicitudes importadas en {elapsed:.1f}s '
+        f'({importer.imported / elapsed if elapsed else 0:.0f} filas/s); '
+        f'{importer.users_created} usuarios creados; {importer.rejected} filas rechazadas'
+        + (f' (ver {rejects_path})' if importer.rejected else '') + '.'
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
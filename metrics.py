@@ -0,0 +1,298 @@
+"""
+Métricas de latencia por endpoint y de SQL, expuestas en formato Prometheus en /metrics.
+
+Se activa con TRANSAVI_METRICS=1 (app.config['METRICS_ENABLED']). Desactivado no se
+registra ningún hook: las conexiones son sqlite3.Connection normales y las peticiones
+no pasan por código de este módulo.
+
+Activado, mide:
+
+- Latencia de cada petición por endpoint y método (histograma) y conteo por estado HTTP.
+- SQL por petición: sentencias que ejecuta SQLite (set_trace_callback; incluye
+  BEGIN/COMMIT y las de los triggers) y segundos dentro de execute/fetch (cursores de la
+  fábrica de conexiones de db.py).
+- Espera por una conexión del pool, timeouts del pool y reintentos ante
+  'database is locked' en db.begin_immediate().
+
+Las métricas son por proceso: con varios workers, Prometheus debe consultar cada uno.
+La latencia de las respuestas en streaming (exportaciones) mide hasta que empieza el envío.
+"""
+import sqlite3
+import threading
+import time
+
+from flask import Response, g, request
+
+import db
+
+# Límites (segundos) de los histogramas de latencia.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Límites de sentencias SQL por petición.
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class Counter:
+    """Contador monótono con etiquetas."""
+
+    type = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        if not items and not self.labels:
+            items = [((), 0)]
+        for label_values, value in items:
+            yield f'{self.name}{_format_labels(self.labels, label_values)} {value}'
+
+
+class Histogram:
+    """Histograma acumulativo con etiquetas (buckets, _sum y _count)."""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            counts = entry[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        for label_values, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels, label_values, f'le="{bound}"')
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(self.labels, label_values, 'le="+Inf"')
+            yield f'{self.name}_bucket{labels} {count}'
+            labels = _format_labels(self.labels, label_values)
+            yield f'{self.name}_sum{labels} {total}'
+            yield f'{self.name}_count{labels} {count}'
+
+
+REQUEST_LATENCY = Histogram(
+    'transavi_http_request_duration_seconds', 'Latencia de las peticiones por endpoint.',
+    ('endpoint', 'method'),
+)
+REQUESTS = Counter(
+    'transavi_http_requests_total', 'Peticiones atendidas por endpoint y estado HTTP.',
+    ('endpoint', 'method', 'status'),
+)
+REQUEST_SQL_STATEMENTS = Histogram(
+    'transavi_sql_statements_per_request', 'Sentencias SQL ejecutadas por petición.',
+    ('endpoint',), buckets=STATEMENT_BUCKETS,
+)
+REQUEST_SQL_SECONDS = Histogram(
+    'transavi_sql_duration_seconds_per_request', 'Segundos en SQLite por petición.',
+    ('endpoint',),
+)
+SQL_STATEMENTS = Counter(
+    'transavi_sql_statements_total', 'Sentencias SQL ejecutadas (todas las conexiones y hilos).',
+)
+SQL_SECONDS = Counter(
+    'transavi_sql_duration_seconds_total', 'Segundos en SQLite (todas las conexiones y hilos).',
+)
+POOL_WAIT = Histogram(
+    'transavi_db_pool_wait_seconds', 'Espera por una conexión libre del pool.',
+)
+POOL_TIMEOUTS = Counter(
+    'transavi_db_pool_timeouts_total', 'Peticiones que no obtuvieron conexión del pool a tiempo.',
+)
+LOCKED_RETRIES = Counter(
+    'transavi_db_locked_retries_total', "Reintentos de BEGIN IMMEDIATE por 'database is locked'.",
+)
+LOCKED_ERRORS = Counter(
+    'transavi_db_locked_errors_total', "BEGIN IMMEDIATE que fallaron por 'database is locked' tras los reintentos.",
+)
+
+METRICS = (
+    REQUEST_LATENCY, REQUESTS, REQUEST_SQL_STATEMENTS, REQUEST_SQL_SECONDS,
+    SQL_STATEMENTS, SQL_SECONDS, POOL_WAIT, POOL_TIMEOUTS, LOCKED_RETRIES, LOCKED_ERRORS,
+)
+
+
+def render():
+    """Todas las métricas en formato de texto de Prometheus."""
+    lines = []
+    for metric in METRICS:
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+# --- SQL: conexiones y cursores instrumentados ---
+
+# Acumuladores [sentencias, segundos] de la petición que atiende cada hilo.
+_local = threading.local()
+
+
+def _record_statement(statement):
+    SQL_STATEMENTS.inc()
+    stats = getattr(_local, 'stats', None)
+    if stats is not None:
+        stats[0] += 1
+
+
+def _record_time(seconds):
+    SQL_SECONDS.inc(amount=seconds)
+    stats = getattr(_local, 'stats', None)
+    if stats is not None:
+        stats[1] += seconds
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor que mide el tiempo de execute y fetch."""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record_time(time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record_time(time.perf_counter() - start)
+
+    def executescript(self, sql_script):
+        start = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            _record_time(time.perf_counter() - start)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            _record_time(time.perf_counter() - start)
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        try:
+            return super().fetchmany(self.arraysize if size is None else size)
+        finally:
+            _record_time(time.perf_counter() - start)
+
+    def fetchall(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            _record_time(time.perf_counter() - start)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Conexión que cuenta las sentencias (trace callback) y entrega cursores medidos."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.set_trace_callback(_record_statement)
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # Connection.execute* no pasa por cursor(): se redirigen para medirlos igual.
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def _observe_pool_wait(seconds, timed_out):
+    POOL_WAIT.observe(seconds)
+    if timed_out:
+        POOL_TIMEOUTS.inc()
+
+
+def _observe_locked(retrying):
+    (LOCKED_RETRIES if retrying else LOCKED_ERRORS).inc()
+
+
+# --- Peticiones ---
+
+def _before_request():
+    g._metrics_start = time.perf_counter()
+    _local.stats = [0, 0.0]
+
+
+def _after_request(response):
+    start = g.pop('_metrics_start', None)
+    if start is not None:
+        endpoint = request.endpoint or 'none'
+        REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint, request.method)
+        REQUESTS.inc(endpoint, request.method, str(response.status_code))
+        stats = getattr(_local, 'stats', None)
+        if stats is not None:
+            REQUEST_SQL_STATEMENTS.observe(stats[0], endpoint)
+            REQUEST_SQL_SECONDS.observe(stats[1], endpoint)
+    return response
+
+
+def _teardown_request(exception=None):
+    _local.stats = None
+
+
+def metrics_view():
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    """Activa la instrumentación y /metrics si app.config['METRICS_ENABLED']."""
+    if not app.config.get('METRICS_ENABLED'):
+        return
+    db.CONNECTION_FACTORY = InstrumentedConnection
+    db.pool_wait_observer = _observe_pool_wait
+    db.locked_observer = _observe_locked
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
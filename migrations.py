@@ -0,0 +1,480 @@
+"""
+Migraciones versionadas del esquema de la base de datos.
+
+La versión aplicada se guarda en 'PRAGMA user_version'. Cada migración corre en su
+propia transacción junto con el cambio de versión, por lo que una falla deja la base
+en la última versión completa. Uso:
+
+    python migrations.py            # aplica las migraciones pendientes
+    python migrations.py --status   # muestra la versión actual y las pendientes
+"""
+import argparse
+import sys
+
+import db
+import rollups
+
+
+def _initial_schema(cursor):
+    """Crea las tablas 'users', 'requests' y 'admins' si no existen."""
+    # Tabla de Usuarios (Cuentas de Solicitud/Clientes)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            first_name TEXT NOT NULL,
+            first_lastname TEXT NOT NULL,
+            second_lastname TEXT NOT NULL,
+            phone TEXT NOT NULL,
+            email TEXT NOT NULL UNIQUE
+        )
+    ''')
+
+    # Tabla de Administradores (Cuentas de Superusuario)
+    # Nota: En una aplicación real, la contraseña debe estar hasheada.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS admins (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            password TEXT NOT NULL,
+            role TEXT DEFAULT 'admin' -- Rol simple para diferenciar
+        )
+    ''')
+
+    # Tabla de Solicitudes
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS requests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+
+            -- Nuevo campo consecutivo por usuario
+            request_number TEXT NOT NULL,
+
+            -- Información de la Entidad/Solicitud
+            request_type TEXT NOT NULL, -- SI / NO
+            entity_name TEXT,
+            entity_phone TEXT,
+            entity_notes TEXT,
+
+            -- Información del Recorrido
+            activity_type TEXT NOT NULL,
+
+            -- Lugar de Recogida
+            pickup_province TEXT NOT NULL,
+            pickup_canton TEXT NOT NULL,
+            pickup_señas TEXT NOT NULL,
+            pickup_map_link TEXT,
+
+            -- Destino
+            destination_province TEXT NOT NULL,
+            destination_canton TEXT NOT NULL,
+            destination_señas TEXT NOT NULL,
+            destination_map_link TEXT,
+
+            -- Notas generales del recorrido
+            notes TEXT,
+
+            request_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+    # OPCIONAL: Insertar un administrador inicial si la tabla está vacía
+    cursor.execute("SELECT COUNT(*) FROM admins")
+    if cursor.fetchone()[0] == 0:
+        # Administrador por defecto: admin / 12345
+        # NOTA: En producción, usar una contraseña hasheada como hash(12345)
+        cursor.execute("INSERT INTO admins (username, password) VALUES (?, ?)", ('admin', '12345'))
+        print("Administrador inicial creado: Usuario='admin', Contraseña='12345'")
+
+
+def _request_indexes(cursor):
+    """Índices secundarios de 'requests' para las consultas por usuario y por fecha."""
+    # (user_id, request_number): búsqueda de una solicitud por consecutivo; su prefijo
+    # user_id también cubre las búsquedas y el LEFT JOIN por usuario.
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_requests_user_number ON requests (user_id, request_number)'
+    )
+    # (user_id, request_date): listado de solicitudes de un usuario ordenado por fecha.
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_requests_user_date ON requests (user_id, request_date)'
+    )
+    # request_date: filtros y reportes por rango de fechas.
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_requests_date ON requests (request_date)'
+    )
+
+
+def _request_counters(cursor):
+    """
+    Contador de consecutivos por usuario y unicidad de (user_id, request_number).
+    Las solicitudes duplicadas existentes (generadas por envíos concurrentes) conservan
+    el consecutivo en la más antigua; las demás reciben números nuevos al final.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS request_counters (
+            user_id INTEGER PRIMARY KEY,
+            last_number INTEGER NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+    # Último consecutivo por usuario; CAST tolera valores como '0001N'.
+    cursor.execute('''
+        INSERT OR REPLACE INTO request_counters (user_id, last_number)
+        SELECT user_id, MAX(CAST(request_number AS INTEGER))
+        FROM requests
+        GROUP BY user_id
+    ''')
+
+    cursor.execute('''
+        SELECT r.id, r.user_id
+        FROM requests r
+        WHERE EXISTS (
+            SELECT 1 FROM requests d
+            WHERE d.user_id = r.user_id AND d.request_number = r.request_number AND d.id < r.id
+        )
+        ORDER BY r.id
+    ''')
+    for row in cursor.fetchall():
+        new_number = db.allocate_request_number(cursor, row['user_id'])
+        cursor.execute(
+            'UPDATE requests SET request_number = ? WHERE id = ?',
+            (str(new_number).zfill(4), row['id'])
+        )
+        print(f"Solicitud {row['id']} duplicada: renumerada a {str(new_number).zfill(4)}")
+
+    cursor.execute('DROP INDEX IF EXISTS idx_requests_user_number')
+    cursor.execute(
+        'CREATE UNIQUE INDEX IF NOT EXISTS uq_requests_user_number ON requests (user_id, request_number)'
+    )
+
+
+def _user_request_count(cursor):
+    """
+    Columna desnormalizada users.request_count, mantenida por triggers sobre 'requests',
+    para que el panel no tenga que agregar la tabla de solicitudes en cada lectura.
+    """
+    cursor.execute('ALTER TABLE users ADD COLUMN request_count INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('''
+        UPDATE users
+        SET request_count = (SELECT COUNT(*) FROM requests r WHERE r.user_id = users.id)
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_count_insert
+        AFTER INSERT ON requests
+        BEGIN
+            UPDATE users SET request_count = request_count + 1 WHERE id = NEW.user_id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_count_delete
+        AFTER DELETE ON requests
+        BEGIN
+            UPDATE users SET request_count = request_count - 1 WHERE id = OLD.user_id;
+        END
+    ''')
+
+
+# Filas de 'requests' por cada UPDATE al completar request_seq.
+REQUEST_SEQ_BATCH_SIZE = 10000
+
+def _request_seq(cursor):
+    """
+    Consecutivo numérico normalizado (requests.request_seq) con índice por usuario.
+    Se completa aquí, por rangos de id, en las filas cuyo request_number son solo dígitos;
+    las dañadas (ej: '0001N') las repara 'python repair_requests.py'.
+    """
+    cursor.execute('ALTER TABLE requests ADD COLUMN request_seq INTEGER')
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_requests_user_seq ON requests (user_id, request_seq)'
+    )
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM requests')
+    max_id = cursor.fetchone()[0]
+    for first_id in range(0, max_id, REQUEST_SEQ_BATCH_SIZE):
+        cursor.execute(
+            """
+            UPDATE requests SET request_seq = CAST(request_number AS INTEGER)
+            WHERE id > ? AND id <= ?
+              AND request_number <> '' AND request_number NOT GLOB '*[^0-9]*'
+            """,
+            (first_id, first_id + REQUEST_SEQ_BATCH_SIZE)
+        )
+
+
+def _requests_fts(cursor):
+    """
+    Índice de texto completo FTS5 (external content) sobre las señas, notas y entidad de
+    'requests', sin distinguir acentos, sincronizado con triggers.
+    """
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS requests_fts USING fts5(
+            pickup_señas, destination_señas, notes, entity_notes, entity_name,
+            content='requests', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    ''')
+    cursor.execute("INSERT INTO requests_fts (requests_fts) VALUES ('rebuild')")
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_fts_insert
+        AFTER INSERT ON requests
+        BEGIN
+            INSERT INTO requests_fts (rowid, pickup_señas, destination_señas, notes, entity_notes, entity_name)
+            VALUES (NEW.id, NEW.pickup_señas, NEW.destination_señas, NEW.notes, NEW.entity_notes, NEW.entity_name);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_fts_delete
+        AFTER DELETE ON requests
+        BEGIN
+            INSERT INTO requests_fts (requests_fts, rowid, pickup_señas, destination_señas, notes, entity_notes, entity_name)
+            VALUES ('delete', OLD.id, OLD.pickup_señas, OLD.destination_señas, OLD.notes, OLD.entity_notes, OLD.entity_name);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_fts_update
+        AFTER UPDATE OF pickup_señas, destination_señas, notes, entity_notes, entity_name ON requests
+        BEGIN
+            INSERT INTO requests_fts (requests_fts, rowid, pickup_señas, destination_señas, notes, entity_notes, entity_name)
+            VALUES ('delete', OLD.id, OLD.pickup_señas, OLD.destination_señas, OLD.notes, OLD.entity_notes, OLD.entity_name);
+            INSERT INTO requests_fts (rowid, pickup_señas, destination_señas, notes, entity_notes, entity_name)
+            VALUES (NEW.id, NEW.pickup_señas, NEW.destination_señas, NEW.notes, NEW.entity_notes, NEW.entity_name);
+        END
+    ''')
+
+
+
+def _requests_version(cursor):
+    """
+    Versión de las solicitudes de cada usuario (users.requests_version), incrementada por
+    triggers en cada INSERT, UPDATE o DELETE sobre 'requests'. Es el validador (ETag) de
+    los endpoints JSON: se compara con una lectura por índice antes de la consulta completa.
+    Los triggers de request_count se reemplazan para actualizar ambas columnas a la vez.
+    """
+    cursor.execute('ALTER TABLE users ADD COLUMN requests_version INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('DROP TRIGGER IF EXISTS trg_requests_count_insert')
+    cursor.execute('DROP TRIGGER IF EXISTS trg_requests_count_delete')
+    cursor.execute('''
+        CREATE TRIGGER trg_requests_count_insert
+        AFTER INSERT ON requests
+        BEGIN
+            UPDATE users
+            SET request_count = request_count + 1, requests_version = requests_version + 1
+            WHERE id = NEW.user_id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER trg_requests_count_delete
+        AFTER DELETE ON requests
+        BEGIN
+            UPDATE users
+            SET request_count = request_count - 1, requests_version = requests_version + 1
+            WHERE id = OLD.user_id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_version_update
+        AFTER UPDATE ON requests
+        BEGIN
+            UPDATE users SET requests_version = requests_version + 1
+            WHERE id IN (OLD.user_id, NEW.user_id);
+        END
+    ''')
+
+
+def _requests_daily_rollup(cursor):
+    """
+    Resumen diario de viajes por provincia de recogida, provincia de destino y tipo de
+    actividad (requests_daily_rollup, ver rollups.py), mantenido por triggers para que
+    los reportes por rango de fechas no agreguen 'requests'.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS requests_daily_rollup (
+            day TEXT NOT NULL, -- AAAA-MM-DD
+            pickup_province TEXT NOT NULL,
+            destination_province TEXT NOT NULL,
+            activity_type TEXT NOT NULL,
+            trips INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, pickup_province, destination_province, activity_type)
+        ) WITHOUT ROWID
+    ''')
+    rollups.rebuild_rollup(cursor)
+
+    # Las filas sin fecha válida no se cuentan: date() retorna NULL y el WHERE las descarta.
+    increment = '''
+            INSERT INTO requests_daily_rollup (day, pickup_province, destination_province, activity_type, trips)
+            SELECT date(NEW.request_date), NEW.pickup_province, NEW.destination_province, NEW.activity_type, 1
+            WHERE date(NEW.request_date) IS NOT NULL
+            ON CONFLICT (day, pickup_province, destination_province, activity_type)
+            DO UPDATE SET trips = trips + 1;
+    '''
+    decrement = '''
+            UPDATE requests_daily_rollup SET trips = trips - 1
+            WHERE day = date(OLD.request_date)
+              AND pickup_province = OLD.pickup_province
+              AND destination_province = OLD.destination_province
+              AND activity_type = OLD.activity_type;
+    '''
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_rollup_insert
+        AFTER INSERT ON requests
+        BEGIN
+            {increment}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_rollup_delete
+        AFTER DELETE ON requests
+        BEGIN
+            {decrement}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_rollup_update
+        AFTER UPDATE OF request_date, pickup_province, destination_province, activity_type ON requests
+        BEGIN
+            {decrement}
+            {increment}
+        END
+    ''')
+
+
+def _requests_coordinates(cursor):
+    """
+    Coordenadas numéricas de recogida y destino (requests.pickup_lat, ...), extraídas de
+    los enlaces de mapa (ver geo.py), e índices espaciales R-tree sobre ellas mantenidos
+    por triggers. Las filas existentes se completan con 'python geo.py', por lotes.
+    """
+    # Fijos aquí (y no tomados de geo.py) para que la migración publicada no cambie.
+    points = ('pickup', 'destination')
+    columns = [f'{point}_{axis}' for point in points for axis in ('lat', 'lon')]
+    for column in columns:
+        cursor.execute(f'ALTER TABLE requests ADD COLUMN {column} REAL')
+
+    for point in points:
+        # Cada solicitud es un punto: una caja con min = max. El id es el de 'requests'.
+        cursor.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS requests_{point}_rtree USING rtree(
+                id, min_lat, max_lat, min_lon, max_lon
+            )
+        ''')
+
+    insert = ''.join(f'''
+            INSERT INTO requests_{point}_rtree (id, min_lat, max_lat, min_lon, max_lon)
+            SELECT NEW.id, NEW.{point}_lat, NEW.{point}_lat, NEW.{point}_lon, NEW.{point}_lon
+            WHERE NEW.{point}_lat IS NOT NULL AND NEW.{point}_lon IS NOT NULL;''' for point in points)
+    delete = ''.join(f'''
+            DELETE FROM requests_{point}_rtree WHERE id = OLD.id;''' for point in points)
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_geo_insert
+        AFTER INSERT ON requests
+        BEGIN{insert}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_geo_delete
+        AFTER DELETE ON requests
+        BEGIN{delete}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_geo_update
+        AFTER UPDATE OF {', '.join(columns)} ON requests
+        BEGIN{delete}{insert}
+        END
+    ''')
+
+
+# Lista ordenada de migraciones: (versión, descripción, función que recibe un cursor).
+# Nunca se reescribe una migración ya publicada; los cambios nuevos van al final.
+MIGRATIONS = [
+    (1, 'Esquema inicial (users, admins, requests)', _initial_schema),
+    (2, 'Índices de requests por usuario, consecutivo y fecha', _request_indexes),
+    (3, 'Contador de consecutivos por usuario y unicidad de (user_id, request_number)', _request_counters),
+    (4, 'Columna users.request_count mantenida por triggers', _user_request_count),
+    (5, 'Consecutivo numérico requests.request_seq', _request_seq),
+    (6, 'Búsqueda de texto completo FTS5 sobre señas, notas y entidad', _requests_fts),
+    (7, 'Versión de las solicitudes por usuario (users.requests_version) para ETags', _requests_version),
+    (8, 'Resumen diario de viajes por provincia y actividad (requests_daily_rollup)', _requests_daily_rollup),
+    (9, 'Coordenadas de recogida y destino con índices espaciales R-tree', _requests_coordinates),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(conn):
+    """Retorna la versión del esquema guardada en PRAGMA user_version."""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def pending_migrations(conn):
+    """Retorna las migraciones que aún no se han aplicado, en orden."""
+    version = get_version(conn)
+    return [m for m in MIGRATIONS if m[0] > version]
+
+
+def upgrade(conn=None, analyze=True):
+    """
+    Aplica las migraciones pendientes y, si se aplicó alguna, ejecuta ANALYZE
+    para que el planificador conozca los índices nuevos.
+    Retorna la lista de versiones aplicadas.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = db.get_db_connection()
+
+    applied = []
+    try:
+        for version, description, migration in pending_migrations(conn):
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            if get_version(conn) >= version:
+                # Otro proceso la aplicó mientras esperábamos el bloqueo de escritura.
+                conn.rollback()
+                continue
+            try:
+                migration(cursor)
+                # PRAGMA no admite parámetros; la versión es un entero de esta lista.
+                cursor.execute(f'PRAGMA user_version = {int(version)}')
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            applied.append(version)
+            print(f"Migración {version} aplicada: {description}")
+
+        if applied and analyze:
+            conn.execute('ANALYZE')
+            conn.commit()
+    finally:
+        if own_conn:
+            conn.close()
+    return applied
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Aplica las migraciones del esquema de TRANSAVI.')
+    parser.add_argument('--status', action='store_true', help='Solo muestra la versión actual y las pendientes.')
+    parser.add_argument('--no-analyze', action='store_true', help='No ejecutar ANALYZE al terminar.')
+    args = parser.parse_args(argv)
+
+    if args.status:
+        conn = db.get_db_connection()
+        try:
+            print(f"Versión actual: {get_version(conn)} (última: {LATEST_VERSION})")
+            for version, description, _ in pending_migrations(conn):
+                print(f"  Pendiente {version}: {description}")
+        finally:
+            conn.close()
+        return 0
+
+    applied = upgrade(analyze=not args.no_analyze)
+    if applied:
+        print(f"Esquema actualizado a la versión {applied[-1]}.")
+    else:
+        print(f"El esquema ya está en la versión {LATEST_VERSION}.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
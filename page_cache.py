@@ -0,0 +1,78 @@
+"""
+Caché en memoria (por proceso) del HTML de páginas que no cambian entre visitas.
+
+El formulario (/formulario) es marcado estático: renderizarlo con Jinja en cada visita
+es CPU desperdiciada. render_cached() guarda el HTML ya renderizado, con clave en las
+fechas de modificación de las plantillas (editar cualquier plantilla invalida la caché),
+y responde con ETag para que las visitas repetidas reciban un 304 sin cuerpo.
+
+Solo se usa la caché cuando la página no depende de la sesión: sin mensajes flash
+pendientes y sin usuario en sesión (navbar.html muestra 'Cerrar sesión' en ese caso).
+"""
+import hashlib
+import os
+import threading
+
+from flask import current_app, make_response, render_template, request, session
+
+
+class RenderedPageCache:
+    """HTML renderizado por (plantilla, contexto) mientras las plantillas no cambien."""
+
+    def __init__(self):
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def templates_signature(self):
+        """(nombre, mtime) de cada plantilla: cambia cuando se edita cualquiera."""
+        templates_dir = os.path.join(current_app.root_path, current_app.template_folder)
+        return tuple(sorted(
+            (entry.name, entry.stat().st_mtime_ns)
+            for entry in os.scandir(templates_dir) if entry.is_file()
+        ))
+
+    def get(self, key, signature):
+        page = self._pages.get(key)
+        if page is not None and page[0] == signature:
+            return page[1], page[2]
+        return None
+
+    def set(self, key, signature, html):
+        etag = hashlib.sha256(html.encode('utf-8')).hexdigest()[:16]
+        with self._lock:
+            self._pages[key] = (signature, html, etag)
+        return html, etag
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+
+page_cache = RenderedPageCache()
+
+
+def is_cacheable():
+    """True si la página renderizada no depende de la sesión del visitante."""
+    return '_flashes' not in session and not session.get('user_id')
+
+
+def render_cached(template_name, **context):
+    """
+    Como render_template, pero reutiliza el HTML ya renderizado cuando es posible.
+    El contexto debe ser el mismo en todas las visitas (solo datos estáticos).
+    """
+    if not is_cacheable():
+        return render_template(template_name, **context)
+
+    key = (template_name, request.script_root)
+    signature = page_cache.templates_signature()
+    cached = page_cache.get(key, signature)
+    if cached is None:
+        cached = page_cache.set(key, signature, render_template(template_name, **context))
+    html, etag = cached
+
+    response = make_response(html)
+    response.set_etag(etag)
+    # Se revalida en cada visita (la sesión puede cambiar), pero sin descargar el cuerpo.
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
@@ -0,0 +1,395 @@
+"""
+Verificador de planes de consulta (EXPLAIN QUERY PLAN) de todo el SQL de la aplicación.
+
+Reúne las sentencias de dos formas:
+
+- Estática: literales SQL pasados a execute()/executemany() y constantes *_SQL de los
+  módulos de la aplicación y de los scripts (ast, sin importar nada).
+- Grabada: recorre los endpoints con el cliente de prueba de Flask y registra con
+  set_trace_callback cada sentencia que se ejecuta, incluidas las construidas en tiempo
+  de ejecución (exportaciones, búsquedas por lote). Estas son las de "ruta caliente".
+
+Cada sentencia se explica contra una base temporal sembrada (y con ANALYZE). Falla
+(código 1) si una sentencia de ruta caliente hace 'SCAN <tabla>' sin índice o usa un
+'TEMP B-TREE' para ordenar o agrupar, salvo que ese mismo plan esté aceptado en el
+archivo de referencia query_plans_baseline.json. Las sentencias de scripts se reportan
+pero no hacen fallar. Uso:
+
+    python query_plans.py                      # verifica contra la referencia
+    python query_plans.py --verbose            # muestra el plan de cada sentencia
+    python query_plans.py --update-baseline    # acepta los planes actuales
+"""
+import argparse
+import ast
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+
+import archive
+import db
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BASE_DIR, 'query_plans_baseline.json')
+
+# Módulos donde se busca SQL literal. Las migraciones (DDL) no se analizan.
+SOURCE_MODULES = (
+    'app.py', 'admin.py', 'solicitudes.py', 'users.py', 'db.py', 'submissions.py',
+    'user_cache.py', 'import_requests.py', 'repair_requests.py', 'rollups.py', 'archive.py',
+    'geo.py',
+)
+SQL_CALLS = ('execute', 'executemany')
+ANALYZED_STATEMENTS = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+# Patrones de plan que se consideran un problema en una ruta caliente.
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+TEMP_BTREE = re.compile(r'USE TEMP B-TREE')
+
+# Normalización para comparar la misma sentencia escrita con '?' y grabada con valores.
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+NULL_LITERAL = re.compile(r'\bNULL\b', re.IGNORECASE)
+SQL_COMMENT = re.compile(r'--[^\n]*')
+WHITESPACE = re.compile(r'\s+')
+
+
+def normalize(sql):
+    """Texto canónico de la sentencia: sin comentarios ni literales, espacios simples."""
+    sql = SQL_COMMENT.sub(' ', sql)
+    sql = STRING_LITERAL.sub('?', sql)
+    sql = NUMBER_LITERAL.sub('?', sql)
+    sql = NULL_LITERAL.sub('?', sql)
+    return WHITESPACE.sub(' ', sql).strip().rstrip(';').strip()
+
+
+def statement_key(sql):
+    return hashlib.sha1(normalize(sql).encode('utf-8')).hexdigest()[:12]
+
+
+def is_analyzed(sql):
+    """True si es una sentencia de datos (no DDL, PRAGMA ni control de transacciones)."""
+    stripped = SQL_COMMENT.sub(' ', sql).lstrip().upper()
+    return stripped.startswith(ANALYZED_STATEMENTS)
+
+
+class Statement:
+    """Una sentencia única (por texto normalizado) y dónde aparece."""
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.key = statement_key(sql)
+        self.sources = set()
+        self.hot = False
+        self.recorded_sql = None
+        self.plan = None
+        self.error = None
+
+    def explain_sql(self):
+        """La versión grabada tiene valores reales; si no, se usa la literal con NULLs."""
+        return self.recorded_sql or self.sql
+
+
+# --- Extracción estática ---
+
+def _literal_sql(node, constants):
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.Name) and node.id in constants:
+        return constants[node.id]
+    return None
+
+
+def extract_static(paths):
+    """Retorna [(sql, 'archivo:línea función')] con el SQL literal de los módulos."""
+    found = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            tree = ast.parse(f.read(), filename=path)
+        name = os.path.basename(path)
+
+        # Constantes de módulo y variables locales asignadas a un literal (ej: request_query).
+        constants = {}
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+                value = _literal_sql(node.value, {})
+                if value is not None and is_analyzed(value):
+                    constants[node.targets[0].id] = value
+
+        functions = [n for n in ast.walk(tree) if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+
+        def enclosing(lineno):
+            inner = [f for f in functions if f.lineno <= lineno <= (f.end_lineno or f.lineno)]
+            return max(inner, key=lambda f: f.lineno).name if inner else '<módulo>'
+
+        for node in ast.walk(tree):
+            if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                    and node.func.attr in SQL_CALLS and node.args):
+                continue
+            sql = _literal_sql(node.args[0], constants)
+            if sql is not None and is_analyzed(sql):
+                found.append((sql, f'{name}:{node.lineno} {enclosing(node.lineno)}'))
+    return found
+
+
+# --- Grabación de una corrida ---
+
+# Las sentencias internas de FTS5 sobre sus tablas sombra también pasan por el trace.
+FTS_INTERNAL = re.compile(r"'main'\.'\w+_(data|idx|docsize|config|content)'")
+
+
+def seed_database(path, users_count=2000, requests_count=20000, seed=1):
+    """Crea el esquema en 'path' y lo llena con datos sintéticos; ejecuta ANALYZE."""
+    import migrations
+
+    conn = db._connect(path)
+    try:
+        migrations.upgrade(conn, analyze=False)
+        rng = random.Random(seed)
+        provinces = ('San José', 'Alajuela', 'Cartago', 'Heredia', 'Guanacaste', 'Puntarenas', 'Limón')
+        db.begin_immediate(conn)
+        conn.executemany(
+            'INSERT INTO users (username, first_name, first_lastname, second_lastname, phone, email) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            ((f'usr-{i:08d}', 'Nombre', 'Apellido', 'Segundo', f'{i:08d}', f'usr{i}@example.com')
+             for i in range(1, users_count + 1))
+        )
+        counters = {}
+        rows = []
+        for i in range(requests_count):
+            user_id = rng.randint(1, users_count)
+            counters[user_id] = counters.get(user_id, 0) + 1
+            seq = counters[user_id]
+            rows.append((
+                user_id, str(seq).zfill(4), seq, rng.choice(('SI', 'NO')), 'TURISMO',
+                rng.choice(provinces), 'Centro', f'Frente al parque {i}',
+                rng.choice(provinces), 'Centro', f'Terminal {i}', f'Notas del viaje {i}',
+                f'2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 08:00:00',
+                # Coordenadas dentro de Costa Rica (las indexan los R-tree de la migración 9).
+                round(rng.uniform(8.0, 11.2), 6), round(rng.uniform(-85.9, -82.6), 6),
+                round(rng.uniform(8.0, 11.2), 6), round(rng.uniform(-85.9, -82.6), 6),
+            ))
+        conn.executemany(
+            'INSERT INTO requests (user_id, request_number, request_seq, request_type, activity_type, '
+            'pickup_province, pickup_canton, pickup_señas, destination_province, destination_canton, '
+            'destination_señas, notes, request_date, pickup_lat, pickup_lon, destination_lat, destination_lon) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            rows
+        )
+        conn.executemany(
+            'INSERT INTO request_counters (user_id, last_number) VALUES (?, ?)', counters.items()
+        )
+        conn.commit()
+        conn.execute('ANALYZE')
+
+        # Las solicitudes del primer bimestre pasan al archivo (archive.py): así también se
+        # graban y analizan las lecturas que caen en él.
+        archive.ARCHIVE_PATH = os.path.join(os.path.dirname(path), 'archive.db')
+        archive.archive_requests(conn, '2024-03-01')
+    finally:
+        conn.close()
+
+
+def record_statements(path):
+    """
+    Recorre los endpoints con el cliente de prueba y retorna [(sql, endpoint)] con cada
+    sentencia que ejecutó SQLite durante las peticiones (y sus respuestas en streaming).
+    """
+    from flask import has_request_context, request
+
+    recorded = []
+
+    class RecordingConnection(sqlite3.Connection):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.set_trace_callback(self._record)
+
+        def _record(self, sql):
+            # Las exportaciones se ejecutan al enviar la respuesta, ya fuera del contexto.
+            endpoint = (request.endpoint or 'none') if has_request_context() else 'streaming'
+            recorded.append((sql, endpoint))
+
+    db.DATABASE_PATH = path
+    db.CONNECTION_FACTORY = RecordingConnection
+    db.close_pool()
+
+    from app import app
+    app.config['GROUP_COMMIT'] = False
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['admin_id'] = 1
+
+    username, email = 'usr-00000001', 'usr1@example.com'
+    form = {
+        'es_entidad': 'NO', 'tipo_actividad': 'TURISMO',
+        'pickup_province': 'Cartago', 'pickup_canton': 'Paraíso', 'pickup_señas': 'Parque',
+        'pickup_map_link': 'https://www.google.com/maps/@9.8383,-83.8656,17z',
+        'destination_province': 'Limón', 'destination_canton': 'Limón', 'destination_señas': 'Terminal',
+    }
+    client.get('/formulario')
+    client.get(f'/check_username?username={username}')
+    client.get(f'/get_user_data?username={username}')
+    client.get(f'/find_request_details?username={username}&request_number=1')
+    client.get('/find_request_details?username=no-existe&request_number=1')
+    client.get(f'/find_request_details?username={username}&request_number=9999')
+    client.post('/solicitudes/resolve_users', json={'keys': [username, email, 'no-existe']})
+    client.post('/solicitar', data=dict(form, has_user='SI', username=username))
+    client.post('/solicitar', data=dict(
+        form, has_user='NO', first_name='Plan', first_lastname='De', second_lastname='Consulta',
+        phone='99999999', email='plan@example.com',
+    ))
+    client.post('/login', data={'username': username})
+    client.post('/login', data={'username': '', 'email': email})
+    client.get('/solicitudes/')
+    client.get('/solicitudes/?cursor=1000&per_page=50')
+    client.get(f'/solicitudes/user_requests/{username}')
+    client.get('/solicitudes/export.csv')
+    client.get('/solicitudes/export.csv?desde=2024-03-01&hasta=2024-03-31')
+    client.get('/solicitudes/export.jsonl?pickup_province=Cartago')
+    client.get('/solicitudes/search?q=parque')
+    client.get('/solicitudes/report/trips?desde=2024-01-01&hasta=2024-03-31')
+    client.get('/solicitudes/report/trips?desde=2024-01-01&hasta=2024-12-31&group_by=activity_type')
+    client.get('/solicitudes/nearby?lat=9.9281&lon=-84.0907&radius_km=10')
+    client.get('/solicitudes/nearby?lat=10.6346&lon=-85.4407&radius_km=25&point=destination&limit=20')
+    client.get('/solicitudes/nearby?bbox=9.8,-84.2,10.1,-83.9')
+
+    db.close_pool()
+    db.CONNECTION_FACTORY = sqlite3.Connection
+    return [(sql, endpoint) for sql, endpoint in recorded
+            if is_analyzed(sql) and not FTS_INTERNAL.search(sql)]
+
+
+# --- Planes ---
+
+def explain(conn, statement):
+    """Retorna las líneas del plan, indentadas según su nivel en el árbol."""
+    sql = statement.explain_sql()
+    params = () if statement.recorded_sql else (None,) * sql.count('?')
+    rows = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node_id] + detail)
+    return lines
+
+
+def plan_problems(plan):
+    """Líneas del plan con recorridos completos o árboles temporales."""
+    return [line.strip() for line in plan
+            if FULL_SCAN.match(line.strip()) or TEMP_BTREE.search(line)]
+
+
+def load_baseline(path=BASELINE_PATH):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def write_baseline(statements, path=BASELINE_PATH):
+    data = {
+        # Sin números de línea, para que editar el código no cambie la referencia.
+        s.key: {
+            'sql': normalize(s.sql),
+            'sources': sorted({re.sub(r':\d+ ', ' ', source) for source in s.sources}),
+            'hot': s.hot,
+            'plan': s.plan,
+        }
+        for s in sorted(statements, key=lambda s: (not s.hot, sorted(s.sources)))
+        if s.plan is not None
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+
+
+def collect(path):
+    """Reúne las sentencias estáticas y grabadas, unificadas por texto normalizado."""
+    statements = {}
+
+    def add(sql):
+        key = statement_key(sql)
+        if key not in statements:
+            statements[key] = Statement(sql)
+        return statements[key]
+
+    for sql, source in extract_static([os.path.join(BASE_DIR, m) for m in SOURCE_MODULES]):
+        add(sql).sources.add(source)
+    for sql, endpoint in record_statements(path):
+        statement = add(sql)
+        statement.sources.add(f'endpoint {endpoint}')
+        statement.hot = True
+        statement.recorded_sql = statement.recorded_sql or sql
+    return list(statements.values())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Verifica los planes de consulta de todo el SQL de la aplicación.')
+    parser.add_argument('--update-baseline', action='store_true', help='Acepta los planes actuales como referencia.')
+    parser.add_argument('--verbose', action='store_true', help='Muestra el plan de cada sentencia.')
+    parser.add_argument('--users', type=int, default=2000, help='Usuarios de la base sembrada.')
+    parser.add_argument('--requests', type=int, default=20000, help='Solicitudes de la base sembrada.')
+    args = parser.parse_args(argv)
+
+    path = os.path.join(tempfile.mkdtemp(prefix='transavi-plans-'), 'db.db')
+    seed_database(path, args.users, args.requests)
+    statements = collect(path)
+
+    conn = db._connect(path)
+    try:
+        archive.attach(conn)
+        # Tabla temporal que archive.py crea en su propia conexión.
+        conn.execute('CREATE TEMP TABLE archive_batch (id INTEGER PRIMARY KEY)')
+        for statement in statements:
+            try:
+                statement.plan = explain(conn, statement)
+            except sqlite3.Error as e:
+                statement.error = str(e)
+    finally:
+        conn.close()
+
+    if args.update_baseline:
+        write_baseline(statements)
+        print(f'Referencia actualizada con {sum(s.plan is not None for s in statements)} planes: {BASELINE_PATH}')
+        return 0
+
+    baseline = load_baseline()
+    failures = 0
+    for statement in sorted(statements, key=lambda s: (not s.hot, sorted(s.sources))):
+        where = ', '.join(sorted(statement.sources))
+        if statement.error:
+            print(f'ERROR     {statement.key} [{where}]: {statement.error}')
+            failures += statement.hot
+            continue
+
+        problems = plan_problems(statement.plan)
+        accepted = baseline.get(statement.key, {}).get('plan') == statement.plan
+        if not problems:
+            status = 'OK'
+        elif accepted:
+            status = 'ACEPTADO'
+        elif statement.hot:
+            status = 'FALLA'
+            failures += 1
+        else:
+            status = 'AVISO'
+        print(f'{status:<9} {statement.key} [{where}]')
+        if status in ('FALLA', 'AVISO'):
+            print(f'          {normalize(statement.sql)[:200]}')
+            for problem in problems:
+                print(f'          -> {problem}')
+        if args.verbose:
+            for line in statement.plan:
+                print(f'          | {line}')
+
+    print(f'{len(statements)} sentencias ({sum(s.hot for s in statements)} de rutas calientes), {failures} fallas.')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
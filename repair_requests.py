@@ -0,0 +1,117 @@
+"""
+Reparación por lotes de los consecutivos de 'requests'.
+
+Recorre la tabla en orden de id, en transacciones cortas de 'batch_size' filas, y:
+
+- completa requests.request_seq con el valor numérico del consecutivo;
+- normaliza request_number con formato de 4 dígitos cuando está dañado
+  (ej: '0001N' -> '0001'), salvo que ese número ya lo use otra solicitud del mismo
+  usuario, en cuyo caso se deja el texto original y se reporta como conflicto.
+
+Se puede interrumpir y volver a ejecutar: solo escribe las filas que lo necesitan. Uso:
+
+    python repair_requests.py [--batch-size 1000] [--dry-run]
+"""
+import argparse
+import re
+import sys
+import time
+
+import db
+
+# Dígitos iniciales del consecutivo, ignorando espacios (ej: ' 0012N' -> '0012').
+LEADING_DIGITS = re.compile(r'\s*(\d+)')
+
+
+def parse_request_number(request_number):
+    """Retorna el consecutivo como entero, o None si no empieza con dígitos."""
+    match = LEADING_DIGITS.match(request_number or '')
+    return int(match.group(1)) if match else None
+
+
+def repair_request_numbers(conn, batch_size=1000, dry_run=False):
+    """
+    Recorre 'requests' por lotes reparando request_seq y request_number.
+    Retorna un diccionario con los conteos de filas revisadas y modificadas.
+    """
+    stats = {'scanned': 0, 'seq_filled': 0, 'normalized': 0, 'conflicts': 0, 'unparseable': 0}
+    cursor = conn.cursor()
+    last_id = 0
+
+    while True:
+        db.begin_immediate(conn)
+        cursor.execute(
+            'SELECT id, user_id, request_number, request_seq FROM requests WHERE id > ? ORDER BY id LIMIT ?',
+            (last_id, batch_size)
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            conn.rollback()
+            break
+
+        seq_updates = []
+        for row in rows:
+            stats['scanned'] += 1
+            request_seq = parse_request_number(row['request_number'])
+            if request_seq is None:
+                stats['unparseable'] += 1
+                print(f"Solicitud {row['id']}: consecutivo ilegible {row['request_number']!r}")
+                continue
+
+            if row['request_seq'] != request_seq:
+                seq_updates.append((request_seq, row['id']))
+                stats['seq_filled'] += 1
+
+            normalized = str(request_seq).zfill(4)
+            if normalized != row['request_number']:
+                cursor.execute(
+                    'SELECT 1 FROM requests WHERE user_id = ? AND request_number = ?',
+                    (row['user_id'], normalized)
+                )
+                if cursor.fetchone():
+                    stats['conflicts'] += 1
+                    print(f"Solicitud {row['id']}: {row['request_number']!r} no se normaliza, {normalized} ya existe")
+                else:
+                    # Se aplica de inmediato para que la siguiente verificación del lote la vea.
+                    cursor.execute(
+                        'UPDATE requests SET request_number = ? WHERE id = ?',
+                        (normalized, row['id'])
+                    )
+                    stats['normalized'] += 1
+
+        cursor.executemany('UPDATE requests SET request_seq = ? WHERE id = ?', seq_updates)
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+        last_id = rows[-1]['id']
+
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Repara y normaliza los consecutivos de las solicitudes.')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Filas por transacción (por defecto 1000).')
+    parser.add_argument('--dry-run', action='store_true', help='Solo reporta; no guarda cambios.')
+    args = parser.parse_args(argv)
+
+    conn = db.get_db_connection()
+    start = time.perf_counter()
+    try:
+        stats = repair_request_numbers(conn, batch_size=args.batch_size, dry_run=args.dry_run)
+    finally:
+        conn.close()
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"{stats['scanned']} solicitudes revisadas en {elapsed:.1f}s: "
+        f"{stats['seq_filled']} request_seq completados, {stats['normalized']} consecutivos normalizados, "
+        f"{stats['conflicts']} conflictos, {stats['unparseable']} ilegibles."
+    )
+    if args.dry_run:
+        print('Modo --dry-run: no se guardó ningún cambio.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
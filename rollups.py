@@ -0,0 +1,155 @@
+"""
+Resumen diario de viajes para reportes (tabla requests_daily_rollup).
+
+Cada fila cuenta las solicitudes de un día por provincia de recogida, provincia de
+destino y tipo de actividad. Los triggers de la migración 8 la mantienen al día en cada
+INSERT, UPDATE o DELETE sobre 'requests', así que los reportes por rango de fechas leen
+solo el resumen y nunca agregan la tabla de solicitudes.
+
+Las solicitudes sin fecha válida (request_date NULL o ilegible) no se cuentan.
+
+Para recalcular el resumen desde 'requests' (ej: después de cargar datos con los
+triggers desactivados o para verificarlo) se usa:
+
+    python rollups.py                                    # toda la tabla
+    python rollups.py --desde 2024-01-01 --hasta 2024-03-31
+    python rollups.py --check                            # solo compara, no escribe
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+
+import archive
+import db
+
+# Dimensiones del resumen, en el orden de su clave primaria.
+DIMENSIONS = ('day', 'pickup_province', 'destination_province', 'activity_type')
+
+
+def _range_condition(desde, hasta, column):
+    """Condición y parámetros para un rango de días inclusivo sobre 'column'."""
+    conditions = []
+    params = []
+    if desde:
+        conditions.append(f'{column} >= ?')
+        params.append(desde)
+    if hasta:
+        # Con request_date ('AAAA-MM-DD HH:MM:SS') el límite es el inicio del día siguiente.
+        conditions.append(f'{column} < ?')
+        next_day = datetime.strptime(hasta, '%Y-%m-%d') + timedelta(days=1)
+        params.append(next_day.strftime('%Y-%m-%d'))
+    return conditions, params
+
+
+def _requests_source(cursor):
+    """
+    Tabla de origen del resumen: 'requests' o, si archive.db está adjunta, también las
+    solicitudes archivadas (que el resumen sigue contando, ver archive.py).
+    """
+    if not archive.is_attached(cursor.connection):
+        return 'main.requests'
+    columns = 'request_date, pickup_province, destination_province, activity_type'
+    return f"""(
+        SELECT {columns} FROM main.requests
+        UNION ALL
+        SELECT {columns} FROM archive.requests a
+        WHERE NOT EXISTS (SELECT 1 FROM main.requests m WHERE m.id = a.id)
+    )"""
+
+
+def rebuild_rollup(cursor, desde=None, hasta=None):
+    """
+    Recalcula el resumen desde 'requests' para el rango de días [desde, hasta]
+    (AAAA-MM-DD, ambos opcionales). No abre ni confirma la transacción.
+    Retorna la cantidad de filas del resumen escritas.
+    """
+    conditions, params = _range_condition(desde, hasta, 'day')
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    cursor.execute(f'DELETE FROM requests_daily_rollup {where}', params)
+
+    conditions, params = _range_condition(desde, hasta, 'request_date')
+    conditions.append('date(request_date) IS NOT NULL')
+    cursor.execute(
+        f"""
+        INSERT INTO requests_daily_rollup (day, pickup_province, destination_province, activity_type, trips)
+        SELECT date(request_date), pickup_province, destination_province, activity_type, COUNT(*)
+        FROM {_requests_source(cursor)}
+        WHERE {' AND '.join(conditions)}
+        GROUP BY 1, 2, 3, 4
+        """,
+        params
+    )
+    return cursor.rowcount
+
+
+def check_rollup(cursor):
+    """
+    Compara el resumen con la agregación de 'requests'.
+    Retorna la lista de (día, recogida, destino, actividad, en resumen, en solicitudes)
+    que no coinciden.
+    """
+    cursor.execute(f'''
+        WITH actual AS (
+            SELECT date(request_date) AS day, pickup_province, destination_province, activity_type,
+                   COUNT(*) AS trips
+            FROM {_requests_source(cursor)}
+            WHERE date(request_date) IS NOT NULL
+            GROUP BY 1, 2, 3, 4
+        ),
+        keys AS (
+            SELECT day, pickup_province, destination_province, activity_type FROM actual
+            UNION
+            SELECT day, pickup_province, destination_province, activity_type FROM requests_daily_rollup
+        )
+        SELECT k.day, k.pickup_province, k.destination_province, k.activity_type,
+               IFNULL(r.trips, 0) AS rollup_trips, IFNULL(a.trips, 0) AS actual_trips
+        FROM keys k
+        LEFT JOIN requests_daily_rollup r USING (day, pickup_province, destination_province, activity_type)
+        LEFT JOIN actual a USING (day, pickup_province, destination_province, activity_type)
+        WHERE IFNULL(r.trips, 0) != IFNULL(a.trips, 0)
+        ORDER BY k.day
+    ''')
+    return [tuple(row) for row in cursor.fetchall()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Recalcula el resumen diario de viajes desde las solicitudes.')
+    parser.add_argument('--desde', help='Primer día a recalcular (AAAA-MM-DD).')
+    parser.add_argument('--hasta', help='Último día a recalcular (AAAA-MM-DD).')
+    parser.add_argument('--check', action='store_true', help='Solo compara el resumen con las solicitudes.')
+    args = parser.parse_args(argv)
+
+    for value in (args.desde, args.hasta):
+        if value:
+            try:
+                datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                parser.error('Las fechas deben tener el formato AAAA-MM-DD.')
+
+    conn = db.get_db_connection()
+    start = time.perf_counter()
+    try:
+        archive.attach(conn)
+        if args.check:
+            differences = check_rollup(conn.cursor())
+            for day, pickup, destination, activity, rollup_trips, actual_trips in differences[:20]:
+                print(f'{day} {pickup} -> {destination} {activity}: resumen {rollup_trips}, solicitudes {actual_trips}')
+            print(f'{len(differences)} diferencias.')
+            return 1 if differences else 0
+
+        db.begin_immediate(conn)
+        try:
+            written = rebuild_rollup(conn.cursor(), args.desde, args.hasta)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    finally:
+        conn.close()
+    print(f'{written} filas del resumen recalculadas en {time.perf_counter() - start:.1f}s.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
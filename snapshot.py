@@ -0,0 +1,216 @@
+"""
+Instantánea de solo lectura de la base para las lecturas del panel de administración.
+
+Las lecturas largas del panel (listados, búsquedas, reportes y exportaciones) comparten
+el archivo instance/db.db con los envíos de /solicitar. Con el modo instantánea, un hilo
+copia periódicamente la base viva a instance/snapshot.db con la API de backup de SQLite
+(sqlite3.Connection.backup) y las rutas de solicitudes_bp leen de esa copia, abierta en
+solo lectura e inmutable: no toman bloqueos ni leen el WAL de la base viva.
+
+Cada copia se escribe en un archivo temporal y reemplaza a la anterior con os.replace();
+las conexiones abiertas siguen leyendo la copia anterior hasta cerrarse. La fecha de
+modificación del archivo es el momento en que empezó la copia, de modo que varios
+procesos comparten la misma instantánea y su antigüedad.
+
+Si la instantánea no existe o es más antigua que READ_SNAPSHOT_MAX_AGE segundos (ej: el
+hilo no pudo copiarla), la lectura usa la base viva. Es opcional: se activa con
+TRANSAVI_READ_SNAPSHOT=1 (app.config['READ_SNAPSHOT']).
+"""
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g
+
+import db
+
+SNAPSHOT_PATH = os.path.join(db.BASE_DIR, 'instance', 'snapshot.db')
+# Segundos entre copias de la base viva.
+REFRESH_INTERVAL = float(os.environ.get('TRANSAVI_READ_SNAPSHOT_INTERVAL', 30))
+# Antigüedad máxima (segundos) con la que se acepta leer la instantánea.
+MAX_AGE = float(os.environ.get('TRANSAVI_READ_SNAPSHOT_MAX_AGE', 120))
+
+
+def take_snapshot(source_path=None, snapshot_path=None):
+    """
+    Copia la base viva a 'snapshot_path' y retorna el momento (time.time()) de la copia.
+    La copia se hace en un solo paso: una transacción de lectura en WAL, que no bloquea
+    a los escritores.
+    """
+    snapshot_path = snapshot_path or SNAPSHOT_PATH
+    taken_at = time.time()
+    tmp_path = f'{snapshot_path}.{os.getpid()}.tmp'
+    source = db._connect(source_path)
+    try:
+        target = sqlite3.connect(tmp_path)
+        try:
+            source.backup(target)
+            # La copia hereda el modo WAL; en modo DELETE se abre como un archivo único.
+            target.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            target.close()
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        source.close()
+    os.utime(tmp_path, (taken_at, taken_at))
+    os.replace(tmp_path, snapshot_path)
+    return taken_at
+
+
+def snapshot_age(snapshot_path=None):
+    """Segundos desde que se tomó la instantánea, o None si no existe."""
+    try:
+        return time.time() - os.stat(snapshot_path or SNAPSHOT_PATH).st_mtime
+    except FileNotFoundError:
+        return None
+
+
+def _connect_snapshot(snapshot_path):
+    # immutable=1: SQLite no toma bloqueos ni busca WAL; el archivo nunca se modifica.
+    uri = pathlib.Path(snapshot_path).resolve().as_uri() + '?mode=ro&immutable=1'
+    return db._connect(uri, uri=True)
+
+
+class SnapshotRefresher:
+    """Hilo que renueva la instantánea cuando su antigüedad llega a 'interval'."""
+
+    def __init__(self, source_path=None, snapshot_path=None, interval=REFRESH_INTERVAL):
+        self.source_path = source_path
+        self.snapshot_path = snapshot_path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        """Inicia el hilo si no corre en este proceso (un fork no hereda los hilos)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._stop = threading.Event()
+                self._thread = threading.Thread(target=self._run, name='transavi-snapshot', daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def stop(self, timeout=None):
+        with self._lock:
+            thread = self._thread
+            if thread is None or self._pid != os.getpid():
+                return
+            self._stop.set()
+            self._thread = None
+            self._pid = None
+        thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            age = snapshot_age(self.snapshot_path)
+            # Otro proceso pudo renovarla hace poco: se espera lo que le falta.
+            if age is None or age >= self.interval:
+                try:
+                    take_snapshot(self.source_path, self.snapshot_path)
+                    age = 0
+                except (sqlite3.Error, OSError) as e:
+                    # Se reintenta en el próximo ciclo; mientras tanto se lee la base viva.
+                    print(f"Error al copiar la instantánea: {e}")
+                    age = 0
+            self._stop.wait(max(self.interval - age, 1))
+
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def get_refresher():
+    """Retorna el renovador de la instantánea del proceso, creándolo en el primer uso."""
+    global _refresher
+    if _refresher is None:
+        with _refresher_lock:
+            if _refresher is None:
+                _refresher = SnapshotRefresher()
+    return _refresher
+
+
+def stop_refresher():
+    """Detiene y descarta el renovador del proceso."""
+    global _refresher
+    with _refresher_lock:
+        if _refresher is not None:
+            _refresher.stop()
+            _refresher = None
+
+
+# --- Lecturas desde Flask ---
+
+def fresh_snapshot_path():
+    """
+    Ruta de la instantánea si el modo está activo y su antigüedad no supera
+    app.config['READ_SNAPSHOT_MAX_AGE']; None si se debe leer la base viva.
+    """
+    if not current_app.config.get('READ_SNAPSHOT'):
+        return None
+    path = SNAPSHOT_PATH
+    age = snapshot_age(path)
+    if age is None or age > current_app.config.get('READ_SNAPSHOT_MAX_AGE', MAX_AGE):
+        return None
+    return path
+
+
+def get_read_db():
+    """
+    Conexión de lectura del contexto actual: la instantánea si está vigente, si no la
+    conexión del pool (db.get_db). Se cierra en close_read_db().
+    """
+    conn = getattr(g, '_snapshot_database', None)
+    if conn is not None:
+        return conn
+    path = fresh_snapshot_path()
+    if path is None:
+        return db.get_db()
+    conn = g._snapshot_database = _connect_snapshot(path)
+    return conn
+
+
+def close_read_db(exception=None):
+    """Cierra la conexión a la instantánea del contexto, si se abrió una."""
+    conn = g.pop('_snapshot_database', None)
+    if conn is not None:
+        conn.close()
+
+
+@contextmanager
+def read_connection(snapshot_path=None):
+    """
+    Conexión de lectura fuera de un contexto de Flask (generadores de exportación):
+    la instantánea indicada (ver fresh_snapshot_path) o una conexión del pool.
+    """
+    if snapshot_path is None:
+        with db.pooled_connection() as conn:
+            yield conn
+        return
+    conn = _connect_snapshot(snapshot_path)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def _start_refresher():
+    get_refresher().ensure_started()
+
+
+def init_app(app):
+    """Registra el cierre de las conexiones y, si app.config['READ_SNAPSHOT'], el renovador."""
+    app.config.setdefault('READ_SNAPSHOT_MAX_AGE', MAX_AGE)
+    app.teardown_appcontext(close_read_db)
+    if app.config.get('READ_SNAPSHOT'):
+        # El hilo se inicia con la primera petición de cada proceso (después de un fork).
+        app.before_request(_start_refresher)
@@ -1,13 +1,39 @@
+import csv
+import html
+import io
+import json
+import math
+import re
 import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime, timedelta
 # Importamos Blueprint, redirect, url_for, flash, session para la protección de ruta
-from flask import Blueprint, render_template, g, url_for, jsonify, redirect, flash, session
+from flask import Blueprint, render_template, url_for, jsonify, redirect, flash, session, request, current_app, Response
 from functools import wraps
+import archive
+import geo
+import http_cache
+import rollups
+import snapshot
+import users
 
 # Creamos el Blueprint (Plano) para todas las rutas relacionadas con solicitudes
 # El nombre del blueprint es 'solicitudes_bp' y su prefijo de URL es '/solicitudes'
 solicitudes_bp = Blueprint('solicitudes_bp', __name__, url_prefix='/solicitudes')
 
-DATABASE = 'db.db'
+# Tamaño de página por defecto del panel (configurable con app.config['SOLICITUDES_PAGE_SIZE'])
+# y máximo que se acepta en el parámetro ?per_page=.
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Resultados por página de la búsqueda de texto y máximo aceptado en ?per_page=.
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+
+# Filas que se leen de la base de datos por cada trozo de una exportación.
+EXPORT_FETCH_SIZE = 1000
 
 # --- Decorador de Protección de Ruta ---
 def login_required(f):
@@ -27,19 +53,12 @@ def login_required(f):
 # --- Funciones de Utilidad de Base de Datos ---
 
 def get_db():
-    """Abre una conexión a la base de datos si aún no hay una."""
-    db = getattr(g, '_database', None)
-    if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
-        db.row_factory = sqlite3.Row # Permite acceder a las columnas por nombre
-    return db
-
-@solicitudes_bp.teardown_request
-def close_connection(exception):
-    """Cierra la conexión a la base de datos al finalizar la solicitud."""
-    db = getattr(g, '_database', None)
-    if db is not None:
-        db.close()
+    """
+    Retorna la conexión de lectura del contexto actual: la instantánea de la base si el
+    modo está activo y vigente, o la del pool (ver snapshot.get_read_db).
+    Todas las rutas de este blueprint solo leen.
+    """
+    return snapshot.get_read_db()
 
 # --- Endpoint principal del Panel de Solicitudes ---
 
@@ -48,40 +67,42 @@ def close_connection(exception):
 def solicitudes(): 
     """
     Ruta para mostrar el panel de administración con la lista de usuarios
-    y el total de solicitudes.
+    y el total de solicitudes, paginada por cursor (?cursor=<id>&per_page=<n>).
     """
+    default_size = current_app.config.get('SOLICITUDES_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    per_page = min(max(request.args.get('per_page', default_size, type=int), 1), MAX_PAGE_SIZE)
+    # El cursor es el id del último usuario de la página anterior (orden descendente).
+    before_id = request.args.get('cursor', type=int)
+
     try:
-        db = get_db()
-        cursor = db.cursor()
-
-        # Consulta SQL para obtener todos los usuarios y el conteo de sus solicitudes
-        query = """
-        SELECT 
-            u.id, 
-            u.username, 
-            u.first_name,
-            u.first_lastname,
-            u.second_lastname,
-            u.email,
-            u.phone,
-            COUNT(r.id) AS request_count 
-        FROM users u
-        LEFT JOIN requests r ON u.id = r.user_id
-        GROUP BY u.id
-        ORDER BY u.id DESC;
-        """
-        
-        cursor.execute(query)
-        # Convertimos los Rows a diccionarios para Jinja
-        users_data = [dict(row) for row in cursor.fetchall()]
+        db_conn = get_db()
+        cursor = db_conn.cursor()
 
-        return render_template('solicitudes.html', users=users_data)
+        # Se pide una fila extra para saber si existe una página siguiente.
+        rows = users.get_users_page(cursor, before_id=before_id, limit=per_page + 1)
+        users_data = [dict(row) for row in rows[:per_page]]
+        next_cursor = users_data[-1]['id'] if len(rows) > per_page else None
+
+        return render_template(
+            'solicitudes.html',
+            users=users_data,
+            next_cursor=next_cursor,
+            per_page=per_page,
+            is_first_page=before_id is None,
+        )
 
     except sqlite3.Error as e:
         # En caso de error de DB (ej. tabla no existe), se muestra un error amigable.
         print(f"Database error: {e}")
         return render_template('solicitudes.html', users=None, error="Error al cargar datos de la base de datos.")
 
+# Columnas de cada solicitud en /user_requests: las de siempre y las que se pueden pedir
+# con ?fields= (se validan contra esta lista antes de llegar al SELECT).
+USER_REQUESTS_DEFAULT_FIELDS = (
+    'id', 'request_number', 'request_date', 'pickup_province', 'destination_province', 'activity_type', 'notes',
+)
+USER_REQUESTS_FIELDS = tuple(dict.fromkeys((*USER_REQUESTS_DEFAULT_FIELDS, 'request_seq', *users.REQUEST_FIELDS)))
+
 # --- Endpoint API para el Detalle de Solicitud (Requiere JSON/AJAX) ---
 @solicitudes_bp.route('/user_requests/<string:username>', methods=['GET'])
 @login_required # <--- APLICAMOS EL DECORADOR DE PROTECCIÓN
@@ -89,13 +110,22 @@ def api_user_requests(username):
     """
     Endpoint para obtener el detalle de todas las solicitudes de un usuario específico 
     (utilizado por la función de búsqueda en JavaScript de solicitudes.html).
+    ?fields=a,b limita las columnas de cada solicitud (ver USER_REQUESTS_FIELDS).
     """
     try:
-        db = get_db()
-        cursor = db.cursor()
+        fields = http_cache.requested_fields(USER_REQUESTS_FIELDS)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    try:
+        db_conn = get_db()
+        cursor = db_conn.cursor()
 
         # 1. Buscar el ID del usuario por su username
-        cursor.execute("SELECT id, first_name, first_lastname, email, phone FROM users WHERE username = ?", (username,))
+        cursor.execute(
+            "SELECT id, first_name, first_lastname, email, phone, request_count, requests_version FROM users WHERE username = ?",
+            (username,)
+        )
         user_row = cursor.fetchone()
         
         if not user_row:
@@ -103,31 +133,514 @@ def api_user_requests(username):
             
         user_data = dict(user_row)
         user_id = user_data['id']
+        # request_count incluye las solicitudes archivadas (ver archive.py).
+        request_count = user_data.pop('request_count')
+
+        # El listado solo cambia cuando cambian las solicitudes del usuario (triggers de
+        # requests_version): si el cliente ya tiene esa versión no se consulta ni serializa.
+        etag = http_cache.make_etag('u', user_id, user_data.pop('requests_version'), *(fields or ()))
+        response = http_cache.not_modified(etag)
+        if response:
+            return response
 
-        # 2. Obtener todas las solicitudes (facturas) de ese usuario
-        request_query = """
-        SELECT 
-            id, 
-            request_number, 
-            request_date,
-            pickup_province,
-            destination_province,
-            activity_type,
-            notes
-            -- Agrega todos los campos relevantes de tu tabla requests aquí
-        FROM requests 
+        # 2. Obtener todas las solicitudes (facturas) de ese usuario, con las columnas
+        # pedidas. id y request_date siempre se leen: identifican y ordenan las archivadas.
+        columns = fields or USER_REQUESTS_DEFAULT_FIELDS
+        selected = ', '.join(dict.fromkeys(('id', 'request_date', *columns)))
+        request_query = f"""
+        SELECT {selected}
+        FROM main.requests 
         WHERE user_id = ? 
         ORDER BY request_date DESC;
         """
         cursor.execute(request_query, (user_id,))
         requests_list = [dict(row) for row in cursor.fetchall()]
 
-        return jsonify({
+        # Si faltan solicitudes en la base viva, el resto está archivado.
+        if len(requests_list) < request_count:
+            with archive.attached(db_conn) as available:
+                if available:
+                    cursor.execute(request_query.replace('main.requests', 'archive.requests'), (user_id,))
+                    seen = {row['id'] for row in requests_list}
+                    requests_list.extend(dict(row) for row in cursor.fetchall() if row['id'] not in seen)
+                    requests_list.sort(key=lambda row: row['request_date'] or '', reverse=True)
+        if fields:
+            requests_list = [{name: row[name] for name in fields} for row in requests_list]
+
+        return http_cache.json_response({
             "success": True, 
             "user": user_data,
             "requests": requests_list
-        })
+        }, etag)
+
+    except sqlite3.Error as e:
+        print(f"Database error in API: {e}")
+        return jsonify({"success": False, "message": f"Error interno del servidor: {e}"}), 500
+
+
+# --- Resolución de Usuarios por Lote (integraciones y panel admin) ---
+
+# Máximo de claves aceptadas por llamada a /resolve_users y por administrador en cada
+# ventana de RESOLVE_WINDOW_SECONDS (contador por proceso). El cupo por ventana se puede
+# cambiar con app.config['RESOLVE_KEYS_PER_WINDOW']; None lo desactiva.
+MAX_RESOLVE_KEYS = 100
+RESOLVE_KEYS_PER_WINDOW = 500
+RESOLVE_WINDOW_SECONDS = 60
+
+_resolve_usage = {}
+_resolve_usage_lock = threading.Lock()
+
+def _consume_resolve_budget(admin_id, count, budget):
+    """Descuenta 'count' claves del cupo ('budget') del administrador; False si lo excede."""
+    now = time.monotonic()
+    with _resolve_usage_lock:
+        window_start, used = _resolve_usage.get(admin_id, (now, 0))
+        if now - window_start >= RESOLVE_WINDOW_SECONDS:
+            window_start, used = now, 0
+        if used + count > budget:
+            return False
+        _resolve_usage[admin_id] = (window_start, used + count)
+        return True
+
+@solicitudes_bp.route('/resolve_users', methods=['POST'])
+@login_required
+def resolve_users():
+    """
+    Resuelve por lote usernames y/o emails. Recibe JSON con 'usernames', 'emails' y/o
+    'keys' (se consideran email las claves que contienen '@') y retorna un mapa
+    clave -> datos del usuario, o null si no existe.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'success': False, 'message': 'Se espera un objeto JSON.'}), 400
 
+    usernames = []
+    emails = []
+    for field, target in (('usernames', usernames), ('emails', emails), ('keys', None)):
+        values = payload.get(field, [])
+        if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+            return jsonify({'success': False, 'message': f"'{field}' debe ser una lista de textos."}), 400
+        for value in values:
+            if target is not None:
+                target.append(value)
+            elif '@' in value:
+                emails.append(value)
+            else:
+                usernames.append(value)
+
+    count = len(usernames) + len(emails)
+    if count > MAX_RESOLVE_KEYS:
+        return jsonify({'success': False, 'message': f'Máximo {MAX_RESOLVE_KEYS} claves por llamada.'}), 400
+    budget = current_app.config.get('RESOLVE_KEYS_PER_WINDOW', RESOLVE_KEYS_PER_WINDOW)
+    if budget is not None and not _consume_resolve_budget(session['admin_id'], count, budget):
+        return jsonify({
+            'success': False,
+            'message': f'Máximo {budget} claves cada {RESOLVE_WINDOW_SECONDS} segundos.',
+        }), 429
+
+    try:
+        cursor = get_db().cursor()
+        found = users.find_users_by_usernames(cursor, usernames)
+        found.update(users.find_users_by_emails(cursor, emails))
+        results = {key: (dict(found[key]) if key in found else None) for key in usernames + emails}
+        return jsonify({'success': True, 'results': results})
     except sqlite3.Error as e:
         print(f"Database error in API: {e}")
+        return jsonify({'success': False, 'message': 'Error interno del servidor'}), 500
+
+
+# --- Exportación de Solicitudes (CSV / JSONL en streaming) ---
+
+def _parse_date(value):
+    """Convierte 'AAAA-MM-DD' a datetime; lanza ValueError si el formato es inválido."""
+    return datetime.strptime(value, '%Y-%m-%d')
+
+def _export_query(args, archived_columns=None):
+    """
+    Construye la consulta de exportación a partir de los filtros opcionales:
+    desde / hasta (fechas AAAA-MM-DD, inclusivas), pickup_province y destination_province.
+    Con 'archived_columns' (ver archive.select_columns) incluye las solicitudes archivadas.
+    """
+    conditions = []
+    params = []
+    desde = args.get('desde')
+    hasta = args.get('hasta')
+    if desde:
+        conditions.append('r.request_date >= ?')
+        params.append(_parse_date(desde).strftime('%Y-%m-%d'))
+    if hasta:
+        conditions.append('r.request_date < ?')
+        params.append((_parse_date(hasta) + timedelta(days=1)).strftime('%Y-%m-%d'))
+    for column in ('pickup_province', 'destination_province'):
+        if args.get(column):
+            conditions.append(f'r.{column} = ?')
+            params.append(args[column])
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    # Con filtro de fechas se recorre idx_requests_date en su propio orden (sin ordenamiento temporal).
+    order = 'r.request_date, r.id' if (desde or hasta) else 'r.id'
+    if archived_columns is None:
+        query = f"""
+            SELECT u.username, r.*
+            FROM requests r
+            JOIN users u ON u.id = r.user_id
+            {where}
+            ORDER BY {order}
+        """
+        return query, params
+
+    # Ambas partes se recorren en el orden de sus índices y SQLite las intercala (MERGE),
+    # sin ordenar el resultado completo. Las filas repetidas por un archivado interrumpido
+    # se leen solo de la base viva.
+    archived_where = ' AND '.join(conditions + ['NOT EXISTS (SELECT 1 FROM main.requests m WHERE m.id = r.id)'])
+    query = f"""
+        SELECT u.username, r.*
+        FROM main.requests r
+        JOIN users u ON u.id = r.user_id
+        {where}
+        UNION ALL
+        SELECT u.username, {archived_columns}
+        FROM archive.requests r
+        JOIN users u ON u.id = r.user_id
+        WHERE {archived_where}
+        ORDER BY {order.replace('r.', '')}
+    """
+    return query, params + params
+
+def _stream_export(args, fmt, snapshot_path=None):
+    """
+    Generador que recorre el cursor con fetchmany y produce el archivo por trozos.
+    Usa su propia conexión (de la instantánea 'snapshot_path' o del pool), que se
+    cierra o devuelve al terminar (o si el cliente corta).
+    """
+    with snapshot.read_connection(snapshot_path) as conn, archive.attached(conn) as available:
+        if available:
+            query, params = _export_query(args, archive.select_columns(conn))
+        else:
+            query, params = _export_query(args)
+        # El cursor se cierra antes de separar el archivo (DETACH no admite sentencias abiertas),
+        # también si el cliente corta la descarga.
+        with closing(conn.execute(query, params)) as cursor:
+            columns = [d[0] for d in cursor.description]
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if fmt == 'csv':
+                writer.writerow(columns)
+                yield buffer.getvalue()
+            while True:
+                rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+                if not rows:
+                    break
+                buffer.seek(0)
+                buffer.truncate()
+                if fmt == 'csv':
+                    writer.writerows(rows)
+                else:
+                    for row in rows:
+                        buffer.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+                        buffer.write('\n')
+                yield buffer.getvalue()
+
+@solicitudes_bp.route('/export.<string:fmt>', methods=['GET'])
+@login_required
+def export_requests(fmt):
+    """
+    Exporta todas las solicitudes (o un rango filtrado) como CSV o JSONL.
+    La respuesta se genera en streaming: memoria constante y primer byte inmediato.
+    """
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({"success": False, "message": "Formato no soportado (use csv o jsonl)."}), 404
+    try:
+        # Valida los filtros; la consulta se arma en el generador, según su conexión.
+        _export_query(request.args)
+    except ValueError:
+        return jsonify({"success": False, "message": "Las fechas deben tener el formato AAAA-MM-DD."}), 400
+
+    filename = f"solicitudes-{datetime.now():%Y%m%d-%H%M%S}.{fmt}"
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(
+        # La vigencia de la instantánea se decide aquí: el generador corre fuera del contexto.
+        _stream_export(request.args.copy(), fmt, snapshot.fresh_snapshot_path()),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+    )
+
+
+# --- Búsqueda de Texto Completo (FTS5) ---
+
+def _fts_query(text):
+    """
+    Convierte el texto libre del usuario en una consulta FTS5 segura: cada palabra se
+    busca como término literal (sin operadores) y la última además como prefijo,
+    para que funcione mientras se escribe. Retorna None si no hay palabras.
+    """
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+@solicitudes_bp.route('/search', methods=['GET'])
+@login_required
+def search_requests():
+    """
+    Busca solicitudes por texto libre en señas de recogida/destino, notas y entidad,
+    sin distinguir acentos, ordenadas por relevancia (?q=<texto>&page=<n>&per_page=<n>).
+    """
+    match = _fts_query(request.args.get('q', ''))
+    if match is None:
+        return jsonify({"success": False, "message": "Ingrese al menos una palabra para buscar."}), 400
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', SEARCH_PAGE_SIZE, type=int), 1), MAX_SEARCH_PAGE_SIZE)
+
+    try:
+        cursor = get_db().cursor()
+        cursor.execute(
+            """
+            WITH hits AS (
+                -- Primero se ordena y pagina dentro del índice FTS; solo la página se une a las tablas.
+                SELECT rowid AS request_id, rank, snippet(requests_fts, -1, char(2), char(3), '…', 12) AS snippet
+                FROM requests_fts
+                WHERE requests_fts MATCH ?
+                ORDER BY rank
+                LIMIT ? OFFSET ?
+            )
+            SELECT
+                r.id,
+                u.username,
+                r.request_number,
+                r.request_date,
+                r.activity_type,
+                r.pickup_province,
+                r.pickup_canton,
+                r.destination_province,
+                r.destination_canton,
+                r.entity_name,
+                hits.snippet
+            FROM hits
+            CROSS JOIN requests r ON r.id = hits.request_id
+            CROSS JOIN users u ON u.id = r.user_id
+            ORDER BY hits.rank
+            """,
+            (match, per_page + 1, (page - 1) * per_page)
+        )
+        rows = cursor.fetchall()
+        results = []
+        for row in rows[:per_page]:
+            result = dict(row)
+            # El fragmento se escapa y luego se resaltan las coincidencias con <mark>.
+            result['snippet'] = (
+                html.escape(result['snippet'] or '').replace('\x02', '<mark>').replace('\x03', '</mark>')
+            )
+            results.append(result)
+        return jsonify({
+            "success": True,
+            "page": page,
+            "per_page": per_page,
+            "has_next": len(rows) > per_page,
+            "results": results,
+        })
+
+    except sqlite3.Error as e:
+        print(f"Database error in search: {e}")
+        return jsonify({"success": False, "message": f"Error interno del servidor: {e}"}), 500
+
+
+# --- Reporte de Viajes por Día (resumen requests_daily_rollup) ---
+
+# Días por defecto del reporte cuando no se indica ?desde=.
+REPORT_DEFAULT_DAYS = 30
+
+@solicitudes_bp.route('/report/trips', methods=['GET'])
+@login_required
+def report_trips():
+    """
+    Viajes por día, provincia de recogida, provincia de destino y tipo de actividad en un
+    rango de fechas (?desde=AAAA-MM-DD&hasta=AAAA-MM-DD, inclusivas; por defecto los
+    últimos 30 días). ?group_by=day,activity_type elige las dimensiones del resultado y
+    ?pickup_province=, ?destination_province= y ?activity_type= filtran.
+    Lee solo el resumen diario (ver rollups.py), no la tabla de solicitudes.
+    """
+    group_by = [d for d in request.args.get('group_by', ','.join(rollups.DIMENSIONS)).split(',') if d]
+    if not group_by or any(d not in rollups.DIMENSIONS for d in group_by):
+        return jsonify({
+            "success": False,
+            "message": f"group_by admite: {', '.join(rollups.DIMENSIONS)}.",
+        }), 400
+    # Siempre en el orden de la clave primaria: si es un prefijo de ella (ej: day) se agrupa
+    # recorriendo el índice, sin ordenamiento temporal.
+    group_by = [d for d in rollups.DIMENSIONS if d in group_by]
+
+    try:
+        hasta = _parse_date(request.args['hasta']) if request.args.get('hasta') else datetime.now()
+        if request.args.get('desde'):
+            desde = _parse_date(request.args['desde'])
+        else:
+            desde = hasta - timedelta(days=REPORT_DEFAULT_DAYS - 1)
+    except ValueError:
+        return jsonify({"success": False, "message": "Las fechas deben tener el formato AAAA-MM-DD."}), 400
+
+    conditions = ['day BETWEEN ? AND ?']
+    params = [desde.strftime('%Y-%m-%d'), hasta.strftime('%Y-%m-%d')]
+    for column in ('pickup_province', 'destination_province', 'activity_type'):
+        if request.args.get(column):
+            conditions.append(f'{column} = ?')
+            params.append(request.args[column])
+    columns = ', '.join(group_by)
+
+    try:
+        cursor = get_db().cursor()
+        cursor.execute(
+            f"""
+            SELECT {columns}, SUM(trips) AS trips
+            FROM requests_daily_rollup
+            WHERE {' AND '.join(conditions)}
+            GROUP BY {columns}
+            HAVING SUM(trips) > 0
+            ORDER BY {columns}
+            """,
+            params
+        )
+        rows = [dict(row) for row in cursor.fetchall()]
+        return jsonify({
+            "success": True,
+            "desde": params[0],
+            "hasta": params[1],
+            "group_by": group_by,
+            "total": sum(row['trips'] for row in rows),
+            "rows": rows,
+        })
+
+    except sqlite3.Error as e:
+        print(f"Database error in report: {e}")
+        return jsonify({"success": False, "message": f"Error interno del servidor: {e}"}), 500
+
+
+# --- Solicitudes Cercanas a un Punto (índices R-tree, ver geo.py) ---
+
+# Radio por defecto (km) y máximo aceptado en ?radius_km=.
+NEARBY_RADIUS_KM = 5
+MAX_NEARBY_RADIUS_KM = 100
+# Resultados por defecto y máximo aceptado en ?limit=.
+NEARBY_LIMIT = 100
+MAX_NEARBY_LIMIT = 1000
+
+def _parse_floats(value, count):
+    """Lista de 'count' números separados por comas; ValueError si no lo es."""
+    numbers = [float(part) for part in value.split(',')]
+    if len(numbers) != count or not all(math.isfinite(number) for number in numbers):
+        raise ValueError(value)
+    return numbers
+
+@solicitudes_bp.route('/nearby', methods=['GET'])
+@login_required
+def nearby_requests():
+    """
+    Solicitudes cuya recogida (o destino, con ?point=destination) está cerca de un punto:
+    - ?lat=&lon=&radius_km=5: dentro del radio, de la más cercana a la más lejana, con
+      su distancia en km.
+    - ?bbox=min_lat,min_lon,max_lat,max_lon: dentro del rectángulo, las más recientes primero.
+    ?limit= acota los resultados. Solo consulta el índice R-tree y las filas encontradas.
+    """
+    point = request.args.get('point', 'pickup')
+    if point not in geo.POINTS:
+        return jsonify({"success": False, "message": f"point admite: {', '.join(geo.POINTS)}."}), 400
+    limit = min(max(request.args.get('limit', NEARBY_LIMIT, type=int), 1), MAX_NEARBY_LIMIT)
+
+    center = None
+    try:
+        if request.args.get('bbox'):
+            min_lat, min_lon, max_lat, max_lon = _parse_floats(request.args['bbox'], 4)
+            if min_lat > max_lat or min_lon > max_lon:
+                raise ValueError(request.args['bbox'])
+        else:
+            lat, lon = _parse_floats(f"{request.args.get('lat', '')},{request.args.get('lon', '')}", 2)
+            radius_km = float(request.args.get('radius_km', NEARBY_RADIUS_KM))
+            if not (-90 <= lat <= 90 and -180 <= lon <= 180 and 0 < radius_km <= MAX_NEARBY_RADIUS_KM):
+                raise ValueError(request.args)
+            center = (lat, lon)
+            min_lat, max_lat, min_lon, max_lon = geo.bounding_box(lat, lon, radius_km)
+    except ValueError:
+        return jsonify({
+            "success": False,
+            "message": (
+                "Indique lat y lon (y radius_km entre 0 y "
+                f"{MAX_NEARBY_RADIUS_KM}) o bbox=min_lat,min_lon,max_lat,max_lon."
+            ),
+        }), 400
+
+    # Primero se filtra y ordena dentro del R-tree; solo los 'limit' elegidos se unen a las
+    # tablas. En modo radio se ordena por la distancia equirectangular (cuadrada, en grados
+    # de latitud), suficiente para elegir los más cercanos a estas escalas; el orden final y
+    # la distancia que se informa son los de círculo máximo sobre las columnas exactas (el
+    # R-tree guarda las coordenadas en 32 bits, con ~1 m de redondeo).
+    if center is None:
+        hits = f"""
+            SELECT id, NULL AS d2 FROM requests_{point}_rtree
+            WHERE max_lat >= ? AND min_lat <= ? AND max_lon >= ? AND min_lon <= ?
+            ORDER BY id DESC
+            LIMIT ?
+        """
+        params = (min_lat, max_lat, min_lon, max_lon, limit)
+    else:
+        lat, lon = center
+        lon_scale = math.cos(math.radians(lat)) ** 2
+        hits = f"""
+            SELECT id, d2 FROM (
+                SELECT id,
+                       ((min_lat + max_lat) / 2 - ?) * ((min_lat + max_lat) / 2 - ?)
+                       + ((min_lon + max_lon) / 2 - ?) * ((min_lon + max_lon) / 2 - ?) * ? AS d2
+                FROM requests_{point}_rtree
+                WHERE max_lat >= ? AND min_lat <= ? AND max_lon >= ? AND min_lon <= ?
+            )
+            WHERE d2 <= ?
+            ORDER BY d2
+            LIMIT ?
+        """
+        params = (
+            lat, lat, lon, lon, lon_scale, min_lat, max_lat, min_lon, max_lon,
+            (radius_km / geo.KM_PER_DEGREE) ** 2, limit,
+        )
+
+    try:
+        cursor = get_db().cursor()
+        cursor.execute(
+            f"""
+            WITH hits AS ({hits})
+            SELECT
+                r.id,
+                u.username,
+                r.request_number,
+                r.request_date,
+                r.activity_type,
+                r.pickup_province,
+                r.pickup_canton,
+                r.destination_province,
+                r.destination_canton,
+                r.{point}_lat AS lat,
+                r.{point}_lon AS lon
+            FROM hits
+            CROSS JOIN requests r ON r.id = hits.id
+            CROSS JOIN users u ON u.id = r.user_id
+            ORDER BY hits.d2, hits.id DESC
+            """,
+            params
+        )
+        results = [dict(row) for row in cursor.fetchall()]
+        if center is not None:
+            for result in results:
+                result['distance_km'] = geo.distance_km(*center, result['lat'], result['lon'])
+            results.sort(key=lambda result: result['distance_km'])
+            for result in results:
+                result['distance_km'] = round(result['distance_km'], 3)
+        return jsonify({
+            "success": True,
+            "point": point,
+            "count": len(results),
+            "results": results,
+        })
+
+    except sqlite3.Error as e:
+        print(f"Database error in nearby: {e}")
         return jsonify({"success": False, "message": f"Error interno del servidor: {e}"}), 500
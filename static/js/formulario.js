@@ -0,0 +1,454 @@
+// Lógica del formulario de solicitud (templates/index.html).
+// El catálogo de provincias y cantones se descarga de la URL versionada que la
+// plantilla pone en data-catalog-url; el navegador lo guarda en caché.
+const catalogUrl = document.currentScript.dataset.catalogUrl;
+let catalogPromise = null;
+
+// Retorna (una sola vez por página) la promesa con el catálogo { provincia: [cantones] }.
+function loadCatalog() {
+    if (!catalogPromise) {
+        catalogPromise = fetch(catalogUrl)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+                return response.json();
+            })
+            .catch(error => {
+                console.error('Error al cargar el catálogo de cantones:', error);
+                catalogPromise = null; // Se reintenta en el próximo cambio de provincia
+                return {};
+            });
+    }
+    return catalogPromise;
+}
+// Función de debounce para limitar la frecuencia de las llamadas a la API
+function debounce(func, delay) {
+    let timeout;
+    return function(...args) {
+        const context = this;
+        clearTimeout(timeout);
+        timeout = setTimeout(() => func.apply(context, args), delay);
+    };
+}
+
+// Función para manejar la visibilidad de los campos de entidad/contacto
+function toggleEntidadFields() {
+    const selectEntidad = document.getElementById('es_entidad');
+    const entityFields = document.getElementById('entity_fields');
+    const entitySeparator = document.getElementById('entity_separator');
+
+    if (!selectEntidad || !entityFields || !entitySeparator) {
+        return;
+    }
+
+    const isEntity = selectEntidad.value === 'SI';
+    const individualContactFields = document.getElementById('individual_contact_fields');
+
+    if (individualContactFields) {
+        individualContactFields.style.display = 'none';
+        individualContactFields.querySelectorAll('input').forEach(input => input.required = false);
+    }
+
+    // Lógica para el grupo 'SI' (Entidad)
+    if (isEntity) {
+        entityFields.style.display = 'block';
+        entitySeparator.style.display = 'block'; 
+        
+        document.getElementById('nombre_entidad').required = true;
+        document.getElementById('telefono_empresa').required = true;
+        document.getElementById('notes_entidad').required = false;
+    }
+    
+    // Lógica para el grupo 'NO' (Particular)
+    else {
+        entityFields.style.display = 'none';
+        entitySeparator.style.display = 'none'; 
+        
+        document.getElementById('nombre_entidad').required = false;
+        document.getElementById('telefono_empresa').required = false;
+        document.getElementById('notes_entidad').required = false;
+    }
+}
+
+// Función para manejar la visibilidad de los campos de Usuario
+function toggleUserFields() {
+    const selectUser = document.getElementById('has_user');
+    const existingUserField = document.getElementById('existing_user_field');
+    const existingUsernameInput = document.getElementById('existing_username');
+    
+    // Referencias a los campos de datos personales (ahora siempre visibles)
+    const userFields = [
+        document.getElementById('first_name'),
+        document.getElementById('first_lastname'),
+        document.getElementById('second_lastname'),
+        document.getElementById('phone'),
+        document.getElementById('email')
+    ];
+
+
+    const isExistingUser = selectUser.value === 'SI';
+
+    // Limpiar estilos y mensajes cuando se cambia el flujo
+    document.getElementById('validation_message').innerHTML = '';
+    document.getElementById('load_data_button_container').innerHTML = '';
+    existingUsernameInput.classList.remove('is-success', 'is-danger');
+    existingUsernameInput.setCustomValidity(''); 
+
+    if (isExistingUser) {
+        existingUserField.style.display = 'block';
+        existingUsernameInput.required = true;
+        
+        // Si es usuario existente, los campos personales NO deben ser requeridos
+        // inicialmente (se llenarán con el botón Cargar Datos)
+        userFields.forEach(input => {
+            input.required = false; 
+            input.readOnly = true; // Hacerlos de solo lectura hasta que se carguen
+            input.value = ''; // Limpiar campos al cambiar a SI
+        });
+
+        if (existingUsernameInput.value.length > 0) {
+             debouncedCheckUsername(existingUsernameInput.value);
+        }
+
+    } else {
+        existingUserField.style.display = 'none';
+        existingUsernameInput.required = false;
+        
+        // Si es nuevo usuario, los campos personales deben ser requeridos y editables
+        userFields.forEach(input => {
+            input.required = true;
+            input.readOnly = false;
+        });
+    }
+}
+
+// NUEVA FUNCIÓN: Cargar datos del usuario en los campos del formulario
+async function loadUserData(username) {
+    const loadButtonContainer = document.getElementById('load_data_button_container');
+    loadButtonContainer.innerHTML = '<span class="has-text-info">Cargando datos...</span>';
+    
+    // Referencias a los campos de datos personales
+    const userFields = [
+        document.getElementById('first_name'),
+        document.getElementById('first_lastname'),
+        document.getElementById('second_lastname'),
+        document.getElementById('phone'),
+        document.getElementById('email')
+    ];
+    
+    try {
+        // NOTE: Esta es una función simulada. En un entorno real, llamarías a tu API.
+        // Para el ejemplo, simulamos datos de respuesta
+        const dummyData = {
+            first_name: "Juan",
+            first_lastname: "Pérez",
+            second_lastname: "Rodríguez",
+            phone: "88227500",
+            email: "juan.perez@example.com"
+        };
+
+        await new Promise(resolve => setTimeout(resolve, 500)); // Simula latencia
+        const result = { success: true, data: dummyData };
+
+
+        if (result.success) {
+            const data = result.data;
+            // Rellenar los campos del formulario
+            document.getElementById('first_name').value = data.first_name || '';
+            document.getElementById('first_lastname').value = data.first_lastname || '';
+            document.getElementById('second_lastname').value = data.second_lastname || '';
+            document.getElementById('phone').value = data.phone || '';
+            document.getElementById('email').value = data.email || '';
+            
+            // Hacer los campos editables y requeridos después de la carga exitosa
+            userFields.forEach(input => {
+                input.readOnly = false;
+                input.required = true; 
+            });
+
+            // Mostrar un mensaje de éxito temporal
+            loadButtonContainer.innerHTML = '<span class="has-text-success">¡Datos cargados!</span>';
+            
+        } else {
+            loadButtonContainer.innerHTML = '<span class="has-text-danger">Error al cargar datos.</span>';
+        }
+    } catch (error) {
+        console.error('Error al cargar datos del usuario:', error);
+        loadButtonContainer.innerHTML = '<span class="has-text-danger">Error de conexión.</span>';
+    }
+
+    // Limpiar el mensaje de carga después de 3 segundos
+    setTimeout(() => {
+        loadButtonContainer.innerHTML = ''; 
+    }, 3000);
+}
+
+// NUEVA FUNCIÓN: Verificar disponibilidad del nombre de usuario
+async function checkUsernameAvailability(username) {
+    const validationMessage = document.getElementById('validation_message');
+    const existingUsernameInput = document.getElementById('existing_username');
+    const loadButtonContainer = document.getElementById('load_data_button_container');
+
+    // Limpiar campos personales y estilos
+    const userFields = ['first_name', 'first_lastname', 'second_lastname', 'phone', 'email'];
+    userFields.forEach(id => {
+        const input = document.getElementById(id);
+        input.value = '';
+        input.readOnly = true;
+        input.required = false;
+    });
+
+    // Limpiar
+    validationMessage.innerHTML = '';
+    loadButtonContainer.innerHTML = '';
+    existingUsernameInput.classList.remove('is-success', 'is-danger');
+    
+    if (username.length < 3) {
+        existingUsernameInput.setCustomValidity('Mínimo 3 caracteres.');
+        return;
+    }
+    
+    validationMessage.innerHTML = '<span class="has-text-info">Verificando...</span>';
+
+    try {
+        // NOTE: Esta es una función simulada. En un entorno real, llamarías a tu API.
+        await new Promise(resolve => setTimeout(resolve, 300)); // Simula latencia
+        const exists = (username.toLowerCase() === 'p1a1a2-88227500'); // Simula que este usuario existe
+        const data = { exists: exists, username: username };
+        // Fin de la simulación
+
+        if (data.exists) {
+            validationMessage.innerHTML = '<span class="has-text-success">¡Usuario existe!</span>';
+            existingUsernameInput.classList.add('is-success');
+            existingUsernameInput.classList.remove('is-danger');
+            existingUsernameInput.setCustomValidity(''); 
+            
+            // Mostrar el botón de cargar datos
+            loadButtonContainer.innerHTML = `
+                <button type="button" class="button is-warning is-small is-rounded mt-2" onclick="loadUserData('${data.username}')">
+                    <span class="icon"><i class="fas fa-download"></i></span>
+                    <span>Cargar Mis Datos</span>
+                </button>
+            `;
+
+        } else {
+            validationMessage.innerHTML = '<span class="has-text-danger">Usuario no existe.</span>';
+            existingUsernameInput.classList.add('is-danger');
+            existingUsernameInput.classList.remove('is-success');
+            existingUsernameInput.setCustomValidity('El usuario no existe en el sistema.'); 
+        }
+    } catch (error) {
+        console.error('Error al verificar usuario:', error);
+        validationMessage.innerHTML = '<span class="has-text-danger">Error de conexión al verificar.</span>';
+        existingUsernameInput.setCustomValidity('Error de conexión.');
+    }
+}
+
+// Aplica debounce a la función de verificación
+const debouncedCheckUsername = debounce(checkUsernameAvailability, 500); // 500ms de espera
+
+// Función para actualizar el select de Cantones basado en la Provincia seleccionada
+async function updateCantons(locationType) {
+    const provinceSelect = document.getElementById(`${locationType}_province`);
+    const cantonSelect = document.getElementById(`${locationType}_canton`);
+    
+    // Limpiar opciones anteriores
+    cantonSelect.innerHTML = '<option value="" disabled selected>Seleccione el Cantón</option>';
+
+    const selectedProvince = provinceSelect.value;
+    const provincesAndCantons = await loadCatalog();
+
+    // La provincia pudo cambiar mientras se descargaba el catálogo
+    if (provinceSelect.value !== selectedProvince) {
+        return;
+    }
+    
+    if (selectedProvince && provincesAndCantons[selectedProvince]) {
+        provincesAndCantons[selectedProvince].forEach(canton => {
+            const option = document.createElement('option');
+            option.value = canton;
+            option.textContent = canton;
+            cantonSelect.appendChild(option);
+        });
+    }
+}
+
+// Lógica del Modal de Búsqueda
+function openSearchModal() {
+    document.getElementById('search-modal').classList.add('is-active');
+    document.getElementById('search-results').innerHTML = ''; // Limpiar resultados
+    // Limpiar inputs
+    document.getElementById('search_username').value = '';
+    document.getElementById('search_request_number').value = '';
+}
+
+function closeSearchModal() {
+    document.getElementById('search-modal').classList.remove('is-active');
+}
+
+// Lógica del Modal de Recibo (Nueva Vista)
+function closeReceiptModal() {
+    document.getElementById('receipt-modal').classList.remove('is-active');
+}
+
+// NUEVA FUNCIÓN: Muestra la vista de recibo completa
+function viewReceipt(requestData) {
+    // 1. Cerrar el modal de búsqueda
+    closeSearchModal(); 
+    
+    // 2. Generar el contenido del recibo y ponerlo en el modal de recibo
+    const receiptContainer = document.getElementById('receipt-content');
+    receiptContainer.innerHTML = generateReceipt(requestData);
+    
+    // 3. Abrir el modal de recibo
+    document.getElementById('receipt-modal').classList.add('is-active');
+}
+
+// NUEVA FUNCIÓN: Generar el enlace de la solicitud con el botón "Ver más"
+function generateRequestLink(data) {
+    // Para pasar el objeto de datos complejos al onclick, lo serializamos
+    const dataString = encodeURIComponent(JSON.stringify(data));
+    
+    return `
+        <div class="box has-background-light p-4 mt-3 is-flex is-justify-content-space-between is-align-items-center" style="border-radius: 8px;">
+            <div class="is-flex is-flex-direction-column">
+                <p class="is-size-6 has-text-dark has-text-weight-bold">Solicitud #${data.request_number}</p>
+                <p class="is-size-7 has-text-grey-dark">Usuario: ${data.username}</p>
+            </div>
+            <div>
+                <button class="button is-warning is-small is-rounded" onclick="viewReceipt(JSON.parse(decodeURIComponent('${dataString}')))">
+                    <span class="icon is-small"><i class="fas fa-eye"></i></span>
+                    <span>Ver más</span>
+                </button>
+            </div>
+        </div>
+    `;
+}
+
+
+async function searchRequest() {
+    const username = document.getElementById('search_username').value.trim();
+    const request_number = document.getElementById('search_request_number').value.trim();
+    const resultsContainer = document.getElementById('search-results');
+    
+    resultsContainer.innerHTML = '<p class="has-text-info">Buscando solicitud...</p>';
+    
+    if (!username || !request_number || request_number.length !== 4 || isNaN(request_number)) {
+         resultsContainer.innerHTML = '<p class="has-text-danger">Por favor ingrese el Usuario y un Consecutivo válido (4 dígitos).</p>';
+         return;
+    }
+
+    try {
+        // NOTE: SIMULACIÓN DE LLAMADA AL SERVIDOR
+        await new Promise(resolve => setTimeout(resolve, 700)); // Simula latencia
+        
+        let result;
+        if (username.toLowerCase() === 'p1a1a2-88227500' && request_number === '0001') {
+            // Datos de ejemplo para la solicitud encontrada
+            const dummyData = {
+                username: 'p1a1a2-88227500',
+                request_number: '0001',
+                request_date: new Date().toISOString(),
+                activity_type: 'TURISMO',
+                pickup_province: 'San José',
+                pickup_canton: 'Curridabat',
+                pickup_señas: 'Frente al parque',
+                destination_province: 'Puntarenas',
+                destination_canton: 'Osa',
+                destination_señas: 'Playa Ventanas',
+                notes: 'Viaje de 3 días para un grupo de 15 personas.',
+                entity_name: 'Transportes Ejemplo S.A.',
+                entity_phone: '2233-4455',
+                entity_notes: 'Requieren factura A-4.'
+            };
+            result = { success: true, data: dummyData };
+        } else {
+            result = { success: false, message: 'Solicitud no encontrada para ese Usuario y Consecutivo.' };
+        }
+        // FIN DE SIMULACIÓN
+
+        if (result.success) {
+            const data = result.data;
+            // Mostrar el enlace y el botón "Ver más"
+            resultsContainer.innerHTML = generateRequestLink(data);
+        } else {
+            resultsContainer.innerHTML = `<p class="has-text-danger">${result.message || 'Solicitud no encontrada.'}</p>`;
+        }
+
+    } catch (error) {
+        console.error('Error al buscar solicitud:', error);
+        resultsContainer.innerHTML = '<p class="has-text-danger">Error de conexión al servidor.</p>';
+    }
+}
+
+// Función para formatear y mostrar los datos de la solicitud (Recibo)
+function generateReceipt(data) {
+    let receipt = `
+        <div class="box has-background-light p-5" style="border-radius: 8px;">
+            <h3 class="title is-4 has-text-centered has-text-dark">RECIBO DE SOLICITUD</h3>
+            <p class="subtitle is-6 has-text-centered has-text-dark">Detalle Completo</p>
+            <hr style="background-color: #4a4a4a;">
+            
+            <p class="is-size-5 has-text-dark has-text-weight-bold">Solicitud: ${data.request_number}</p>
+            <p class="is-size-6 has-text-dark">Usuario: ${data.username}</p>
+            <p class="is-size-6 has-text-dark">Fecha de Creación: ${new Date(data.request_date).toLocaleString()}</p>
+            <p class="is-size-6 has-text-dark">Tipo de Actividad: ${data.activity_type}</p>
+            
+            <hr>
+
+            <p class="is-size-5 has-text-dark has-text-weight-bold">Información del Recorrido</p>
+            <p class="has-text-dark"><strong>Recogida:</strong> ${data.pickup_province}, ${data.pickup_canton}</p>
+            <p class="has-text-dark ml-4">Señas: ${data.pickup_señas}</p>
+            <p class="has-text-dark mt-2"><strong>Destino:</strong> ${data.destination_province}, ${data.destination_canton}</p>
+            <p class="has-text-dark ml-4">Señas: ${data.destination_señas}</p>
+            
+            ${data.notes ? `<p class="has-text-dark mt-4"><strong>Notas Generales:</strong> ${data.notes}</p>` : ''}
+            
+            ${data.entity_name ? `
+                <hr>
+                <p class="is-size-5 has-text-dark has-text-weight-bold">Detalles de la Entidad</p>
+                <p class="has-text-dark"><strong>Entidad:</strong> ${data.entity_name}</p>
+                <p class="has-text-dark"><strong>Teléfono Empresa:</strong> ${data.entity_phone}</p>
+                ${data.entity_notes ? `<p class="has-text-dark"><strong>Notas Entidad:</strong> ${data.entity_notes}</p>` : ''}
+            ` : ''}
+
+            <hr>
+            <p class="has-text-centered has-text-grey">--- Fin del Recibo ---</p>
+        </div>
+    `;
+    return receipt;
+}
+
+
+// Inicialización y Listeners
+document.addEventListener('DOMContentLoaded', () => {
+    // Se adelanta la descarga del catálogo para que los cantones aparezcan sin espera
+    loadCatalog();
+
+    // Inicialización de Entidad
+    const selectEntidad = document.getElementById('es_entidad');
+    if (selectEntidad) {
+        toggleEntidadFields(); 
+        selectEntidad.addEventListener('change', toggleEntidadFields);
+    }
+    
+    // Inicialización de Usuario
+    const selectUser = document.getElementById('has_user');
+    if (selectUser) {
+        toggleUserFields(); 
+        selectUser.addEventListener('change', toggleUserFields);
+    }
+
+    // Event listener para Lugar de Recogida
+    const pickupProvinceSelect = document.getElementById('pickup_province');
+    if (pickupProvinceSelect) {
+        pickupProvinceSelect.addEventListener('change', () => updateCantons('pickup'));
+    }
+
+    // Event listener para Destino
+    const destinationProvinceSelect = document.getElementById('destination_province');
+    if (destinationProvinceSelect) {
+        destinationProvinceSelect.addEventListener('change', () => updateCantons('destination'));
+    }
+});
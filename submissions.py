@@ -0,0 +1,77 @@
+"""
+Registro de un envío del formulario /solicitar: usuario (existente o nuevo),
+consecutivo y solicitud.
+
+La misma función se usa en el modo directo (la ruta abre su propia transacción) y en el
+modo de commit agrupado (write_queue.py la ejecuta en el hilo escritor). Por eso no
+llama a flash(): agrega los mensajes, en orden, a la lista 'messages' como
+(mensaje, categoría), y la ruta los muestra al terminar. El número de solicitud lo
+agrega la ruta, y solo después del commit.
+
+Cada envío cuesta las sentencias mínimas dentro de su transacción: para un usuario
+existente, la reserva del consecutivo (que también lo busca) y el INSERT de la solicitud;
+para uno nuevo, el INSERT del usuario, sin búsquedas previas (las restricciones UNIQUE
+rechazan los duplicados), la reserva y el INSERT de la solicitud.
+"""
+import sqlite3
+
+import db
+import users
+
+# Campos del usuario que se leen del formulario.
+USER_FORM_FIELDS = ('first_name', 'first_lastname', 'second_lastname', 'phone', 'email')
+
+
+def save_submission(cursor, submission, messages):
+    """
+    Registra el envío dentro de la transacción de escritura abierta en 'cursor'.
+    'submission' trae has_user, username, los USER_FORM_FIELDS y request_data.
+    Retorna (username, número de solicitud '0001', '0002'...), o None si el envío se
+    rechazó; en ese caso quien llama debe descartar la transacción (o el savepoint).
+    """
+    if submission['has_user'] == 'SI':
+        # Flujo 1: Usuario Existente (Requiere username)
+        # Una sola sentencia busca al usuario y reserva su consecutivo.
+        reserved = db.allocate_request_number_for_username(cursor, submission['username'])
+        if reserved is None:
+            messages.append(('El usuario no existe. Por favor, verifica el nombre de usuario o selecciona "No".', 'error'))
+            return None
+        user_id, request_seq = reserved
+        username = submission['username']
+        messages.append((f'¡Usuario {username} autenticado! Tu solicitud ha sido registrada.', 'success'))
+
+    else:
+        # Flujo 2: Nuevo Usuario
+        first_name, first_lastname, second_lastname, phone, email = (
+            submission[field] for field in USER_FORM_FIELDS
+        )
+        if not all([first_name, first_lastname, second_lastname, phone, email]):
+            messages.append(('Faltan campos obligatorios para el registro de nuevo usuario.', 'error'))
+            return None
+
+        new_username = users.generate_custom_username(first_name, first_lastname, second_lastname, phone)
+
+        # Inserción optimista: las restricciones UNIQUE de username y email hacen la
+        # verificación que antes requería dos búsquedas previas.
+        try:
+            user_id, username = users.create_new_user(
+                cursor, first_name, first_lastname, second_lastname, phone, email, username=new_username
+            )
+        except sqlite3.IntegrityError as e:
+            column = users.duplicate_user_column(e)
+            if column is None:
+                raise
+            # SQLite informa la primera restricción violada (username); el mensaje del
+            # email tiene prioridad, como cuando se buscaba primero.
+            if column == 'email' or users.find_user_by_email(cursor, email):
+                messages.append((f'El email {email} ya está registrado. Por favor, selecciona "Sí" en "¿Ya tienes un usuario?"', 'error'))
+            else:
+                messages.append(('Error: El nombre de usuario generado ya existe. Intenta con otro teléfono o nombre.', 'error'))
+            return None
+        # Muestra el nombre de usuario autogenerado
+        messages.append((f'¡Tu Nuevo usuario Transavi es: {username}! Tu solicitud ha sido registrada.', 'success'))
+        request_seq = None
+
+    # El consecutivo (0001, 0002...) se reserva en request_counters dentro de la misma transacción.
+    request_number = users.create_request(cursor, user_id, submission['request_data'], request_seq)
+    return username, request_number
@@ -0,0 +1,186 @@
+"""
+Caché en memoria (por proceso) de usuarios buscados por nombre de usuario.
+
+Lo usan los endpoints AJAX del formulario (/check_username, /get_user_data), que se
+llaman en cada pulsación de tecla. Combina:
+
+- Un LRU acotado con TTL para las filas encontradas (y para búsquedas negativas).
+- Un filtro de Bloom con todos los usernames de 'users': si el filtro dice que el
+  nombre no existe, se responde sin tocar la base de datos.
+
+Los usuarios nunca se borran ni se renombran, así que el filtro se mantiene al día
+leyendo solo los usuarios con id mayor al último visto (refresco incremental), lo que
+también incorpora los usuarios creados por otros procesos, con un retraso de hasta
+'refresh_interval' segundos. Ese margen no afecta la integridad: las restricciones
+UNIQUE de 'users' rechazan un duplicado aunque la caché lo haya dado por libre.
+"""
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+# Valor centinela para distinguir "no está en caché" de "se sabe que no existe" (None).
+MISSING = object()
+
+
+class LRUCache:
+    """Diccionario acotado con expulsión LRU y expiración por TTL (segundos)."""
+
+    def __init__(self, maxsize=4096, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Retorna el valor guardado o MISSING si no existe o expiró."""
+        with self._lock:
+            item = self._data.get(key, MISSING)
+            if item is MISSING:
+                return MISSING
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Guarda un valor; expulsa el menos usado si se supera maxsize."""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class BloomFilter:
+    """Filtro de Bloom: sin falsos negativos, con una tasa acotada de falsos positivos."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(int(capacity), 1)
+        self.error_rate = error_rate
+        self.num_bits = max(int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.num_hashes = max(int(round(self.num_bits / self.capacity * math.log(2))), 1)
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, item):
+        # Doble hashing (Kirsch-Mitzenmacher) a partir de un solo digest de 128 bits.
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class UserCache:
+    """
+    Caché de filas de 'users' por username con filtro de Bloom para búsquedas negativas.
+
+    'loader(cursor, username)' es la función que busca la fila en la base de datos
+    (users.find_user_by_username). Los métodos reciben 'get_conn', un callable que retorna
+    una conexión; solo se invoca cuando hace falta ir a la base de datos.
+    """
+
+    def __init__(self, loader, maxsize=4096, ttl=300, negative_ttl=30, refresh_interval=5,
+                 error_rate=0.01):
+        self.loader = loader
+        self.negative_ttl = negative_ttl
+        self.refresh_interval = refresh_interval
+        self.error_rate = error_rate
+        self.rows = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._bloom = None
+        self._last_user_id = 0
+        self._next_refresh = 0.0
+        self._lock = threading.Lock()
+
+    def find_by_username(self, get_conn, username):
+        """Retorna la fila del usuario (sqlite3.Row) o None si no existe."""
+        row = self.rows.get(username)
+        if row is not MISSING:
+            return row
+
+        bloom = self._refresh_if_due(get_conn)
+        if username not in bloom:
+            return None
+
+        row = self.loader(get_conn().cursor(), username)
+        self.rows.set(username, row, ttl=None if row is not None else self.negative_ttl)
+        return row
+
+    def user_created(self, username):
+        """Registra un usuario recién creado en este proceso (filtro y caché negativa)."""
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(username)
+        self.rows.pop(username)
+
+    def clear(self):
+        """Descarta todo; el próximo uso reconstruye el filtro desde la base de datos."""
+        with self._lock:
+            self._bloom = None
+            self._last_user_id = 0
+            self._next_refresh = 0.0
+        self.rows.clear()
+
+    def _refresh_if_due(self, get_conn):
+        """Retorna el filtro vigente, construyéndolo o refrescándolo si corresponde."""
+        bloom = self._bloom
+        if bloom is not None and time.monotonic() < self._next_refresh:
+            return bloom
+        with self._lock:
+            if self._bloom is not None and time.monotonic() < self._next_refresh:
+                return self._bloom
+            cursor = get_conn().cursor()
+            if self._bloom is None:
+                self._rebuild(cursor)
+            else:
+                self._load_new_users(cursor)
+                if self._bloom.count > self._bloom.capacity:
+                    self._rebuild(cursor)
+            self._next_refresh = time.monotonic() + self.refresh_interval
+            return self._bloom
+
+    def _rebuild(self, cursor):
+        """Construye el filtro con todos los usernames, dimensionado al doble de los actuales."""
+        cursor.execute('SELECT COUNT(*) FROM users')
+        total = cursor.fetchone()[0]
+        self._bloom = BloomFilter(max(1024, total * 2), self.error_rate)
+        self._last_user_id = 0
+        self._load_new_users(cursor)
+
+    def _load_new_users(self, cursor):
+        """Agrega al filtro los usuarios con id mayor al último visto (lectura por índice)."""
+        cursor.execute(
+            'SELECT id, username FROM users WHERE id > ? ORDER BY id',
+            (self._last_user_id,)
+        )
+        while True:
+            batch = cursor.fetchmany(1000)
+            if not batch:
+                break
+            for user_id, username in batch:
+                self._bloom.add(username)
+                self.rows.pop(username)
+            self._last_user_id = batch[-1][0]
@@ -1,5 +1,9 @@
 import re
+from contextlib import closing
+import archive
 import db 
+import geo
+from user_cache import UserCache
 
 def generate_custom_username(first_name, first_lastname, second_lastname, phone):
     """
@@ -33,74 +37,200 @@ def find_user_by_username(cursor, username):
     )
     return cursor.fetchone()
 
-def create_new_user(cursor, first_name, first_lastname, second_lastname, phone, email):
+# Campos de /get_user_data (los de la fila sin id ni username), que se pueden pedir con ?fields=.
+USER_DATA_FIELDS = ('first_name', 'first_lastname', 'second_lastname', 'phone', 'email')
+
+def get_user_requests_version(cursor, username):
     """
-    Registra un nuevo usuario en la base de datos con el nombre de usuario generado.
-    Retorna el ID del nuevo usuario y su nombre de usuario.
+    Retorna (id, requests_version) del usuario, o None si no existe. Es el validador de
+    los endpoints JSON: una lectura por el índice único de username.
     """
-    username = generate_custom_username(first_name, first_lastname, second_lastname, phone)
+    cursor.execute('SELECT id, requests_version FROM users WHERE username = ?', (username,))
+    return cursor.fetchone()
+
+# Límite de parámetros por sentencia para las búsquedas por lote (SQLite antiguo admite 999).
+MAX_SQL_PARAMS = 500
+
+def _find_users_by_column(cursor, column, values):
+    """Busca usuarios con 'column IN (...)' en trozos de MAX_SQL_PARAMS valores."""
+    found = {}
+    values = list(dict.fromkeys(values))  # Sin duplicados, conservando el orden
+    for start in range(0, len(values), MAX_SQL_PARAMS):
+        chunk = values[start:start + MAX_SQL_PARAMS]
+        placeholders = ', '.join('?' for _ in chunk)
+        cursor.execute(
+            f"""
+            SELECT id, username, first_name, first_lastname, second_lastname, phone, email
+            FROM users
+            WHERE {column} IN ({placeholders})
+            """,
+            chunk
+        )
+        for row in cursor.fetchall():
+            found[row[column]] = row
+    return found
+
+def find_users_by_usernames(cursor, usernames):
+    """Retorna un diccionario username -> fila para los usernames que existen."""
+    return _find_users_by_column(cursor, 'username', usernames)
+
+def find_users_by_emails(cursor, emails):
+    """Retorna un diccionario email -> fila para los emails que existen."""
+    return _find_users_by_column(cursor, 'email', emails)
+
+# Caché en memoria de find_user_by_username para los endpoints AJAX (ver user_cache.py).
+user_cache = UserCache(loader=find_user_by_username)
+
+def find_user_by_username_cached(get_conn, username):
+    """
+    Igual que find_user_by_username, pero servido desde la caché del proceso.
+    'get_conn' retorna una conexión y solo se llama si hace falta consultar la base de datos.
+    """
+    return user_cache.find_by_username(get_conn, username)
+
+def create_new_user(cursor, first_name, first_lastname, second_lastname, phone, email, username=None):
+    """
+    Registra un nuevo usuario en la base de datos con el nombre de usuario generado
+    (o 'username', si quien llama ya lo generó).
+    Retorna el ID del nuevo usuario y su nombre de usuario. Si el username o el email ya
+    existen, el INSERT falla con sqlite3.IntegrityError (ver duplicate_user_column).
+    """
+    if username is None:
+        username = generate_custom_username(first_name, first_lastname, second_lastname, phone)
     cursor.execute(
         'INSERT INTO users (username, first_name, first_lastname, second_lastname, phone, email) VALUES (?, ?, ?, ?, ?, ?)',
         (username, first_name, first_lastname, second_lastname, phone, email)
     )
     user_id = cursor.lastrowid
+    # El username pasa a existir para la caché de búsquedas de este proceso.
+    user_cache.user_created(username)
     return user_id, username
 
-# FUNCIÓN 1: Búsqueda exacta (la ideal, usada primero en app.py)
-def get_full_request_details_by_user_id_and_number(cursor, user_id, request_number):
+def duplicate_user_column(error):
     """
-    Obtiene los detalles de una solicitud específica por user_id y número de solicitud (coincidencia EXACTA).
+    Columna única de 'users' ('username' o 'email') que violó el INSERT que lanzó
+    'error' (sqlite3.IntegrityError), o None si la falla fue otra.
     """
-    cursor.execute(
-        """
-        SELECT 
-            r.*, 
-            u.username, u.first_name, u.first_lastname, u.second_lastname, u.phone, u.email
-        FROM requests r
-        JOIN users u ON r.user_id = u.id
-        WHERE r.user_id = ? AND r.request_number = ?
-        """,
-        (user_id, request_number)
-    )
-    return cursor.fetchone()
+    message = str(error)
+    for column in ('username', 'email'):
+        if f'UNIQUE constraint failed: users.{column}' in message:
+            return column
+    return None
+
+# Columnas de 'requests' que provienen del formulario, en el orden del INSERT.
+REQUEST_FIELDS = (
+    'request_type', 'entity_name', 'entity_phone', 'entity_notes',
+    'activity_type',
+    'pickup_province', 'pickup_canton', 'pickup_señas', 'pickup_map_link',
+    'destination_province', 'destination_canton', 'destination_señas', 'destination_map_link',
+    'notes',
+)
 
-# FUNCIÓN 2: Búsqueda tolerante (usada si la búsqueda exacta falla)
-def get_full_request_details_by_user_id_and_number_like(cursor, user_id, request_number):
+def create_request(cursor, user_id, request_data, request_seq=None):
     """
-    Obtiene los detalles de una solicitud por user_id y número de solicitud (coincidencia LIKE),
-    útil para datos con caracteres inesperados (ej: '0001N').
+    Registra una solicitud de transporte asignándole el siguiente consecutivo del usuario
+    (o 'request_seq', si ya se reservó en la misma transacción).
+    Debe llamarse dentro de una transacción de escritura (ver db.begin_immediate).
+    Retorna el número de solicitud con formato 0001, 0002...
     """
-    # Buscamos solicitudes cuyo request_number EMPIECE con el número rellenado (ej: '0001%').
+    if request_seq is None:
+        request_seq = db.allocate_request_number(cursor, user_id)
+    request_number = str(request_seq).zfill(4)
     cursor.execute(
         """
-        SELECT 
-            r.*, 
-            u.username, u.first_name, u.first_lastname, u.second_lastname, u.phone, u.email
-        FROM requests r
-        JOIN users u ON r.user_id = u.id
-        WHERE r.user_id = ? AND r.request_number LIKE ?
-        LIMIT 1
+        INSERT INTO requests (
+            user_id, request_number, request_seq,
+            request_type, entity_name, entity_phone, entity_notes,
+            activity_type,
+            pickup_province, pickup_canton, pickup_señas, pickup_map_link,
+            destination_province, destination_canton, destination_señas, destination_map_link,
+            notes,
+            pickup_lat, pickup_lon, destination_lat, destination_lon
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """,
-        (user_id, f'{request_number}%')
+        (
+            user_id, request_number, request_seq, *(request_data.get(field, '') for field in REQUEST_FIELDS),
+            # Coordenadas extraídas de los enlaces de mapa (ver geo.py).
+            *geo.map_link_coordinates(request_data),
+        )
     )
-    return cursor.fetchone()
+    return request_number
+
+# Campos que se pueden pedir con ?fields= en /find_request_details, con su columna.
+REQUEST_DETAIL_FIELDS = {
+    **{name: f'r.{name}' for name in (
+        'id', 'user_id', 'request_number', 'request_seq', 'request_date', *REQUEST_FIELDS,
+    )},
+    **{name: f'u.{name}' for name in (
+        'username', 'first_name', 'first_lastname', 'second_lastname', 'phone', 'email',
+    )},
+}
+DEFAULT_REQUEST_DETAIL_COLUMNS = 'r.*, u.username, u.first_name, u.first_lastname, u.second_lastname, u.phone, u.email'
 
-# NUEVA FUNCIÓN: Obtiene la lista de todos los usuarios y su conteo de solicitudes
-def get_all_users_with_request_count(cursor):
+def get_full_request_details(cursor, username, request_seq, fields=None):
     """
-    Retorna una lista de todos los usuarios con el conteo de solicitudes asociadas.
+    Obtiene los detalles de una solicitud y de su usuario por username y consecutivo numérico
+    (request_seq). Una sola consulta por índice: users(username) y requests(user_id, request_seq);
+    las filas sin request_seq se comparan por request_number con 4 dígitos.
+    'fields' (claves de REQUEST_DETAIL_FIELDS) limita las columnas del SELECT.
     """
-    cursor.execute(
-        """
-        SELECT 
-            u.id, 
-            u.username, 
-            COUNT(r.id) as request_count 
+    if fields:
+        columns = ', '.join(REQUEST_DETAIL_FIELDS[field] for field in fields)
+    else:
+        columns = DEFAULT_REQUEST_DETAIL_COLUMNS
+    query = f"""
+        SELECT {columns}
         FROM users u
-        LEFT JOIN requests r ON u.id = r.user_id
-        GROUP BY u.id, u.username
-        ORDER BY u.username
+        JOIN {{table}} r ON r.user_id = u.id
+        WHERE u.username = ?
+          AND (r.request_seq = ?
+               -- Filas antiguas que repair_requests.py aún no completó.
+               OR (r.request_seq IS NULL AND r.request_number = printf('%04d', ?)))
+        -- Un consecutivo dañado ('0002N') comparte request_seq con el correcto ('0002'):
+        -- gana el que coincide exactamente.
+        ORDER BY r.request_number = printf('%04d', ?) DESC, r.id
+        LIMIT 1
         """
-    )
+    params = (username, request_seq, request_seq, request_seq)
+    cursor.execute(query.format(table='main.requests'), params)
+    row = cursor.fetchone()
+    if row is not None:
+        return row
+    # Solo si no está en la base viva se busca entre las solicitudes archivadas (archive.py).
+    with archive.attached(cursor.connection) as available:
+        if available:
+            # Cursor propio, cerrado antes de separar el archivo: DETACH no admite
+            # sentencias abiertas.
+            with closing(cursor.connection.execute(query.format(table='archive.requests'), params)) as archived:
+                return archived.fetchone()
+    return None
+
+# Obtiene una página de usuarios con su conteo de solicitudes (paginación por cursor)
+def get_users_page(cursor, before_id=None, limit=50):
+    """
+    Retorna hasta 'limit' usuarios ordenados del más reciente al más antiguo, junto con
+    su conteo de solicitudes (columna desnormalizada users.request_count).
+    'before_id' es el cursor: solo se devuelven usuarios con id menor a ese valor.
+    """
+    if before_id is None:
+        cursor.execute(
+            """
+            SELECT id, username, first_name, first_lastname, second_lastname, email, phone, request_count
+            FROM users
+            ORDER BY id DESC
+            LIMIT ?
+            """,
+            (limit,)
+        )
+    else:
+        cursor.execute(
+            """
+            SELECT id, username, first_name, first_lastname, second_lastname, email, phone, request_count
+            FROM users
+            WHERE id < ?
+            ORDER BY id DESC
+            LIMIT ?
+            """,
+            (before_id, limit)
+        )
     return cursor.fetchall()
-# Nota: Se eliminó la función original 'get_full_request_details' para usar las dos nuevas funciones.
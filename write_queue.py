@@ -0,0 +1,185 @@
+"""
+Escritor con commit agrupado (group commit) para los envíos de /solicitar.
+
+En lugar de que cada petición abra su transacción y compita por el bloqueo de
+escritura de SQLite, un solo hilo escritor es dueño de una conexión y vacía una cola
+de trabajos: ejecuta hasta MAX_BATCH trabajos (o los que lleguen en MAX_DELAY_MS) en
+una sola transacción y un solo commit. Cada trabajo corre en su propio SAVEPOINT, de
+modo que uno que falle o se rechace no afecta a los demás del lote.
+
+Quien envía recibe un concurrent.futures.Future que se resuelve después del commit
+con el valor que retornó su trabajo (ej: el consecutivo asignado).
+
+Es opcional: se activa con TRANSAVI_GROUP_COMMIT=1 (app.config['GROUP_COMMIT']).
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import db
+
+# Trabajos máximos por transacción.
+MAX_BATCH = int(os.environ.get('TRANSAVI_GROUP_COMMIT_MAX_BATCH', 64))
+# Milisegundos que el escritor espera más trabajos antes de confirmar el lote.
+MAX_DELAY_MS = float(os.environ.get('TRANSAVI_GROUP_COMMIT_MAX_DELAY_MS', 5))
+
+_STOP = object()
+
+
+class GroupCommitWriter:
+    """Hilo escritor que confirma los trabajos encolados en lotes."""
+
+    def __init__(self, path=None, max_batch=MAX_BATCH, max_delay_ms=MAX_DELAY_MS):
+        self.path = path
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn):
+        """
+        Encola fn(cursor) para ejecutarla en la próxima transacción del escritor.
+        Si fn retorna None el envío se considera rechazado y su savepoint se descarta.
+        Retorna un Future con el resultado de fn (o su excepción).
+        """
+        self._ensure_started()
+        future = Future()
+        self._queue.put((fn, future))
+        return future
+
+    def close(self, timeout=None):
+        """Procesa lo pendiente y detiene el hilo escritor."""
+        with self._lock:
+            thread = self._thread
+            if thread is None or self._pid != os.getpid():
+                return
+            self._queue.put(_STOP)
+            thread.join(timeout)
+            self._thread = None
+
+    def _ensure_started(self):
+        # Tras un fork (gunicorn) el hilo no existe en el proceso hijo, y si _run terminó
+        # por un error el hilo ya no está vivo: en ambos casos se crea otro.
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                # La cola heredada tiene los trabajos del proceso padre.
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = None
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='group-commit-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        batch = []
+        error = RuntimeError('El escritor agrupado se detuvo.')
+        try:
+            conn = db._connect(self.path)
+            try:
+                while True:
+                    item = self._queue.get()
+                    if item is _STOP:
+                        return
+                    batch = [item]
+                    stop = self._fill_batch(batch)
+                    self._write_batch(conn, batch)
+                    batch = []
+                    if stop:
+                        return
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"Error en el escritor agrupado: {e}")
+            error = e
+        finally:
+            # Nadie más vaciará la cola: quien espera un trabajo pendiente recibe el error
+            # en lugar de agotar su timeout. El próximo submit() arranca otro hilo.
+            self._fail_pending(batch, error)
+
+    def _fail_pending(self, batch, error):
+        """Resuelve con 'error' los futures del lote en curso y de la cola."""
+        items = list(batch)
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for item in items:
+            if item is not _STOP and not item[1].done():
+                item[1].set_exception(error)
+
+    def _fill_batch(self, batch):
+        """Agrega trabajos al lote hasta MAX_BATCH o hasta que pase MAX_DELAY_MS."""
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                return False
+            if item is _STOP:
+                return True
+            batch.append(item)
+        return False
+
+    def _write_batch(self, conn, batch):
+        """Ejecuta el lote en una transacción; resuelve los futures tras el commit."""
+        cursor = conn.cursor()
+        results = []
+        try:
+            db.begin_immediate(conn)
+            for fn, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                cursor.execute('SAVEPOINT submission')
+                try:
+                    result = fn(cursor)
+                except Exception as e:
+                    cursor.execute('ROLLBACK TO submission')
+                    cursor.execute('RELEASE submission')
+                    future.set_exception(e)
+                    continue
+                if result is None:
+                    cursor.execute('ROLLBACK TO submission')
+                cursor.execute('RELEASE submission')
+                results.append((future, result))
+            conn.commit()
+        except Exception as e:
+            # Falló la transacción completa: ningún trabajo pendiente quedó guardado.
+            if conn.in_transaction:
+                conn.rollback()
+            for fn, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result in results:
+            future.set_result(result)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """Retorna el escritor del proceso, creándolo en el primer uso."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = GroupCommitWriter()
+    return _writer
+
+
+def close_writer():
+    """Detiene el escritor del proceso, si existe."""
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+            _writer = None
@@ -0,0 +1,6 @@
+"""
+Punto de entrada WSGI de producción (gunicorn, uWSGI, PythonAnywhere):
+
+    gunicorn -c gunicorn.conf.py        # usa wsgi:app, ver gunicorn.conf.py
+"""
+from app import app  # noqa: F401